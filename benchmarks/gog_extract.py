@@ -0,0 +1,111 @@
+"""
+Times converting YOLO results into detections as the number of boxes grows, comparing the per-box loop GreenOnGreen
+used before (indexing each box and calling round() on every coordinate) with detections_from_crop, which converts
+whole arrays at once as GreenOnGreen does now. Uses ultralytics Boxes when ultralytics is installed, otherwise a NumPy stand-in with the same
+attributes.
+
+    python benchmarks/gog_extract.py --counts 0 10 100 1000
+"""
+from owl.detection.results import detections_from_boxes, detections_from_crop
+
+import numpy as np
+import argparse
+import time
+
+CROP = (0, 0, 640, 480)
+
+
+class NumpyBoxes:
+    def __init__(self, data, orig_shape):
+        height, width = orig_shape
+        scale = np.array([width, height, width, height], dtype=np.float32)
+        self.xyxy = data[:, :4]
+        self.xyxyn = self.xyxy / scale
+        self.xywhn = np.concatenate([(self.xyxy[:, 0:2] + self.xyxy[:, 2:4]) / 2,
+                                     self.xyxy[:, 2:4] - self.xyxy[:, 0:2]], axis=1) / scale
+        self.conf = data[:, 4]
+        self.cls = data[:, 5]
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+    def __iter__(self):
+        for i in range(len(self.conf)):
+            box = NumpyBoxes.__new__(NumpyBoxes)
+            box.xyxyn, box.xywhn = self.xyxyn[i:i + 1], self.xywhn[i:i + 1]
+            box.conf, box.cls = self.conf[i:i + 1], self.cls[i:i + 1]
+            yield box
+
+
+class Result:
+    def __init__(self, count, rng):
+        x0, y0, x1, y1 = CROP
+        starts = rng.uniform(0, [x1 - 100, y1 - 100], (count, 2))
+        sizes = rng.uniform(5, 100, (count, 2))
+        data = np.column_stack([starts, starts + sizes, rng.uniform(0.4, 1, count),
+                                rng.integers(0, 2, count)]).astype(np.float32)
+        try:
+            from ultralytics.engine.results import Boxes
+            self.boxes = Boxes(data, (y1 - y0, x1 - x0))
+
+        except ImportError:
+            self.boxes = NumpyBoxes(data, (y1 - y0, x1 - x0))
+
+
+def loop_extract(result, bounds):
+    x0, y0, x1, y1 = bounds
+    cropW, cropH = x1 - x0, y1 - y0
+    boxes, centres, scores, classes = [], [], [], []
+
+    for box in result.boxes.cpu().numpy():
+        startX = round(box.xyxyn[0][0]*cropW) + x0
+        startY = round(box.xyxyn[0][1]*cropH) + y0
+
+        endX = round(box.xyxyn[0][2]*cropW) + x0
+        endY = round(box.xyxyn[0][3]*cropH) + y0
+
+        boxes.append([startX, startY, round(box.xywhn[0][2]*cropW), round(box.xywhn[0][3]*cropH)])
+        centres.append([round(startX + ((endX - startX) / 2)), round(startY + ((endY - startY) / 2))])
+        scores.append(box.conf[0])
+        classes.append(box.cls[0])
+
+    return detections_from_boxes(boxes, centres=centres, scores=scores, classes=classes)
+
+
+def vector_extract(result, bounds):
+    x0, y0, x1, y1 = bounds
+    boxes = result.boxes.cpu().numpy()
+
+    return detections_from_crop(boxes.xyxy, (y1 - y0, x1 - x0), bounds, scores=boxes.conf, classes=boxes.cls)
+
+
+def time_call(function, result, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        detections = function(result, CROP)
+
+    return detections, (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--counts', type=int, nargs='+', default=[0, 1, 10, 100, 300, 1000])
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'{"boxes":>6} {"loop ms":>9} {"vectorised ms":>14} {"speedup":>8}  identical')
+    for count in args.counts:
+        result = Result(count, rng)
+        looped, loopMs = time_call(loop_extract, result, args.repeats)
+        vectorised, vectorMs = time_call(vector_extract, result, args.repeats)
+
+        print(f'{count:>6} {loopMs:>9.3f} {vectorMs:>14.3f} {loopMs / vectorMs:>8.1f}  '
+              f'{np.array_equal(looped, vectorised)}')
+
+
+if __name__ == '__main__':
+    main()
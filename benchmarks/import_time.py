@@ -0,0 +1,53 @@
+"""
+Measures the cold import time of each owl module in a fresh interpreter, and which heavy dependencies it pulls in.
+Each import runs in a new process with -X importtime, and the fastest of --repeats runs is reported.
+
+    python benchmarks/import_time.py --repeats 5
+"""
+import subprocess
+import argparse
+import sys
+import os
+
+MODULES = ['owl', 'owl.utils', 'owl.utils.io', 'owl.detection', 'owl.viz',
+           'owl.detection.detectors', 'owl.viz.media', 'owl.utils.image']
+HEAVY = ['numpy', 'cv2', 'imutils', 'pandas', 'torch', 'ultralytics']
+
+
+def import_time(module, repeats):
+    '''
+    :return: fastest cumulative import time in ms, and the heavy modules loaded by the import
+    '''
+    code = f'import sys, {module}; print("heavy:" + ",".join(m for m in {HEAVY!r} if m in sys.modules))'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    best = None
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                                cwd=root, check=True)
+
+        # the last line for the module is its own import, including everything it imports
+        cumulative = [int(line.split('|')[1]) for line in result.stderr.splitlines()
+                      if line.startswith('import time:') and line.split('|')[2].strip() == module]
+        elapsed = cumulative[-1] / 1000
+        best = elapsed if best is None else min(best, elapsed)
+
+    loaded = [line for line in result.stdout.splitlines() if line.startswith('heavy:')][0][len('heavy:'):]
+
+    return best, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+
+    print(f'{"module":>25} {"ms":>8}  heavy dependencies loaded')
+    for module in args.modules:
+        elapsed, loaded = import_time(module, args.repeats)
+        print(f'{module:>25} {elapsed:>8.1f}  {loaded}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares GreenOnBrown with MotionGreenOnBrown on a simulated pass over the ground: a window slid down a strip built
+from the bundled media frames by --speed pixels per frame. Reports the time per frame (best of --repeats passes), the
+fraction of frame pixels processed and whether the detections match GreenOnBrown's on every frame, with the shift
+estimated by phase correlation and given from the known speed.
+
+    python benchmarks/motion.py --speed 12 --resolution 416x320 --algorithm exhsv
+"""
+from owl.detection import GreenOnBrown
+from owl.detection.motion import MotionGreenOnBrown
+
+import numpy as np
+import argparse
+import time
+import glob
+import os
+import cv2
+
+
+def ground_frames(media, resolution, speed, count):
+    width, height = resolution
+    strip = np.concatenate([cv2.resize(cv2.imread(path), (width, height))
+                            for path in sorted(glob.glob(os.path.join(media, '*.jpg')))])
+    strip = np.concatenate([strip] * (count * speed // len(strip) + 2))
+
+    # the camera moves forward, so the ground moves down the frame
+    return [strip[len(strip) - height - i * speed:len(strip) - i * speed].copy() for i in range(count)]
+
+
+def run(make_detector, frames, algorithm, repeats):
+    best, detections = None, None
+    for _ in range(repeats):
+        detector = make_detector()
+        detections = []
+        start = time.perf_counter()
+        for frame in frames:
+            detector.find(frame, algorithm=algorithm, annotate=False)
+            detections.append(detector.detections)
+
+        elapsed = (time.perf_counter() - start) / len(frames) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+
+    fraction = detector.pixel_fraction() if hasattr(detector, 'pixel_fraction') else 1.0
+
+    return best, fraction, detections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--media', default='media')
+    parser.add_argument('--resolution', type=lambda v: tuple(int(s) for s in v.split('x')), default=(416, 320))
+    parser.add_argument('--speed', type=int, default=12, help='ground movement in pixels per frame')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--algorithm', default='exhsv')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    frames = ground_frames(args.media, args.resolution, args.speed, args.frames)
+    variants = [('GreenOnBrown', GreenOnBrown),
+                ('estimated shift', MotionGreenOnBrown),
+                ('known speed', lambda: MotionGreenOnBrown(shift=(0, args.speed)))]
+
+    reference = None
+    print(f'{"detector":>16} {"ms/frame":>9} {"pixels":>7}  identical')
+    for name, make_detector in variants:
+        elapsed, fraction, detections = run(make_detector, frames, args.algorithm, args.repeats)
+        reference = detections if reference is None else reference
+        identical = all(np.array_equal(a, b) for a, b in zip(reference, detections))
+        print(f'{name:>16} {elapsed:>9.2f} {fraction:>7.2f}  {identical}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Quantises an FP32 YOLOv8 ONNX model to INT8, calibrating on a directory of frames, then compares the two on the
+bundled media: detection agreement (precision, recall and F1 against the FP32 boxes, and the mean IoU of matched
+boxes) and per-frame latency. Requires onnxruntime, and onnx for excluding the box decoding from quantisation.
+
+    python benchmarks/quantization_report.py models/yolov8n.onnx --calibration media --media media
+    python benchmarks/quantization_report.py models/yolov8n.onnx --int8 models/yolov8n_int8.onnx
+"""
+from owl.detection import GreenOnGreen
+from owl.detection.quantize import compare_models, quantize_model, summarise
+from owl.utils.image import FrameReader
+
+import pandas as pd
+import argparse
+
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def read_frames(path, resolution):
+    reader = FrameReader(path, resolution=resolution, loop_time=None, loop=False)
+    if reader.single_image:
+        return [reader.cam]
+
+    frames = []
+    frame = reader.read()
+    while frame is not None:
+        frames.append(frame)
+        frame = reader.read()
+
+    reader.stop()
+
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model', help='FP32 .onnx model')
+    parser.add_argument('--int8', help='quantised model, created from --calibration if not given')
+    parser.add_argument('--calibration', default='media')
+    parser.add_argument('--media', default='media')
+    parser.add_argument('--resolution', type=parse_size, default=(640, 480))
+    parser.add_argument('--max-frames', type=int, default=100)
+    parser.add_argument('--per-channel', action='store_true')
+    parser.add_argument('--conf', type=float, default=0.4)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    # the report's frames are read at the detection resolution, so the calibration frames are too
+    int8Path = args.int8 or quantize_model(args.model, args.calibration, resolution=args.resolution,
+                                           max_frames=args.max_frames, per_channel=args.per_channel,
+                                           frame_resolution=args.resolution)
+
+    reference = GreenOnGreen(model_path=args.model, platform='onnx')
+    candidate = GreenOnGreen(model_path=int8Path, platform='onnx')
+    frames = read_frames(args.media, args.resolution) * args.repeats
+
+    report = compare_models(reference, candidate, frames, conf=args.conf, resolution=args.resolution)
+    with pd.option_context('display.float_format', '{:.2f}'.format, 'display.width', 120):
+        print(report.to_string(index=False))
+
+    print()
+    for name, value in summarise(report).items():
+        print(f'{name:>14} {value:.3f}')
+
+
+if __name__ == '__main__':
+    main()
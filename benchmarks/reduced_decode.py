@@ -0,0 +1,69 @@
+"""
+Compares full-resolution JPEG decoding against reduced-scale decoding (IMREAD_REDUCED_COLOR_2/4/8) followed by the
+final INTER_AREA resize. The bundled media/ frames are upscaled to survey-camera sizes and re-encoded first, then
+both paths are timed and the outputs compared pixel-wise and by GreenOnBrown detections.
+
+    python benchmarks/reduced_decode.py --source-size 4000x3000 --resolution 416x320
+"""
+from owl.detection import GreenOnBrown
+from owl.utils.image import imread_resized, jpeg_size, reduced_decode_factor
+
+import numpy as np
+import argparse
+import tempfile
+import time
+import glob
+import os
+import cv2
+
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def time_read(path, resolution, reduced_decode, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        image = imread_resized(path, resolution, reduced_decode=reduced_decode)
+
+    return image, (time.perf_counter() - start) / repeats * 1000
+
+
+def detections(image, algorithm):
+    return GreenOnBrown().find(image, algorithm=algorithm, annotate=False)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--media', default='media')
+    parser.add_argument('--source-size', type=parse_size, default=(4000, 3000))
+    parser.add_argument('--resolution', type=parse_size, default=(416, 320))
+    parser.add_argument('--algorithm', default='exhsv')
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.media, '*.jpg')))
+    print(f'[INFO] {len(paths)} images at {args.source_size[0]}x{args.source_size[1]} '
+          f'-> {args.resolution[0]}x{args.resolution[1]}, {args.repeats} repeats')
+    print(f'{"image":>20} {"factor":>6} {"full ms":>8} {"reduced ms":>10} {"speed-up":>9} '
+          f'{"mean diff":>9} {"max diff":>8} {"boxes":>9}')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in paths:
+            large = os.path.join(tmp, os.path.basename(path))
+            cv2.imwrite(large, cv2.resize(cv2.imread(path), args.source_size, interpolation=cv2.INTER_CUBIC),
+                        [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+            factor = reduced_decode_factor(jpeg_size(large), args.resolution)
+            full, fullMs = time_read(large, args.resolution, False, args.repeats)
+            reduced, reducedMs = time_read(large, args.resolution, True, args.repeats)
+
+            diff = cv2.absdiff(full, reduced)
+            boxes = f'{len(detections(full, args.algorithm))}/{len(detections(reduced, args.algorithm))}'
+            print(f'{os.path.basename(path)[:20]:>20} {factor:>6} {fullMs:>8.1f} {reducedMs:>10.1f} '
+                  f'{fullMs / reducedMs:>9.2f} {np.mean(diff):>9.2f} {int(diff.max()):>8} {boxes:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmarks TiledGreenOnBrown against GreenOnBrown at 416x320, 1080p and 4K for 1 to N worker threads.
+
+    python benchmarks/tiled_scaling.py --algorithm exhsv --repeats 20
+"""
+from owl.detection import GreenOnBrown, TiledGreenOnBrown
+
+import argparse
+import time
+import os
+import cv2
+
+RESOLUTIONS = {'416x320': (416, 320), '1080p': (1920, 1080), '4K': (3840, 2160)}
+
+
+def time_detector(detector, frame, algorithm, repeats):
+    detector.find(frame, algorithm=algorithm, annotate=False)  # warm up the workspace
+    start = time.perf_counter()
+    for _ in range(repeats):
+        detector.find(frame, algorithm=algorithm, annotate=False)
+
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', default='media/OWL - frame1.jpg')
+    parser.add_argument('--algorithm', default='exhsv')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    cv2.setNumThreads(1)  # measure our own threading, not OpenCV's internal parallelism
+
+    print(f'[INFO] {os.cpu_count()} CPUs, algorithm {args.algorithm}, {args.repeats} repeats')
+    print(f'{"resolution":>10} {"workers":>8} {"ms/frame":>10} {"speed-up":>9}')
+    for name, resolution in RESOLUTIONS.items():
+        frame = cv2.resize(image, resolution)
+        baseline = time_detector(GreenOnBrown(), frame, args.algorithm, args.repeats)
+        print(f'{name:>10} {"serial":>8} {baseline:>10.2f} {1.0:>9.2f}')
+
+        for workers in range(1, args.max_workers + 1):
+            detector = TiledGreenOnBrown(workers=workers)
+            elapsed = time_detector(detector, frame, args.algorithm, args.repeats)
+            detector.close()
+            print(f'{name:>10} {workers:>8} {elapsed:>10.2f} {baseline / elapsed:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Simulates a boom moving over the ground by sliding a window down a strip built from the bundled media frames, and
+compares running the detector on every frame with detecting every N frames and tracking in between. Recall is the
+fraction of every-frame detections matched (same class, IoU >= 0.3) by a tracked box on the same frame. Also counts
+how many track ids were fired against the number of distinct weeds seen.
+
+    python benchmarks/tracking.py --every 1 2 3 5 --speed 12
+"""
+from owl.detection import GreenOnBrown
+from owl.detection.quantize import match_detections
+from owl.detection.tracking import TrackedDetector
+
+import numpy as np
+import argparse
+import time
+import glob
+import os
+import cv2
+
+FIND_KWARGS = dict(algorithm='exhsv', exgMin=25, exgMax=200, hueMin=39, hueMax=83, saturationMin=50,
+                   saturationMax=220, brightnessMin=60, brightnessMax=190, minArea=10, annotate=False)
+
+
+def ground_frames(media, resolution, speed, count):
+    width, height = resolution
+    strip = np.concatenate([cv2.resize(cv2.imread(path), (width, height))
+                            for path in sorted(glob.glob(os.path.join(media, '*.jpg')))])
+    strip = np.concatenate([strip] * (count * speed // len(strip) + 2))
+
+    # the camera moves forward, so the ground moves down the frame
+    return [strip[len(strip) - height - i * speed:len(strip) - i * speed].copy() for i in range(count)]
+
+
+def run(frames, every):
+    reference = GreenOnBrown()
+    tracked = TrackedDetector(GreenOnBrown(), every=every)
+
+    referenceDetections, elapsed, recalls, fired = [], 0.0, [], 0
+    for frame in frames:
+        reference.find(frame, **FIND_KWARGS)
+        referenceDetections.append(reference.detections)
+
+        start = time.perf_counter()
+        tracked.find(frame, **FIND_KWARGS)
+        elapsed += time.perf_counter() - start
+
+        matched = match_detections(reference.detections, tracked.detections, iou_threshold=0.3)
+        recalls.append(len(matched) / len(reference.detections) if len(reference.detections) else 1.0)
+        fired += len(tracked.fire)
+
+    return elapsed / len(frames) * 1000, np.mean(recalls), fired, tracked.tracker.next_id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--media', default='media')
+    parser.add_argument('--resolution', type=lambda v: tuple(int(s) for s in v.split('x')), default=(416, 320))
+    parser.add_argument('--speed', type=int, default=12, help='ground movement in pixels per frame')
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--every', type=int, nargs='+', default=[1, 2, 3, 5])
+    args = parser.parse_args()
+
+    frames = ground_frames(args.media, args.resolution, args.speed, args.frames)
+
+    print(f'{"every":>6} {"ms/frame":>9} {"recall":>7} {"fired":>6} {"tracks":>7}')
+    for every in args.every:
+        elapsed, recall, fired, tracks = run(frames, every)
+        print(f'{every:>6} {elapsed:>9.2f} {recall:>7.3f} {fired:>6} {tracks:>7}')
+
+
+if __name__ == '__main__':
+    main()
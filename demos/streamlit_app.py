@@ -1,14 +1,22 @@
 import time
 
 import streamlit as st
-from owl.utils.io import get_weed_detector, setup_and_run_detector, load_config
-from owl.utils import FrameReader
+from owl.detection import GreenOnBrown
+from owl.detection.sweep import ParameterSweep, SWEEP_DEFAULTS
+from owl.utils.io import get_weed_detector, setup_and_run_detector, load_config, detector_parameters
+from owl.utils.video import SeekableVideoReader
+from owl.viz import draw_detections
 from PIL import Image
 from io import BytesIO
 import requests
+import threading
+import hashlib
+import weakref
+import shutil
 import cv2
 import tempfile
 import numpy as np
+import os
 
 def get_file_type(file):
     if file.type in ['image/png', 'image/jpg', 'image/JPG', 'image/png', 'image/jpeg']:
@@ -18,6 +26,79 @@ def get_file_type(file):
     else:
         raise ValueError("Unsupported file type")
 
+def file_digest(uploaded_file):
+    return hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def decode_image(digest, _file_bytes):
+    # keyed on the file hash only; arguments starting with an underscore are not hashed by streamlit
+    return cv2.imdecode(np.frombuffer(_file_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _remove_upload(reader, directory):
+    reader.stop()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class UploadedVideo:
+    def __init__(self, file_bytes, resolution):
+        '''
+        An uploaded video written to a temporary directory and decoded lazily, one frame at a time, through
+        SeekableVideoReader, so playback starts without decoding the whole clip. The directory is removed when the
+        cache releases the video, or at exit.
+        '''
+        directory = tempfile.mkdtemp()
+        media_path = os.path.join(directory, 'upload.mp4')
+        with open(media_path, 'wb') as f:
+            f.write(file_bytes)
+
+        self.reader = SeekableVideoReader(media_path, resolution=resolution)
+        self._lock = threading.Lock()
+        weakref.finalize(self, _remove_upload, self.reader, directory)
+
+    def __len__(self):
+        return self.reader.frame_count
+
+    def __getitem__(self, frame_no):
+        # sessions run on separate threads and share the cached reader
+        with self._lock:
+            self.reader.seek(frame_no)
+            return self.reader.read()
+
+
+@st.cache_resource(max_entries=2, show_spinner='Opening video...')
+def open_video(digest, resolution, _file_bytes):
+    return UploadedVideo(_file_bytes, resolution)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def video_frame(digest, resolution, frame_no, _video):
+    # recently shown frames are kept, so re-detecting a paused frame does not decode it again
+    return _video[frame_no]
+
+
+def run_detector(weed_detector, frame, config, frame_key):
+    '''
+    Runs detection on a frame. Green-on-brown runs through the session's ParameterSweep, which keeps the stages of
+    the last frame so only the stages affected by a changed slider run again. Green-on-green runs the full detector.
+    :param frame_key: (file digest, frame number) identifying the frame
+    :return: annotated BGR image
+    '''
+    if not isinstance(weed_detector, GreenOnBrown):
+        _, _, _, image = setup_and_run_detector(weed_detector=weed_detector, frame=frame.copy(), config=config)
+        return image
+
+    if 'sweep' not in st.session_state:
+        st.session_state.sweep = ParameterSweep()
+
+    params = detector_parameters(config)
+    detections = st.session_state.sweep.detect(frame, {name: params[name] for name in SWEEP_DEFAULTS},
+                                               frame_key=frame_key)
+
+    return draw_detections(frame.copy(), detections, label=weed_detector.label)
+
+
 def update_value():
     config = st.session_state.config
     config_list = ["conf", "iou", "exgMin", "exgMax", "hueMin", "hueMax", "saturationMin",
@@ -167,11 +248,15 @@ def main():
 
         config.update({"algorithm": f"{algorithm_dict[algorithm_key]}"})
 
+        uploaded_file = uploaded_files[current_file_idx]
+        digest = file_digest(uploaded_file)
+
         if file_type == 'video':
-            tfile = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-            tfile.write(uploaded_files[current_file_idx].read())
-            media_path = tfile.name
-            frame_reader = FrameReader(path=media_path, resolution=config.get('resolution'))
+            resolution = tuple(config.get('resolution'))
+            video = open_video(digest, resolution, _file_bytes=uploaded_file.getvalue())
+            if st.session_state.get('video_digest') != digest:
+                st.session_state.video_digest = digest
+                st.session_state.frame_no = 0
 
             col1, col2 = col_main.columns(2)
             play = col1.button('Play')
@@ -185,30 +270,35 @@ def main():
             while True:
                 if play:
                     is_playing = True
-                if stop or not is_playing:
-                    st_frame.image(st.session_state.last_frame, caption='Processed Frame', use_column_width=False, width=800)
-                    break
 
-                frame = frame_reader.read()
+                frame_no = min(st.session_state.frame_no, len(video) - 1)
+                if frame_no < 0:
+                    break
 
+                frame = video_frame(digest, resolution, frame_no, _video=video)
                 if frame is None:
                     break
+
                 try:
-                    _, _, _, image = setup_and_run_detector(weed_detector=weed_detector, frame=frame.copy(), config=config)
+                    image = run_detector(weed_detector, frame, config, (digest, frame_no))
                     rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
                     st_frame.image(rgb, caption='Processed Frame', use_column_width=False, width=800)
                     st.session_state.last_frame = rgb
-                    time.sleep(0.03)
                 except Exception:
                     st.error('Please upload model or change algorithm.')
+                    break
+
+                # when paused the current frame is re-detected with the new settings and playback doesn't advance
+                if stop or not is_playing or frame_no == len(video) - 1:
+                    break
+
+                st.session_state.frame_no = frame_no + 1
+                time.sleep(0.03)
 
         elif file_type == 'image':
-            uploaded_file = uploaded_files[current_file_idx]
-            uploaded_file.seek(0)
-            file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-            image = cv2.imdecode(file_bytes, 1)
+            image = decode_image(digest, _file_bytes=uploaded_file.getvalue())
             try:
-                _, _, _, image = setup_and_run_detector(weed_detector=weed_detector, frame=image.copy(), config=config)
+                image = run_detector(weed_detector, image, config, (digest, 0))
                 rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
                 st_frame.image(rgb, width=800)
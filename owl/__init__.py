@@ -1,7 +1,11 @@
+from owl._lazy import lazy_exports
 
 __version__ = '0.0.2'
 __author__ = 'Guy Coleman'
 __license__ = 'MIT'
 __all__ = ['detection', 'utils', 'viz']
 
-print(f'[INFO] Using owl-tools version {__version__}')
\ No newline at end of file
+# subpackages are imported on first use
+__getattr__, __dir__ = lazy_exports(__name__, {name: None for name in __all__})
+
+print(f'[INFO] Using owl-tools version {__version__}')
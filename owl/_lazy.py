@@ -0,0 +1,29 @@
+import importlib
+
+
+def lazy_exports(package, exports):
+    '''
+    Builds the PEP 562 module __getattr__ and __dir__ for a package, so its public names are only imported on first
+    access. This keeps `import owl` and its subpackages cheap until a detector or reader is actually used.
+    :param package: the package's __name__
+    :param exports: dictionary of exported name to the relative module it is defined in, or to None for a
+    subpackage or submodule of that name
+    :return: __getattr__ and __dir__ functions for the package
+    '''
+    def __getattr__(name):
+        if name not in exports:
+            raise AttributeError(f'module {package!r} has no attribute {name!r}')
+
+        if exports[name] is None:
+            value = importlib.import_module(f'.{name}', package)
+        else:
+            value = getattr(importlib.import_module(exports[name], package), name)
+
+        # cache on the package so later lookups skip __getattr__
+        setattr(importlib.import_module(package), name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(package))) | set(exports))
+
+    return __getattr__, __dir__
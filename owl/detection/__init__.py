@@ -1,2 +1,19 @@
+# openweedlocator-tools/detection/__init__.py
 
-from .detectors import GreenOnGreen, GreenOnBrown
\ No newline at end of file
+from owl._lazy import lazy_exports
+
+_EXPORTS = {
+    'GreenOnGreen': '.detectors',
+    'GreenOnBrown': '.detectors',
+    'TiledGreenOnBrown': '.tiled',
+    'MotionGreenOnBrown': '.motion',
+    'ModelRegistry': '.registry',
+    'MODEL_REGISTRY': '.registry',
+    'OnnxModel': '.backends',
+    'OpenVINOModel': '.backends',
+    'Tracker': '.tracking',
+    'TrackedDetector': '.tracking',
+}
+__all__ = list(_EXPORTS)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
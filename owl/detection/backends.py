@@ -0,0 +1,350 @@
+from pathlib import Path
+import numpy as np
+import threading
+import math
+import ast
+import cv2
+
+### Exported model backends ###
+"""
+Runs YOLOv8 models exported to ONNX (ONNX Runtime) or OpenVINO IR on the CPU, without PyTorch or ultralytics. The
+pre- and post-processing follow ultralytics: a letterbox resize with grey padding, class-aware non-maximum
+suppression on the highest-scoring class of each anchor, and boxes scaled back to the input image.
+"""
+##############################
+
+# boxes of different classes are offset by this much so a single NMS pass never suppresses across classes
+MAX_WH = 7680
+MAX_NMS = 30000
+STRIDE = 32
+
+
+def stride_size(imgsz):
+    '''
+    :return: (height, width) rounded up to a multiple of the model stride, the input size used for dynamic models
+    '''
+    return tuple(max(math.ceil(size / STRIDE) * STRIDE, STRIDE) for size in imgsz)
+
+
+def letterbox(image, new_shape=(640, 640), color=(114, 114, 114)):
+    '''
+    Resizes an image to fit new_shape, keeping its aspect ratio, and pads the remainder evenly on both sides.
+    :param image: BGR image
+    :param new_shape: (height, width) of the output
+    :param color: padding colour
+    :return: padded image, scale ratio and (left, top) padding in pixels
+    '''
+    shape = image.shape[:2]
+    ratio = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+
+    newUnpad = int(round(shape[1] * ratio)), int(round(shape[0] * ratio))
+    padW = (new_shape[1] - newUnpad[0]) / 2
+    padH = (new_shape[0] - newUnpad[1]) / 2
+
+    if shape[::-1] != newUnpad:
+        image = cv2.resize(image, newUnpad, interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = int(round(padH - 0.1)), int(round(padH + 0.1))
+    left, right = int(round(padW - 0.1)), int(round(padW + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+
+    return image, ratio, (left, top)
+
+
+def to_blob(image):
+    '''
+    Converts a BGR uint8 image to a 1x3xHxW float32 RGB tensor scaled to [0, 1].
+    '''
+    blob = image[:, :, ::-1].transpose(2, 0, 1)[np.newaxis]
+
+    return np.ascontiguousarray(blob, dtype=np.float32) / np.float32(255)
+
+
+def xywh_to_xyxy(boxes):
+    xyxy = np.empty_like(boxes)
+    half = boxes[:, 2:4] / 2
+    xyxy[:, 0:2] = boxes[:, 0:2] - half
+    xyxy[:, 2:4] = boxes[:, 0:2] + half
+
+    return xyxy
+
+
+def box_iou(box, boxes):
+    '''
+    :return: IoU of one (x0, y0, x1, y1) box against an Nx4 array of boxes
+    '''
+    interW = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    interH = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    inter = interW * interH
+    areaBox = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    return inter / (areaBox + areas - inter + 1e-9)
+
+
+def pairwise_iou(boxes, others):
+    '''
+    :return: NxM IoU of two arrays of (x0, y0, x1, y1) boxes
+    '''
+    topLeft = np.maximum(boxes[:, np.newaxis, 0:2], others[np.newaxis, :, 0:2])
+    bottomRight = np.minimum(boxes[:, np.newaxis, 2:4], others[np.newaxis, :, 2:4])
+    inter = np.prod(np.clip(bottomRight - topLeft, 0, None), axis=2)
+    areas = np.prod(boxes[:, 2:4] - boxes[:, 0:2], axis=1)
+    otherAreas = np.prod(others[:, 2:4] - others[:, 0:2], axis=1)
+
+    return inter / (areas[:, np.newaxis] + otherAreas[np.newaxis, :] - inter + 1e-9)
+
+
+def nms(boxes, scores, iou_threshold=0.7):
+    '''
+    Greedy non-maximum suppression. Each step keeps the highest-scoring remaining box and drops every box that
+    overlaps it by more than iou_threshold, computing the overlaps for all remaining boxes at once.
+    :param boxes: Nx4 array of (x0, y0, x1, y1)
+    :param scores: N array of scores
+    :param iou_threshold: boxes overlapping a kept box by more than this are suppressed
+    :return: indices of the kept boxes, highest score first
+    '''
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        if order.size == 1:
+            break
+
+        rest = order[1:]
+        order = rest[box_iou(boxes[best], boxes[rest]) <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(output, conf=0.25, iou=0.7, classes=None, max_det=300):
+    '''
+    Decodes raw YOLOv8 output into detections.
+    :param output: array of shape (4 + number of classes, anchors), box centre, width and height in input pixels
+    followed by class scores
+    :param conf: minimum class score
+    :param iou: IoU threshold for non-maximum suppression
+    :param classes: optional list of class ids to keep
+    :param max_det: maximum number of detections
+    :return: Nx4 (x0, y0, x1, y1) boxes in input pixels, N scores and N class ids
+    '''
+    predictions = output.T
+    classScores = predictions[:, 4:]
+    classIds = classScores.argmax(axis=1)
+    scores = classScores[np.arange(len(classIds)), classIds]
+
+    keep = scores > conf
+    if classes is not None:
+        keep &= np.isin(classIds, classes)
+
+    boxes, scores, classIds = xywh_to_xyxy(predictions[keep, :4]), scores[keep], classIds[keep]
+    if len(scores) > MAX_NMS:
+        top = np.argsort(-scores, kind='stable')[:MAX_NMS]
+        boxes, scores, classIds = boxes[top], scores[top], classIds[top]
+
+    kept = nms(boxes + classIds[:, np.newaxis] * MAX_WH, scores, iou_threshold=iou)[:max_det]
+
+    return boxes[kept], scores[kept], classIds[kept]
+
+
+def scale_boxes(boxes, ratio, pad, shape):
+    '''
+    Maps boxes from the letterboxed image back to the original image and clips them to it.
+    :param boxes: Nx4 (x0, y0, x1, y1) boxes in letterboxed pixels
+    :param ratio: scale ratio from letterbox
+    :param pad: (left, top) padding from letterbox
+    :param shape: (height, width) of the original image
+    :return: boxes in original image pixels
+    '''
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] -= pad[0]
+    boxes[:, [1, 3]] -= pad[1]
+    boxes /= ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+
+    return boxes
+
+
+class Letterbox:
+    def __init__(self, color=114, allocator=None):
+        '''
+        Letterboxes frames straight into a reused model input buffer: a batch of RGB CHW float32 images scaled to
+        [0, 1], identical to letterbox followed by to_blob. The scale and padding are cached per input shape, the
+        padding is written only when the layout of a slot changes, and each frame is resized once and copied once.
+        :param color: padding grey level
+        :param allocator: callable returning an empty float32 array of a given shape, e.g. one backed by pinned
+        memory so the buffer can be copied to a GPU without staging. Defaults to np.empty
+        '''
+        self.color = np.float32(color) / np.float32(255)
+        self.allocator = allocator or (lambda shape: np.empty(shape, dtype=np.float32))
+        self.transforms = {}
+        self.buffer = None
+        self.layouts = []
+
+    def transform(self, shape, imgsz):
+        '''
+        :param shape: (height, width) of the input image
+        :param imgsz: (height, width) of the model input
+        :return: scale ratio, (left, top) padding and (width, height) of the resized image
+        '''
+        key = (shape[0], shape[1], imgsz[0], imgsz[1])
+        if key not in self.transforms:
+            ratio = min(imgsz[0] / shape[0], imgsz[1] / shape[1])
+            newUnpad = int(round(shape[1] * ratio)), int(round(shape[0] * ratio))
+            padW = (imgsz[1] - newUnpad[0]) / 2
+            padH = (imgsz[0] - newUnpad[1]) / 2
+            self.transforms[key] = ratio, (int(round(padW - 0.1)), int(round(padH - 0.1))), newUnpad
+
+        return self.transforms[key]
+
+    def __call__(self, images, imgsz):
+        '''
+        :param images: BGR image or list of BGR images
+        :param imgsz: (height, width) of the model input
+        :return: Nx3xHxW float32 buffer, overwritten by the next call
+        '''
+        if isinstance(images, np.ndarray):
+            images = [images]
+
+        shape = (len(images), 3, imgsz[0], imgsz[1])
+        if self.buffer is None or self.buffer.shape != shape:
+            self.buffer = self.allocator(shape)
+            self.layouts = [None] * len(images)
+
+        for slot, image in enumerate(images):
+            ratio, (left, top), (newW, newH) = self.transform(image.shape[:2], imgsz)
+            if self.layouts[slot] != (left, top, newW, newH):
+                self.buffer[slot] = self.color
+                self.layouts[slot] = (left, top, newW, newH)
+
+            if image.shape[1] != newW or image.shape[0] != newH:
+                image = cv2.resize(image, (newW, newH), interpolation=cv2.INTER_LINEAR)
+
+            np.divide(image[:, :, ::-1].transpose(2, 0, 1), np.float32(255),
+                      out=self.buffer[slot, :, top:top + newH, left:left + newW])
+
+        return self.buffer
+
+    def scale_boxes(self, boxes, shape, imgsz):
+        '''
+        Maps boxes from the model input back to the image they were letterboxed from.
+        :param boxes: Nx4 (x0, y0, x1, y1) boxes in model input pixels
+        :param shape: (height, width) of the image
+        :param imgsz: (height, width) of the model input
+        :return: boxes in image pixels
+        '''
+        ratio, pad, _ = self.transform(shape, imgsz)
+
+        return scale_boxes(boxes, ratio, pad, shape)
+
+
+class ExportedModel:
+    def __init__(self, model_path, names=None):
+        '''
+        Base class for exported YOLOv8 detection models. Subclasses load the model and implement _infer.
+        :param model_path: path to the exported model
+        :param names: optional dict of class id to name, otherwise read from the model metadata
+        '''
+        self.model_path = Path(model_path)
+        self.names = names
+        self.input_shape = None
+        self.letterbox = Letterbox()
+
+    def predict(self, image, conf=0.25, iou=0.7, imgsz=(640, 640), classes=None, letterbox=None):
+        '''
+        Runs the model on a BGR image. Models may be shared between threads, so each thread should pass its own
+        letterbox buffer.
+        :param imgsz: (height, width) the image is letterboxed to. Ignored for models with a fixed input size, and
+        rounded up to a multiple of 32 otherwise
+        :param letterbox: Letterbox the model input is written into, the model's own by default
+        :return: Nx4 (x0, y0, x1, y1) boxes in image pixels, N scores and N class ids
+        '''
+        imgsz = self.input_shape if self.input_shape is not None else stride_size(imgsz)
+        letterbox = self.letterbox if letterbox is None else letterbox
+
+        output = self._infer(letterbox(image, imgsz))[0]
+        boxes, scores, classIds = postprocess(output, conf=conf, iou=iou, classes=classes)
+
+        return letterbox.scale_boxes(boxes, image.shape[:2], imgsz), scores, classIds
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    @staticmethod
+    def _static_shape(shape):
+        # (height, width) for a fixed NCHW input, None if either dimension is dynamic
+        height, width = shape[2], shape[3]
+        if isinstance(height, int) and isinstance(width, int) and height > 0 and width > 0:
+            return height, width
+
+        return None
+
+    @staticmethod
+    def _parse_names(names, classes):
+        if isinstance(names, str):
+            names = ast.literal_eval(names)
+
+        return {int(k): v for k, v in names.items()} if names else {i: str(i) for i in range(classes)}
+
+
+class OnnxModel(ExportedModel):
+    def __init__(self, model_path, names=None, providers=None):
+        '''
+        YOLOv8 model exported to ONNX, run with ONNX Runtime.
+        :param providers: ONNX Runtime execution providers, defaults to the CPU
+        '''
+        super().__init__(model_path, names=names)
+        import onnxruntime
+
+        print(f'[INFO] Loading ONNX model {self.model_path.stem}...')
+        self.session = onnxruntime.InferenceSession(str(self.model_path),
+                                                    providers=providers or ['CPUExecutionProvider'])
+        modelInput = self.session.get_inputs()[0]
+        self.input_name = modelInput.name
+        self.input_shape = self._static_shape(modelInput.shape)
+
+        # ultralytics stores the class names in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        numClasses = self.session.get_outputs()[0].shape[1]
+        self.names = self._parse_names(names or metadata.get('names'),
+                                       numClasses - 4 if isinstance(numClasses, int) else 0)
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINOModel(ExportedModel):
+    def __init__(self, model_path, names=None, device='CPU'):
+        '''
+        YOLOv8 model exported to OpenVINO IR (.xml with its .bin weights alongside), run with OpenVINO.
+        :param device: OpenVINO device name
+        '''
+        super().__init__(model_path, names=names)
+        import openvino
+
+        print(f'[INFO] Loading OpenVINO model {self.model_path.stem}...')
+        core = openvino.Core()
+        model = core.read_model(str(self.model_path))
+        partialShape = model.inputs[0].get_partial_shape()
+        self.input_shape = None if partialShape.is_dynamic else self._static_shape(list(partialShape.to_shape()))
+
+        # ultralytics stores the class names, with spaces replaced by underscores, in the model's runtime info
+        if names is None and model.has_rt_info(['model_info', 'labels']):
+            names = dict(enumerate(model.get_rt_info(['model_info', 'labels']).astype(str).split()))
+        outputShape = model.outputs[0].get_partial_shape()
+        numClasses = outputShape[1].get_length() - 4 if outputShape[1].is_static else 0
+        self.names = self._parse_names(names, numClasses)
+
+        self.compiled = core.compile_model(model, device)
+        self._lock = threading.Lock()
+
+    def _infer(self, blob):
+        # calling the compiled model reuses one infer request, which is not thread-safe
+        with self._lock:
+            return self.compiled([blob])[self.compiled.output(0)]
+
+
+BACKENDS = {'.onnx': OnnxModel, '.xml': OpenVINOModel}
@@ -1,18 +1,39 @@
-from owl.utils.algorithms import exgr, exg, exg_standardised, exg_standardised_hue, gndvi, hsv, maxg
+from owl.detection.backends import BACKENDS, Letterbox, stride_size
+from owl.detection.regions import is_unset, lane_hits, regions, roi_bounds
+from owl.detection.registry import MODEL_REGISTRY
+from owl.detection.results import boxes_and_centres, detections_from_boxes, detections_from_crop, \
+    detections_from_stats, empty_detections, offset_detections
+from owl.utils.algorithms import gndvi
+from owl.utils.kernels import IndexEngine
+from owl.utils.workspace import Workspace
+from owl.viz.render import draw_detections
 from imutils import grab_contours
 
+from contextlib import nullcontext
 from pathlib import Path
 import numpy as np
+import math
 import sys
 import cv2
 
 import warnings
 
+MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+# exported models run without PyTorch, on the CPU. 'desktop' and 'windows' pick the backend from the model suffix
+GOG_PLATFORMS = {'desktop': None, 'windows': None, 'onnx': '.onnx', 'openvino': '.xml'}
+MODEL_SUFFIXES = ['.pt'] + list(BACKENDS)
+
+# algorithms normalised over the whole frame, which cannot be computed on part of a frame or a stack of frames
+GLOBAL_ALGORITHMS = ['maxg', 'gndvi']
+
 
 class GreenOnBrown:
     def __init__(self, labels='weed'):
         self.algorithm = None
         self.label = labels
+        self.workspace = Workspace()
+        self.engine = IndexEngine(workspace=self.workspace)
 
     def find(self,
              image,
@@ -27,7 +48,11 @@ class GreenOnBrown:
              minArea=1,
              show_display=False,
              algorithm='exg',
-             invert_hue=False):
+             invert_hue=False,
+             postprocess='contours',
+             annotate=True,
+             roi=None,
+             lanes=None):
         '''
         Uses a provided algorithm and contour detection to determine green objects in the image. Min and Max
         thresholds are provided.
@@ -42,174 +67,464 @@ class GreenOnBrown:
         :param saturationMax: maximum saturation threshold value
         :param minArea: minimum area for the detection - used to filter out small detections
         :param show_display: True: show windows; False: operates in headless mode
-        :param algorithm: the algorithm to use. Defaults to ExG if not correct
-        :return: returns the contours, bounding boxes, centroids and the image on which the boxes have been drawn
+        :param algorithm: the algorithm to use. Defaults to ExG if not correct. 'exg_int' and 'exgr_int' give the same
+        result as 'exg' and 'exgr' using integer arithmetic only
+        :param invert_hue: inverts the hue threshold to exclude anything within the thresholds
+        :param postprocess: 'contours' (default) finds external contours and filters on contour area. 'components'
+        computes boxes and pixel areas in bulk with cv2.connectedComponentsWithStats, returning None for contours
+        :param annotate: True: draw the detections on the image; False: detections only, the image is not modified
+        :param roi: optional [x, y, w, h] region of interest; only this part of the image is processed
+        :param lanes: optional nozzle lanes within the ROI, either the number of equal-width lanes or a list of
+        [x_start, x_end] columns. Each lane is processed separately and the per-lane hit flags are stored in
+        self.lane_hits
+        :return: returns the contours, bounding boxes, centroids and the image on which the boxes have been drawn.
+        All detections are also stored in self.detections as a structured array (see owl.detection.results)
         '''
-        self.weedCenters = []
-        self.boxes = []
         self.algorithm = algorithm
+        self.cnts = None if postprocess == 'components' else []
+        regionDetections = []
 
-        # different algorithm options, add in your algorithm here if you make a new one!
-        threshedAlready = False
-        if self.algorithm == 'exg':
-            output = exg(image)
+        # each region is processed as a view of the image and the results mapped back to full-frame coordinates
+        for x0, y0, x1, y1 in regions(image.shape, roi=roi, lanes=lanes):
+            thresholdOut = self._mask(image[y0:y1, x0:x1], exgMin=exgMin, exgMax=exgMax, show_display=show_display,
+                                      hueMin=hueMin, hueMax=hueMax,
+                                      brightnessMin=brightnessMin, brightnessMax=brightnessMax,
+                                      saturationMin=saturationMin, saturationMax=saturationMax,
+                                      invert_hue=invert_hue)
+
+            cnts, detections = self.mask_detections(thresholdOut, minArea=minArea, postprocess=postprocess,
+                                                offset=(x0, y0))
+            if cnts is not None:
+                self.cnts.extend(cnts)
+            regionDetections.append(detections)
+
+        self.lane_hits = None if is_unset(lanes) else np.array([len(d) > 0 for d in regionDetections])
 
-        elif self.algorithm == 'exgr':
-            output = exgr(image)
+        # an empty list of lanes leaves nothing to process
+        detections = np.concatenate(regionDetections) if regionDetections else empty_detections()
 
-        elif self.algorithm == 'maxg':
-            output = maxg(image)
+        # returns the contours, bounding boxes, centroids and the image on which the boxes have been drawn
+        return self._result(image, detections, annotate=annotate)
+
+    def find_batch(self,
+                   frames,
+                   exgMin=30,
+                   exgMax=250,
+                   hueMin=30,
+                   hueMax=90,
+                   brightnessMin=5,
+                   brightnessMax=200,
+                   saturationMin=30,
+                   saturationMax=255,
+                   minArea=1,
+                   show_display=False,
+                   algorithm='exg',
+                   invert_hue=False,
+                   postprocess='contours',
+                   annotate=True,
+                   roi=None,
+                   lanes=None):
+        '''
+        Runs find on a batch of frames, e.g. one per camera. Same-shaped frames are stacked and the vegetation index
+        and exgMin/exgMax band computed over the whole stack in one call. The adaptive threshold, morphology and
+        contours depend on neighbouring pixels, so still run per frame. Parameters are as for find.
+        :param frames: list of BGR frames
+        :return: list of (contours, bounding boxes, centroids, image) tuples in the same order as frames. The
+        detections of each frame are stored in self.batch_detections
+        '''
+        self.algorithm = algorithm
+        hsv_params = dict(hueMin=hueMin, hueMax=hueMax, brightnessMin=brightnessMin, brightnessMax=brightnessMax,
+                          saturationMin=saturationMin, saturationMax=saturationMax, invert_hue=invert_hue)
+        findParams = dict(exgMin=exgMin, exgMax=exgMax, minArea=minArea, show_display=show_display,
+                          algorithm=algorithm, postprocess=postprocess, annotate=annotate, roi=roi, lanes=lanes,
+                          **hsv_params)
+
+        results = [None] * len(frames)
+        self.batch_detections = [None] * len(frames)
+
+        shapes = {}
+        for i, frame in enumerate(frames):
+            shapes.setdefault(frame.shape, []).append(i)
+
+        for shape, indices in shapes.items():
+            # regions and frame-normalised algorithms don't stack, so fall back to one frame at a time
+            if len(indices) == 1 or not (is_unset(roi) and is_unset(lanes)) or algorithm in GLOBAL_ALGORITHMS:
+                for i in indices:
+                    results[i] = self.find(frames[i], **findParams)
+                    self.batch_detections[i] = self.detections
+                continue
+
+            frameH = shape[0]
+            stack = self.workspace.buffer('batch_stack', (len(indices) * frameH,) + shape[1:])
+            for n, i in enumerate(indices):
+                stack[n * frameH:(n + 1) * frameH] = frames[i]
+
+            output, threshedAlready = self.index(stack, **hsv_params)
+            if not threshedAlready:
+                self.band(output, exgMin=exgMin, exgMax=exgMax)
+
+            for n, i in enumerate(indices):
+                thresholdOut = self.binarise(output[n * frameH:(n + 1) * frameH], threshedAlready,
+                                              show_display=show_display)
+                self.cnts, detections = self.mask_detections(thresholdOut, minArea=minArea, postprocess=postprocess)
+                self.lane_hits = None
+                results[i] = self._result(frames[i], detections, annotate=annotate)
+                self.batch_detections[i] = self.detections
+
+        return results
+
+    def _result(self, image, detections, annotate=True):
+        self.detections = detections
+        self.boxes, self.weedCenters = boxes_and_centres(self.detections)
+
+        if annotate:
+            image = draw_detections(image, self.detections, label=self.label)
+
+        return self.cnts, self.boxes, self.weedCenters, image
+
+    def mask_detections(self, thresholdOut, minArea=1, postprocess='contours', offset=(0, 0)):
+        '''
+        Finds the detections in a binary mask and maps them to full-frame coordinates. This is the last of the
+        detector stages (index, band, binarise, mask_detections), which can be run separately to reuse the
+        results of earlier stages, as ParameterSweep does.
+        :param thresholdOut: binary mask from binarise
+        :param minArea: minimum area for the detection
+        :param postprocess: 'contours' or 'components', as for find
+        :param offset: (x, y) of the mask within the full frame
+        :return: list of contours (None for 'components') and the detections
+        '''
+        if postprocess == 'components':
+            detections = self._components(thresholdOut, minArea=minArea)
+            return None, offset_detections(detections, *offset)
+
+        # findContours no longer modifies its input (OpenCV >= 3.2), so the mask does not need to be copied
+        cnts = cv2.findContours(thresholdOut, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+        cnts = grab_contours(cnts)
+
+        return cnts, self._contours(cnts, minArea=minArea)
+
+    def _mask(self, image, exgMin=30, exgMax=250, show_display=False, **hsv_params):
+        '''
+        Runs the selected algorithm and thresholds the result.
+        :return: binary image written into the workspace
+        '''
+        output, threshedAlready = self.index(image, **hsv_params)
 
-        elif self.algorithm == 'nexg':
-            output = exg_standardised(image)
+        return self._threshold(output, threshedAlready, exgMin=exgMin, exgMax=exgMax, show_display=show_display)
 
-        elif self.algorithm == 'exhsv':
-            output = exg_standardised_hue(image, hueMin=hueMin, hueMax=hueMax,
-                                          brightnessMin=brightnessMin, brightnessMax=brightnessMax,
-                                          saturationMin=saturationMin, saturationMax=saturationMax,
-                                          invert_hue=invert_hue)
+    def index(self, image, **hsv_params):
+        '''
+        Runs the algorithm in self.algorithm on the image. The output is written into the workspace and is only
+        valid until the next call.
+        :return: the index image and a boolean if it is already thresholded
+        '''
+        # different algorithm options, add in your algorithm here if you make a new one!
+        threshedAlready = False
+        if self.algorithm in ['exg', 'exgr', 'exg_int', 'exgr_int', 'maxg', 'nexg']:
+            output = self.engine.compute(self.algorithm, image)
 
-        elif self.algorithm == 'hsv':
-            output, threshedAlready = hsv(image, hueMin=hueMin, hueMax=hueMax,
-                                          brightnessMin=brightnessMin, brightnessMax=brightnessMax,
-                                          saturationMin=saturationMin, saturationMax=saturationMax,
-                                          invert_hue=invert_hue)
+        elif self.algorithm in ['exhsv', 'hsv']:
+            output = self.engine.compute(self.algorithm, image, **hsv_params)
+            threshedAlready = self.algorithm == 'hsv'
 
         elif self.algorithm == 'gndvi':
             output = gndvi(image)
 
         else:
-            output = exg(image)
+            output = self.engine.exg(image)
             warnings.warn(f'Selected algorithm {self.algorithm} unavailable. Defaulting to ExG')
 
-        # run the thresholds provided
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        return output, threshedAlready
 
+    def _threshold(self, output, threshedAlready, exgMin=30, exgMax=250, show_display=False):
+        '''
+        Converts the index image into a binary mask, in place where possible.
+        :return: binary image written into the workspace
+        '''
         # if not a binary image, run an adaptive threshold on the area that fits within the thresholded bounds.
         if not threshedAlready:
-            output = np.where(output > exgMin, output, 0)
-            output = np.where(output > exgMax, 0, output)
-            output = np.uint8(np.abs(output))
+            self.band(output, exgMin=exgMin, exgMax=exgMax)
             if show_display:
                 cv2.imshow("HSV Threshold on ExG", output)
 
-            thresholdOut = cv2.adaptiveThreshold(output, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 2)
-            thresholdOut = cv2.morphologyEx(thresholdOut, cv2.MORPH_CLOSE, kernel, iterations=1)
+        return self.binarise(output, threshedAlready, show_display=show_display)
+
+    def band(self, output, exgMin=30, exgMax=250):
+        '''
+        Zeroes the index outside exgMin < output <= exgMax, in place.
+        :return: the banded index image
+        '''
+        bandMask = self.workspace.buffer('band', output.shape)
+        cv2.inRange(output, math.floor(exgMin) + 1, math.floor(exgMax), dst=bandMask)
+        cv2.bitwise_and(output, bandMask, dst=output)
+
+        return output
+
+    def binarise(self, output, threshedAlready, show_display=False):
+        '''
+        Adaptive thresholds a banded index image, or cleans up an already binary one, with morphological closing.
+        :return: binary image written into the workspace
+        '''
+        thresholdOut = self.workspace.buffer('threshold', output.shape)
+        maskOut = self.workspace.buffer('mask', output.shape)
+
+        if not threshedAlready:
+            cv2.adaptiveThreshold(output, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 2,
+                                  dst=thresholdOut)
+            cv2.morphologyEx(thresholdOut, cv2.MORPH_CLOSE, MORPH_KERNEL, dst=maskOut, iterations=1)
 
         # if already binary, run morphological operations to remove any noise
-        if threshedAlready:
-            thresholdOut = cv2.morphologyEx(output, cv2.MORPH_CLOSE, kernel, iterations=5)
+        else:
+            cv2.morphologyEx(output, cv2.MORPH_CLOSE, MORPH_KERNEL, dst=maskOut, iterations=5)
 
         if show_display:
-            cv2.imshow("Binary Threshold", thresholdOut)
-
-        # find all the contours on the binary images
-        self.cnts = cv2.findContours(thresholdOut.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        self.cnts = grab_contours(self.cnts)
-
-        # loop over all the detected contours and calculate the centres and bounding boxes
-        for c in self.cnts:
-            # filter based on total area of contour
-            if cv2.contourArea(c) > minArea:
-                # calculate the min bounding box
-                startX, startY, boxW, boxH = cv2.boundingRect(c)
-                endX = startX + boxW
-                endY = startY + boxH
-
-                cv2.putText(image, self.label, (startX, startY + 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 0), 2)
-                cv2.rectangle(image, (int(startX), int(startY)), (endX, endY), (0, 0, 255), 2)
-
-                # save the bounding box
-                self.boxes.append([startX, startY, boxW, boxH])
-                # compute box center
-                centerX = int(startX + (boxW / 2))
-                centerY = int(startY + (boxH / 2))
-                self.weedCenters.append([centerX, centerY])
+            cv2.imshow("Binary Threshold", maskOut)
 
-        # returns the contours, bounding boxes, centroids and the image on which the boxes have been drawn
-        return self.cnts, self.boxes, self.weedCenters, image
+        return maskOut
+
+    @staticmethod
+    def _contours(cnts, minArea=1):
+        '''
+        Calculates the bounding boxes and centres of all contours larger than minArea.
+        :return: detections as a structured array
+        '''
+        areas = np.array([cv2.contourArea(c) for c in cnts], dtype=np.float64)
+        keep = np.flatnonzero(areas > minArea)
+        boxes = np.array([cv2.boundingRect(cnts[i]) for i in keep], dtype=np.int32).reshape(-1, 4)
+
+        return detections_from_boxes(boxes, areas=areas[keep])
+
+    def _components(self, thresholdOut, minArea=1):
+        '''
+        Calculates bounding boxes, centres and pixel areas of all 8-connected components in bulk.
+        :return: detections as a structured array
+        '''
+        labels = self.workspace.buffer('labels', thresholdOut.shape, np.int32)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(thresholdOut, labels=labels, connectivity=8,
+                                                          ltype=cv2.CV_32S)
+
+        return detections_from_stats(stats, minArea=minArea)
 
 
 class GreenOnGreen:
-    def __init__(self, model_path='owl/models/yolov8n.pt', platform='desktop'):
+    def __init__(self, model_path='owl/models/yolov8n.pt', platform='desktop', registry=MODEL_REGISTRY):
+        '''
+        GreenOnGreen runs a YOLO model through ultralytics. The weights are loaded on first use and shared through
+        the model registry, so detectors built for the same weights reuse one loaded model. Ultralytics models are
+        not thread-safe, so each inference leases a copy from the registry, and detectors running at the same time
+        on other threads (e.g. the Pipeline workers) get copies of their own. The model is looked up in the registry
+        on each use rather than held, so evicted models are freed.
+        Models exported to ONNX (.onnx) or OpenVINO IR (.xml) run on the CPU through ONNX Runtime or OpenVINO
+        instead, without PyTorch (see owl.detection.backends).
+        :param model_path: path to the .pt, .onnx or .xml model
+        :param platform: 'desktop' or 'windows' (backend chosen by the model suffix), 'onnx' or 'openvino'
+        :param registry: ModelRegistry the model is loaded from, the process-wide MODEL_REGISTRY by default
+        '''
         self.model_path = Path(model_path)
+        self.registry = registry
         self.results = None
+        self.names = {}
         self.weedCenters = []
         self.boxes = []
 
-        if platform == 'desktop' or platform == 'windows':
-            from ultralytics import YOLO
+        if platform not in GOG_PLATFORMS:
+            raise NotImplementedError(f'GreenOnGreen not yet implemented on {platform} platform')
+
+        if not self._validate_model_path(self.model_path, suffix=GOG_PLATFORMS[platform]):
+            raise ValueError("Invalid model path provided.")
+
+        self.backend = BACKENDS.get(self.model_path.suffix)
+        if self.backend is None:
             import torch
             self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            self.letterbox = Letterbox(allocator=self._allocate)
 
         else:
-            raise NotImplementedError(f'GreenOnGreen not yet implemented on {platform} platform')
+            # exported models are shared between threads, so each detector letterboxes into its own buffer
+            self.device = 'cpu'
+            self.letterbox = Letterbox()
 
-        if not self._validate_model_path(self.model_path):
-            raise ValueError("Invalid model path provided.")
+    @property
+    def model(self):
+        return self.registry.get(self.model_path, self._load_model, device=self.device)
 
-        print(f'[INFO] Loading model {str(self.model_path.stem)}...')
-        self.model = YOLO(self.model_path)
+    def _lease_model(self):
+        # ONNX Runtime and OpenVINO (behind a lock) models can run on several threads at once
+        if self.backend is not None:
+            return nullcontext(self.model)
 
-    def find(self, image, conf=0.4, iou=0.7, resolution=(640, 420), filter_id=None):
-        image, resolution = self._validate_resolution(image, resolution=resolution)
-        self.results = self.model(image, conf=conf, iou=iou,
-                                  imgsz=(resolution[1], resolution[0]),
-                                  save=False, stream=True, classes=filter_id, verbose=False)
+        return self.registry.lease(self.model_path, self._load_model, device=self.device)
 
-        for result in self.results:
-            boxes = result.boxes.to(self.device).numpy()
-            for box in boxes:
-                startX = round(box.xyxyn[0][0]*resolution[0])
-                startY = round(box.xyxyn[0][1]*resolution[1])
+    def warmup(self, resolution=(640, 420), **kwargs):
+        '''
+        Loads the model if needed and runs one inference on a blank frame, so that the first real frame is not
+        slowed by model loading, memory allocation or backend initialisation.
+        :param resolution: (width, height) the frames will be detected at
+        :param kwargs: any other find parameters, e.g. roi, so the warm-up matches the real input size
+        '''
+        blank = np.zeros((resolution[1], resolution[0], 3), dtype=np.uint8)
+        self.find(blank, resolution=resolution, annotate=False, **kwargs)
 
-                endX = round(box.xyxyn[0][2]*resolution[0])
-                endY = round(box.xyxyn[0][3]*resolution[1])
+    def _allocate(self, shape):
+        import torch
 
-                boxW = round(box.xywhn[0][2]*resolution[0])
-                boxH = round(box.xywhn[0][3]*resolution[1])
-                self.boxes.append([startX, startY, boxW, boxH])
+        # pinned host memory is copied to the GPU directly, without staging through pageable memory
+        return torch.empty(shape, dtype=torch.float32, pin_memory=self.device.type == 'cuda').numpy()
 
-                centerX = round(startX + ((endX - startX) / 2))
-                centerY = round(startY + ((endY - startY) / 2))
-                self.weedCenters.append([centerX, centerY])
+    def _load_model(self, model_path):
+        if self.backend is not None:
+            return self.backend(model_path)
 
-                percent = int(100 * box.conf[0])
-                label = f'{percent}% {result.names[int(box.cls[0])]}'
+        from ultralytics import YOLO
 
-                cv2.rectangle(image, (startX, startY), (endX, endY), (0, 0, 255), 2)
+        print(f'[INFO] Loading model {str(Path(model_path).stem)}...')
+        return YOLO(model_path)
 
-                cv2.circle(image, center=(centerX, centerY), radius=5, thickness=-1, color=(255, 0, 0))
-                cv2.putText(image, label, (startX, startY + 30), cv2.FONT_HERSHEY_SIMPLEX, .75, (255, 0, 0), 2)
+    def find(self, image, conf=0.4, iou=0.7, resolution=(640, 420), filter_id=None, annotate=True, roi=None,
+             lanes=None):
+        '''
+        Runs the YOLO model on the image. The image is letterboxed straight to the model input, keeping its aspect
+        ratio, and the detections are reported in the coordinates of the image resized to resolution.
+        :param image: input image to be analysed
+        :param conf: minimum confidence
+        :param iou: IoU threshold for non-maximum suppression
+        :param resolution: (width, height) of the returned image and the detection coordinates
+        :param filter_id: optional list of class ids to keep
+        :param annotate: True: draw the detections on the image; False: detections only
+        :param roi: optional [x, y, w, h] region of interest in the resized image; only this part is passed to the model
+        :param lanes: optional nozzle lanes within the ROI (see GreenOnBrown.find). Lanes overlapped by a detection
+        box are flagged in self.lane_hits
+        :return: None, bounding boxes, centroids and the resized image. With annotate=False nothing is drawn, so the
+        frame is not resized and is returned untouched
+        '''
+        shape = self._output_shape(image, resolution)
+        detections = self._detect([image], shape, roi_bounds(roi, shape), conf=conf, iou=iou, filter_id=filter_id)[0]
 
-        return None, self.boxes, self.weedCenters, image
+        return self._result(image, shape, detections, roi=roi, lanes=lanes, annotate=annotate)
+
+    def find_batch(self, frames, conf=0.4, iou=0.7, resolution=(640, 420), filter_id=None, annotate=True, roi=None,
+                   lanes=None):
+        '''
+        Runs the YOLO model on a batch of frames, e.g. one per camera, in a single call to the model for each size of
+        resized frame. Parameters are as for find.
+        :param frames: list of BGR frames
+        :return: list of (None, bounding boxes, centroids, resized image) tuples in the same order as frames. The
+        detections of each frame are stored in self.batch_detections
+        '''
+        shapes = [self._output_shape(frame, resolution) for frame in frames]
+
+        # with resolution=None frames keep their own size, so each size is batched and scaled separately
+        groups = {}
+        for i, shape in enumerate(shapes):
+            groups.setdefault(shape, []).append(i)
+
+        batchDetections = [None] * len(frames)
+        for shape, indices in groups.items():
+            detections = self._detect([frames[i] for i in indices], shape, roi_bounds(roi, shape), conf=conf, iou=iou,
+                                      filter_id=filter_id)
+            for i, frameDetections in zip(indices, detections):
+                batchDetections[i] = frameDetections
+
+        results = []
+        self.batch_detections = []
+        for frame, shape, detections in zip(frames, shapes, batchDetections):
+            results.append(self._result(frame, shape, detections, roi=roi, lanes=lanes, annotate=annotate))
+            self.batch_detections.append(self.detections)
+
+        return results
+
+    def _detect(self, frames, shape, bounds, conf=0.4, iou=0.7, filter_id=None):
+        '''
+        Runs the model on the part of each frame matching bounds in the resized image. Frames are letterboxed
+        straight to the model input, so each is resized once whatever its size.
+        :param frames: list of BGR frames
+        :param shape: shape of the resized image
+        :param bounds: (x0, y0, x1, y1) of the region in the resized image
+        :return: list of detections in the coordinates of the resized image, one per frame
+        '''
+        x0, y0, x1, y1 = bounds
+        crops = [self._frame_crop(frame, shape, bounds) for frame in frames]
+
+        with self._lease_model() as model:
+            # exported models have a batch size of one
+            if self.backend is not None:
+                predictions = [model.predict(crop, conf=conf, iou=iou, imgsz=(y1 - y0, x1 - x0), classes=filter_id,
+                                             letterbox=self.letterbox)
+                               for crop in crops]
+                self.names = model.names
+
+            else:
+                predictions = self._predict_torch(model, crops, (y1 - y0, x1 - x0), conf=conf, iou=iou,
+                                                  filter_id=filter_id)
+
+        return [detections_from_crop(boxes, crop.shape, bounds, scores=scores, classes=classes)
+                for crop, (boxes, scores, classes) in zip(crops, predictions)]
+
+    def _predict_torch(self, model, crops, imgsz, conf=0.4, iou=0.7, filter_id=None):
+        '''
+        Runs the ultralytics model on letterboxed crops. The model is given the input tensor directly, so ultralytics
+        skips its own resizing and copying.
+        :return: list of (boxes in crop pixels, scores, class ids), one per crop
+        '''
+        import torch
+
+        imgsz = stride_size(imgsz)
+        blob = self.letterbox(crops, imgsz)
+        self.results = model(torch.from_numpy(blob), conf=conf, iou=iou, imgsz=imgsz,
+                                  save=False, stream=True, classes=filter_id, verbose=False)
+
+        predictions = []
+        for crop, result in zip(crops, self.results):
+            boxes = result.boxes.cpu().numpy()
+            predictions.append((self.letterbox.scale_boxes(boxes.xyxy, crop.shape[:2], imgsz), boxes.conf, boxes.cls))
+            self.names = result.names
+
+        return predictions
 
     @staticmethod
-    def _validate_resolution(image, resolution):
-        inputH = image.shape[0]
-        inputW = image.shape[1]
+    def _frame_crop(frame, shape, bounds):
+        # the region of the original frame matching bounds in the resized image
+        x0, y0, x1, y1 = bounds
+        if frame.shape[:2] != shape[:2]:
+            scaleX, scaleY = frame.shape[1] / shape[1], frame.shape[0] / shape[0]
+            x0, x1 = int(round(x0 * scaleX)), int(round(x1 * scaleX))
+            y0, y1 = int(round(y0 * scaleY)), int(round(y1 * scaleY))
+
+        return frame[y0:y1, x0:x1]
+
+    def _result(self, image, shape, detections, roi=None, lanes=None, annotate=True):
+        self.detections = detections
+        self.boxes, self.weedCenters = boxes_and_centres(self.detections)
+        self.lane_hits = None if is_unset(lanes) else lane_hits(self.detections, regions(shape, roi=roi, lanes=lanes))
+
+        # the frame is only resized to the detection coordinates when they are drawn on it
+        if annotate:
+            if image.shape != shape:
+                image = cv2.resize(image, (shape[1], shape[0]))
+            image = draw_detections(image, self.detections, names=self.names)
 
-        if resolution is None:
-            modelH = inputH
-            modelW = inputW
-        else:
-            modelH = resolution[1]
-            modelW = resolution[0]
+        return None, self.boxes, self.weedCenters, image
 
-        if inputW != modelW or inputH != modelH:
-            image = cv2.resize(image, (modelW, modelH))
+    @staticmethod
+    def _output_shape(image, resolution):
+        '''
+        :return: shape of the image resized to resolution, which the detections are reported in
+        '''
+        if resolution is None:
+            return image.shape
 
-        return image, (modelW, modelH)
+        return (resolution[1], resolution[0]) + image.shape[2:]
 
     @staticmethod
-    def _validate_model_path(model_path) -> bool:
+    def _validate_model_path(model_path, suffix=None) -> bool:
         if not model_path.exists():
             warnings.warn(f"[ERROR] {model_path} could not be found.")
             return False
 
-        # ensure path is .pt model
-        if model_path.suffix != '.pt':
-            warnings.warn(f"[ERROR] {model_path} is not a .pt file.")
+        # ensure path is a supported model, or the one the platform requires
+        suffixes = MODEL_SUFFIXES if suffix is None else [suffix]
+        if model_path.suffix not in suffixes:
+            warnings.warn(f"[ERROR] {model_path} is not a {' or '.join(suffixes)} file.")
             return False
 
         return True
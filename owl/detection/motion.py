@@ -0,0 +1,243 @@
+from owl.detection.detectors import GreenOnBrown, GLOBAL_ALGORITHMS
+from owl.detection.tiled import ADAPTIVE_HALO, BINARY_HALO
+
+import numpy as np
+import cv2
+
+
+def pixels_per_frame(speed_kmh, fps, pixels_per_metre):
+    '''
+    Converts the vehicle speed into the distance the ground moves down the frame between frames.
+    :param speed_kmh: ground speed in km/h
+    :param fps: camera frame rate
+    :param pixels_per_metre: pixels per metre of ground along the direction of travel, at the detection resolution
+    :return: shift in pixels per frame
+    '''
+    return speed_kmh / 3.6 / fps * pixels_per_metre
+
+
+def _refine(previous, current, estimate, radius):
+    # the shift within radius of the estimate that best aligns the 1D profiles, current[i] = previous[i - shift]
+    length = len(current)
+    errors = {}
+    for shift in range(estimate - radius, estimate + radius + 1):
+        if abs(shift) < length:
+            errors[shift] = np.abs(current[max(shift, 0):length + min(shift, 0)] -
+                                   previous[max(-shift, 0):length + min(-shift, 0)]).mean()
+
+    return min(errors, key=errors.get) if errors else estimate
+
+
+def _band_size(size):
+    # band sizes are rounded up to 2^k or 1.5 * 2^k, so a changing shift reuses a few sets of workspace buffers
+    # rather than allocating a set for every band size
+    if size <= 2:
+        return size
+
+    power = 1 << (size.bit_length() - 1)
+    for rounded in (power, power + power // 2, 2 * power):
+        if size <= rounded:
+            return rounded
+
+
+class MotionGreenOnBrown(GreenOnBrown):
+    def __init__(self, labels='weed', shift=None, estimate_scale=0.25, min_response=0.3, refresh=None):
+        '''
+        GreenOnBrown for a camera moving over the ground. Between frames the ground only moves, so the previous mask
+        is shifted by the ground motion and only the newly exposed band at the leading edge is processed, together
+        with thin bands along the frame edges where the previous result saw ground that is now out of frame. Each
+        band is processed with the same halo as TiledGreenOnBrown, so for a pure translation the mask, and therefore
+        the detections, are identical to GreenOnBrown's. Contours are found on the merged mask, so weeds crossing
+        the band edge are not split.
+        The whole frame is processed on the first frame, when any parameter changes, for the frame-normalised
+        algorithms ('maxg', 'gndvi'), when the shift is too large, when the motion estimate is unreliable and every
+        refresh frames if set.
+        :param labels: label drawn on detections
+        :param shift: known ground motion as (dx, dy) pixels per frame, e.g. (0, pixels_per_frame(...)) for a camera
+        looking down with the vehicle moving up the frame. A fractional shift is accumulated, so the mask moves by
+        the whole pixels the ground has travelled, e.g. 12, 13, 12, 12, 13 for 12.4. None estimates it from the
+        frames by phase correlation. May be changed between frames as the speed changes
+        :param estimate_scale: scale the frames are reduced to for phase correlation. The estimate is then refined
+        to the nearest pixel on the full-resolution row and column profiles
+        :param min_response: minimum phase correlation peak, from 0 to 1, for the estimate to be used
+        :param refresh: optional number of frames after which the whole frame is processed again, which bounds the
+        error a shift that is only approximately known (e.g. from a speed sensor) builds up in the carried mask
+        '''
+        super().__init__(labels=labels)
+        self.shift = shift
+        self.estimate_scale = estimate_scale
+        self.min_response = min_response
+        self.refresh = refresh
+
+        # bands are processed by a separate detector, so they have their own workspace buffers
+        self._bandDetector = GreenOnBrown(labels=labels)
+        self._states = []
+        self._region = 0
+        self._window = None
+        self.last_shift = None
+        self.stats = {'frames': 0, 'full_frames': 0, 'pixels': 0, 'frame_pixels': 0}
+
+    def find(self, image, **kwargs):
+        # regions (ROI and lanes) are masked in the same order each frame, and each keeps its own previous mask
+        self._region = 0
+
+        return super().find(image, **kwargs)
+
+    def reset(self):
+        '''
+        Forgets the previous frame, e.g. after a gap in the video, so the next frame is processed in full.
+        '''
+        self._states = []
+
+    def pixel_fraction(self):
+        '''
+        :return: fraction of the frame pixels processed since the detector was created
+        '''
+        return self.stats['pixels'] / self.stats['frame_pixels'] if self.stats['frame_pixels'] else 1.0
+
+    def _mask(self, image, exgMin=30, exgMax=250, show_display=False, **hsv_params):
+        if self._region == len(self._states):
+            self._states.append({})
+        state = self._states[self._region]
+        self._region += 1
+
+        frameH, frameW = image.shape[:2]
+        params = (self.algorithm, exgMin, exgMax, tuple(sorted(hsv_params.items())), image.shape)
+        halo = BINARY_HALO if self.algorithm == 'hsv' else ADAPTIVE_HALO
+        features = self._features(image) if self.shift is None else None
+
+        travelled = self._travelled(state)
+        refreshDue = self.refresh is not None and state.get('age', 0) >= self.refresh
+
+        shift = None
+        if state.get('params') == params and self.algorithm not in GLOBAL_ALGORITHMS and not refreshDue:
+            shift = travelled if self.shift is not None else self._estimate(state['features'], features)
+            if shift is not None and (abs(shift[0]) + 2 * halo >= frameW or abs(shift[1]) + 2 * halo >= frameH):
+                shift = None
+
+        # two buffers per region, so the previous mask can be shifted into the other one
+        if 'masks' not in state or state['masks'][0].shape != image.shape[:2]:
+            state['masks'] = [np.zeros(image.shape[:2], dtype=np.uint8) for _ in range(2)]
+        previous, maskOut = state['masks']
+
+        self.stats['frames'] += 1
+        self.stats['frame_pixels'] += frameH * frameW
+        if shift is None:
+            maskOut[:] = super()._mask(image, exgMin=exgMin, exgMax=exgMax, **hsv_params)
+            state['age'] = 0
+            self.stats['full_frames'] += 1
+            self.stats['pixels'] += frameH * frameW
+
+        else:
+            self._shift_mask(previous, maskOut, shift)
+            self._bandDetector.algorithm = self.algorithm
+            for core in self._bands(shift, halo, (frameH, frameW)):
+                self._process_band(image, maskOut, core, halo, exgMin=exgMin, exgMax=exgMax, **hsv_params)
+            state['age'] += 1
+
+        self.last_shift = shift
+        state['params'], state['features'], state['masks'] = params, features, [maskOut, previous]
+
+        if show_display:
+            cv2.imshow("Binary Threshold", maskOut)
+
+        return maskOut
+
+    def _features(self, image):
+        '''
+        :return: the reduced grey image for phase correlation, and the full-resolution row and column mean profiles
+        used to refine its estimate to the nearest pixel
+        '''
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        reduced = cv2.resize(gray, None, fx=self.estimate_scale, fy=self.estimate_scale, interpolation=cv2.INTER_AREA)
+        # NumPy sums rows several times faster than cv2.reduce
+        rows = gray.sum(axis=1, dtype=np.int32).astype(np.float32) / gray.shape[1]
+        cols = gray.sum(axis=0, dtype=np.int32).astype(np.float32) / gray.shape[0]
+
+        return reduced.astype(np.float32), rows, cols
+
+    def _travelled(self, state):
+        '''
+        Adds the known shift to the distance the region has travelled. Rounding each frame's shift would let the
+        carried mask drift away from the ground by the rounding error every frame, so the mask is instead moved by
+        the change in the rounded total.
+        :return: integer (dx, dy) ground motion since the previous frame, or None without a known shift or on the
+        region's first frame
+        '''
+        if self.shift is None:
+            state.pop('travel', None)
+            return None
+
+        previous = state.get('travel')
+        if previous is None:
+            state['travel'] = (0.0, 0.0)
+            return None
+
+        travel = previous[0] + self.shift[0], previous[1] + self.shift[1]
+        state['travel'] = travel
+
+        return (int(round(travel[0])) - int(round(previous[0])),
+                int(round(travel[1])) - int(round(previous[1])))
+
+    def _estimate(self, previous, current):
+        '''
+        :return: integer (dx, dy) ground motion since the previous frame, or None if it could not be estimated
+        '''
+        if self._window is None or self._window.shape != current[0].shape:
+            self._window = cv2.createHanningWindow(current[0].shape[::-1], cv2.CV_32F)
+
+        # phase correlation on the reduced frames is fast but only accurate to a few pixels at full resolution
+        (dx, dy), response = cv2.phaseCorrelate(previous[0], current[0], self._window)
+        if response < self.min_response:
+            return None
+
+        radius = int(np.ceil(1 / self.estimate_scale))
+        dx = _refine(previous[2], current[2], int(round(dx / self.estimate_scale)), radius)
+        dy = _refine(previous[1], current[1], int(round(dy / self.estimate_scale)), radius)
+
+        return dx, dy
+
+    @staticmethod
+    def _shift_mask(previous, maskOut, shift):
+        # maskOut[y, x] = previous[y - dy, x - dx], the exposed band is filled in afterwards
+        dx, dy = shift
+        frameH, frameW = previous.shape
+        maskOut[max(dy, 0):frameH + min(dy, 0), max(dx, 0):frameW + min(dx, 0)] = \
+            previous[max(-dy, 0):frameH + min(-dy, 0), max(-dx, 0):frameW + min(-dx, 0)]
+
+    @staticmethod
+    def _bands(shift, halo, shape):
+        '''
+        Rows and columns whose mask cannot be taken from the previous frame: the newly exposed ground plus a halo,
+        and a halo along the opposite edge, where the previous mask saw ground that has since left the frame. The
+        leading band is rounded up in size (see _band_size); the extra rows are processed again with the same result.
+        :return: list of (x0, y0, x1, y1) core rectangles
+        '''
+        dx, dy = shift
+        frameH, frameW = shape
+        bands = []
+
+        if dy:
+            size = min(_band_size(abs(dy) + halo), frameH)
+            leading = (0, size) if dy > 0 else (frameH - size, frameH)
+            trailing = (frameH - halo, frameH) if dy > 0 else (0, halo)
+            bands += [(0, y0, frameW, y1) for y0, y1 in (leading, trailing)]
+
+        if dx:
+            size = min(_band_size(abs(dx) + halo), frameW)
+            leading = (0, size) if dx > 0 else (frameW - size, frameW)
+            trailing = (frameW - halo, frameW) if dx > 0 else (0, halo)
+            bands += [(x0, 0, x1, frameH) for x0, x1 in (leading, trailing)]
+
+        return bands
+
+    def _process_band(self, image, maskOut, core, halo, exgMin=30, exgMax=250, **hsv_params):
+        frameH, frameW = image.shape[:2]
+        x0, y0, x1, y1 = core
+        tileX0, tileY0 = max(x0 - halo, 0), max(y0 - halo, 0)
+        tileX1, tileY1 = min(x1 + halo, frameW), min(y1 + halo, frameH)
+
+        tileMask = self._bandDetector._mask(image[tileY0:tileY1, tileX0:tileX1], exgMin=exgMin, exgMax=exgMax,
+                                            **hsv_params)
+        maskOut[y0:y1, x0:x1] = tileMask[y0 - tileY0:y1 - tileY0, x0 - tileX0:x1 - tileX0]
+        self.stats['pixels'] += (tileY1 - tileY0) * (tileX1 - tileX0)
@@ -0,0 +1,231 @@
+from owl.detection.backends import ExportedModel, Letterbox, pairwise_iou, stride_size
+from owl.utils.image import FrameReader
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import tempfile
+import shutil
+import time
+import re
+import os
+
+### INT8 quantisation ###
+"""
+Post-training static quantisation of YOLOv8 models exported to ONNX, calibrated on frames read through FrameReader
+and preprocessed exactly as GreenOnGreen does at inference. The quantised model is an ordinary .onnx file, so
+GreenOnGreen runs it like any other exported model. compare_models measures how far its detections and latency
+move from the FP32 model.
+"""
+##############################
+
+
+class FrameCalibrationReader:
+    def __init__(self, source, input_name, imgsz=(480, 640), resolution=None, max_frames=100):
+        '''
+        Feeds calibration frames to ONNX Runtime static quantisation, implementing the get_next and rewind methods
+        of onnxruntime.quantization.CalibrationDataReader. Frames are letterboxed one at a time, so memory stays flat
+        however many are used. GreenOnGreen letterboxes the frame it is given straight to the model input, so
+        frames are letterboxed from the size they are read at, with the same Letterbox.
+        :param source: directory of images, video, single image or FrameStore directory read with FrameReader
+        :param input_name: name of the model input
+        :param imgsz: (height, width) of the model input
+        :param resolution: (width, height) of the frames passed to GreenOnGreen.find, e.g. when a FrameReader resizes
+        them first. None keeps the size of the source, as for frames straight from a camera
+        :param max_frames: maximum number of calibration frames
+        '''
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.letterbox = Letterbox()
+        self.reader = FrameReader(source, resolution=resolution, loop_time=None, loop=False)
+        self.max_frames = 1 if self.reader.single_image else max_frames
+        self.count = 0
+
+    def get_next(self):
+        if self.count >= self.max_frames:
+            return None
+
+        frame = self.reader.read()
+        if frame is None:
+            return None
+
+        self.count += 1
+
+        # the letterbox buffer is reused, so each batch gets its own copy
+        return {self.input_name: self.letterbox(frame, self.imgsz).copy()}
+
+    def rewind(self):
+        self.reader.reset()
+        self.count = 0
+
+    def stop(self):
+        self.reader.stop()
+
+
+def head_nodes(model_path):
+    '''
+    Finds the box decoding nodes of an ultralytics YOLOv8 ONNX export: everything in the final Detect module after
+    its convolutions. Box coordinates in pixels and class scores in [0, 1] share the output tensor, so quantising
+    these nodes with one scale costs far more accuracy than it saves time.
+    :param model_path: path to the FP32 .onnx model
+    :return: list of node names
+    '''
+    import onnx
+
+    nodes = onnx.load(str(model_path)).graph.node
+    modules = [int(match.group(1)) for match in (re.match(r'/model\.(\d+)/', node.name) for node in nodes) if match]
+    if not modules:
+        return []
+
+    prefix = f'/model.{max(modules)}/'
+    return [node.name for node in nodes if node.name.startswith(prefix) and not node.name.startswith(prefix + 'cv')]
+
+
+def quantize_model(model_path, calibration_path, output_path=None, resolution=(640, 480), max_frames=100,
+                   per_channel=False, exclude_head=True, frame_resolution=None):
+    '''
+    Quantises an FP32 ONNX model to INT8 (QDQ format, unsigned activations and signed weights) with min-max
+    calibration on frames read from calibration_path.
+    :param model_path: path to the FP32 .onnx model
+    :param calibration_path: frames representative of the field, read with FrameReader
+    :param output_path: path of the quantised model, defaults to <model>_int8.onnx alongside the original
+    :param resolution: (width, height) the detector will run at, which sets the input size of dynamic models
+    :param max_frames: maximum number of calibration frames
+    :param per_channel: quantise weights per output channel, slower to calibrate but usually more accurate
+    :param exclude_head: keep the box decoding in FP32, see head_nodes
+    :param frame_resolution: (width, height) of the frames the detector is given, None for the size of the
+    calibration frames (see FrameCalibrationReader)
+    :return: path to the quantised model
+    '''
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    import onnxruntime
+
+    modelPath = Path(model_path)
+    if modelPath.suffix != '.onnx':
+        raise ValueError(f'[ERROR] {modelPath} is not a .onnx file. Export the model to ONNX before quantising.')
+
+    outputPath = Path(output_path) if output_path else modelPath.with_name(f'{modelPath.stem}_int8.onnx')
+
+    session = onnxruntime.InferenceSession(str(modelPath), providers=['CPUExecutionProvider'])
+    modelInput = session.get_inputs()[0]
+    imgsz = ExportedModel._static_shape(modelInput.shape) or stride_size((resolution[1], resolution[0]))
+
+    reader = FrameCalibrationReader(calibration_path, modelInput.name, imgsz=imgsz, resolution=frame_resolution,
+                                    max_frames=max_frames)
+    tempDir = tempfile.mkdtemp()
+    try:
+        print(f'[INFO] Quantising {modelPath.stem} on up to {reader.max_frames} frames at {imgsz[1]}x{imgsz[0]}...')
+        # shape inference and graph optimisation first, as ONNX Runtime recommends, so more nodes are quantised
+        preprocessedPath = os.path.join(tempDir, modelPath.name)
+        quant_pre_process(str(modelPath), preprocessedPath, skip_symbolic_shape=True)
+
+        quantize_static(preprocessedPath, str(outputPath), reader,
+                        quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8,
+                        weight_type=QuantType.QInt8,
+                        per_channel=per_channel,
+                        calibrate_method=CalibrationMethod.MinMax,
+                        nodes_to_exclude=head_nodes(modelPath) if exclude_head else None)
+
+    finally:
+        reader.stop()
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+    print(f'[INFO] Saved quantised model to {outputPath}')
+
+    return outputPath
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    '''
+    Greedily pairs detections of the same class, highest IoU first, treating the reference as ground truth.
+    :param reference: structured detections from the reference model
+    :param candidate: structured detections from the model being compared
+    :param iou_threshold: minimum IoU for a match
+    :return: IoU of each matched pair
+    '''
+    if not len(reference) or not len(candidate):
+        return np.empty(0)
+
+    def xyxy(detections):
+        return np.column_stack([detections['x'], detections['y'],
+                                detections['x'] + detections['w'], detections['y'] + detections['h']]).astype(float)
+
+    ious = pairwise_iou(xyxy(reference), xyxy(candidate))
+    ious[reference['class'][:, np.newaxis] != candidate['class'][np.newaxis, :]] = 0
+
+    matched, usedRef, usedCand = [], set(), set()
+    for flat in np.argsort(-ious, axis=None, kind='stable'):
+        refIndex, candIndex = np.unravel_index(flat, ious.shape)
+        if ious[refIndex, candIndex] < iou_threshold:
+            break
+
+        if refIndex in usedRef or candIndex in usedCand:
+            continue
+
+        matched.append(ious[refIndex, candIndex])
+        usedRef.add(refIndex)
+        usedCand.add(candIndex)
+
+    return np.array(matched)
+
+
+def compare_models(reference, candidate, frames, match_iou=0.5, **find_kwargs):
+    '''
+    Runs two GreenOnGreen detectors, e.g. FP32 and INT8, on the same frames and reports how closely the candidate
+    agrees with the reference and how long each takes. Precision and recall treat the reference detections as
+    ground truth, so their F1 is a proxy for the change in mAP without needing labels.
+    :param reference: GreenOnGreen detector with the reference model
+    :param candidate: GreenOnGreen detector with the model being compared
+    :param frames: iterable of BGR frames
+    :param match_iou: minimum IoU for two detections to agree
+    :param find_kwargs: parameters passed to GreenOnGreen.find, e.g. conf or resolution
+    :return: pandas DataFrame with one row per frame
+    '''
+    # the first call loads the models and allocates their buffers, so it is not timed
+    reference.warmup(**find_kwargs)
+    candidate.warmup(**find_kwargs)
+    find_kwargs = dict(find_kwargs, annotate=False)
+
+    rows = []
+    for frameNo, frame in enumerate(frames):
+        timings = []
+        for detector in (reference, candidate):
+            start = time.perf_counter()
+            detector.find(frame, **find_kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        matched = match_detections(reference.detections, candidate.detections, iou_threshold=match_iou)
+        rows.append({'frame': frameNo,
+                     'reference_ms': timings[0],
+                     'candidate_ms': timings[1],
+                     'reference_boxes': len(reference.detections),
+                     'candidate_boxes': len(candidate.detections),
+                     'matched': len(matched),
+                     'mean_iou': matched.mean() if len(matched) else np.nan})
+
+    report = pd.DataFrame(rows)
+    report['precision'] = (report['matched'] / report['candidate_boxes']).where(report['candidate_boxes'] > 0, 1.0)
+    report['recall'] = (report['matched'] / report['reference_boxes']).where(report['reference_boxes'] > 0, 1.0)
+
+    return report
+
+
+def summarise(report):
+    '''
+    :param report: DataFrame from compare_models
+    :return: dictionary of overall agreement and mean latencies
+    '''
+    matched = report['matched'].sum()
+    precision = matched / report['candidate_boxes'].sum() if report['candidate_boxes'].sum() else 1.0
+    recall = matched / report['reference_boxes'].sum() if report['reference_boxes'].sum() else 1.0
+
+    return {'frames': len(report),
+            'precision': precision,
+            'recall': recall,
+            'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            'mean_iou': report['mean_iou'].mean(),
+            'reference_ms': report['reference_ms'].mean(),
+            'candidate_ms': report['candidate_ms'].mean(),
+            'speedup': report['reference_ms'].mean() / report['candidate_ms'].mean()}
@@ -0,0 +1,89 @@
+import numpy as np
+
+### Regions of interest and nozzle lanes ###
+"""
+A region of interest (ROI) is given as [x, y, w, h] in pixels of the frame passed to the detector. Nozzle lanes split
+the ROI (or the full frame) into vertical strips, given either as the number of equal-width lanes or as a list of
+[x_start, x_end] pixel columns. Regions are processed as views of the frame, so no pixels are copied.
+"""
+##############################
+
+
+def is_unset(value):
+    # configs mark unused options with "null" or an empty string, as for filter_id
+    return value is None or (isinstance(value, str) and value in ['null', ''])
+
+
+def roi_bounds(roi, shape):
+    '''
+    Converts an [x, y, w, h] ROI to (x0, y0, x1, y1) clipped to the frame.
+    :param roi: [x, y, w, h] or None for the full frame
+    :param shape: shape of the frame
+    :return: (x0, y0, x1, y1)
+    '''
+    frameH, frameW = shape[:2]
+    if is_unset(roi):
+        return 0, 0, frameW, frameH
+
+    x, y, w, h = (int(v) for v in roi)
+    x0, y0 = min(max(x, 0), frameW), min(max(y, 0), frameH)
+    x1, y1 = min(max(x + w, x0), frameW), min(max(y + h, y0), frameH)
+    if x1 == x0 or y1 == y0:
+        raise ValueError(f'[ERROR] ROI {roi} does not overlap the {frameW}x{frameH} frame')
+
+    return x0, y0, x1, y1
+
+
+def lane_bounds(lanes, bounds):
+    '''
+    Calculates the [x_start, x_end) columns of each nozzle lane within the ROI.
+    :param lanes: number of equal-width lanes, or a list of [x_start, x_end] columns
+    :param bounds: (x0, y0, x1, y1) of the ROI
+    :return: list of (x_start, x_end)
+    '''
+    x0, _, x1, _ = bounds
+    if isinstance(lanes, (int, np.integer)):
+        if lanes < 1:
+            raise ValueError(f'[ERROR] Number of lanes must be at least 1, got {lanes}')
+        edges = np.linspace(x0, x1, int(lanes) + 1).round().astype(int)
+        return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+    laneBounds = []
+    for start, end in lanes:
+        start, end = max(int(start), x0), min(int(end), x1)
+        if end <= start:
+            raise ValueError(f'[ERROR] Lane [{start}, {end}] does not overlap the ROI columns [{x0}, {x1}]')
+        laneBounds.append((start, end))
+
+    return laneBounds
+
+
+def regions(shape, roi=None, lanes=None):
+    '''
+    The (x0, y0, x1, y1) rectangles to process for a given ROI and lane configuration.
+    :return: list of rectangles, one per lane or a single rectangle for the ROI/full frame
+    '''
+    bounds = roi_bounds(roi, shape)
+    if is_unset(lanes):
+        return [bounds]
+
+    return [(start, bounds[1], end, bounds[3]) for start, end in lane_bounds(lanes, bounds)]
+
+
+def lane_hits(detections, rectangles):
+    '''
+    Flags each lane containing any part of a detection box.
+    :param detections: structured array of detections
+    :param rectangles: (x0, y0, x1, y1) of each lane
+    :return: boolean array, one flag per lane
+    '''
+    rectangles = np.asarray(rectangles).reshape(-1, 4)
+    startX = detections['x'][:, None]
+    endX = (detections['x'] + detections['w'])[:, None]
+    startY = detections['y'][:, None]
+    endY = (detections['y'] + detections['h'])[:, None]
+
+    overlap = ((startX < rectangles[:, 2]) & (endX > rectangles[:, 0]) &
+               (startY < rectangles[:, 3]) & (endY > rectangles[:, 1]))
+
+    return overlap.any(axis=0)
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import os
+
+
+def model_nbytes(model):
+    '''
+    Estimates the memory held by a model from the size of its parameters. Works for ultralytics YOLO models and
+    torch modules, and returns 0 for anything without parameters.
+    '''
+    module = getattr(model, 'model', model)
+    try:
+        return sum(p.numel() * p.element_size() for p in module.parameters())
+
+    except (AttributeError, TypeError):
+        return 0
+
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        self.nbytes = 0
+        self.copies = 0
+        # copies of a model that cannot be shared between threads, waiting to be leased
+        self.idle = []
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, max_models=4, max_bytes=None):
+        '''
+        Process-wide cache of loaded models, keyed on (path, modification time, device), so detectors built for the
+        same weights share one loaded model. Models that cannot be shared between threads are leased instead: each
+        lease takes an idle copy of the model or loads a new one, and hands it back afterwards, so there are only as
+        many copies as threads running the model at once, and a new thread reuses the copy an earlier one returned.
+        All copies of a model count as one entry towards max_models. Models are evicted least recently used first
+        once there are more than max_models, or the total estimated size of all copies exceeds max_bytes. A model
+        whose file has changed on disk is reloaded. Each model is loaded under its own lock, so a slow load only
+        holds up lookups of the same model. The cap only frees memory if callers look models up on use rather than
+        keeping their own reference, as GreenOnGreen does.
+        :param max_models: maximum number of models kept loaded
+        :param max_bytes: optional cap on the total estimated model memory, in bytes
+        '''
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.models = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_path, device='cpu'):
+        path = Path(model_path).resolve()
+        return str(path), os.path.getmtime(path), str(device)
+
+    def get(self, model_path, loader, device='cpu'):
+        '''
+        Returns the cached model for the path and device, loading it with loader(model_path) on first use.
+        :param model_path: path to the model weights
+        :param loader: callable that loads the model from the path
+        :param device: device the model runs on, part of the cache key
+        :return: the loaded model
+        '''
+        return self._entry(model_path, loader, device)[1].model
+
+    @contextmanager
+    def lease(self, model_path, loader, device='cpu'):
+        '''
+        Lends a copy of the model for the duration of the with block, for models that cannot run on several threads
+        at once. The first copy is the one get returns; further copies are loaded only while the others are in use.
+        :param model_path: path to the model weights
+        :param loader: callable that loads the model from the path
+        :param device: device the model runs on, part of the cache key
+        '''
+        key, entry = self._entry(model_path, loader, device)
+        with self._lock:
+            model = entry.idle.pop() if entry.idle else None
+
+        if model is None:
+            model = loader(model_path)
+            with self._lock:
+                self.loads += 1
+                entry.copies += 1
+                self._evict()
+
+        try:
+            yield model
+
+        finally:
+            # copies of an evicted or stale model are dropped with it
+            with self._lock:
+                if self.models.get(key) is entry:
+                    entry.idle.append(model)
+
+    def clear(self):
+        with self._lock:
+            self.models.clear()
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes * entry.copies for entry in list(self.models.values()))
+
+    def _entry(self, model_path, loader, device):
+        key = self.key(model_path, device=device)
+
+        with self._lock:
+            entry = self.models.get(key)
+            if entry is None:
+                # an older version of the same file is never used again
+                for stale in [k for k in self.models if k[0] == key[0] and k[2:] == key[2:]]:
+                    del self.models[stale]
+
+                entry = self.models[key] = _Entry()
+            self.models.move_to_end(key)
+
+        # loading under the entry lock stops two detectors loading the same weights at once, without holding up
+        # lookups of other models
+        with entry.lock:
+            if entry.model is not None:
+                with self._lock:
+                    self.hits += 1
+                return key, entry
+
+            model = loader(model_path)
+            with self._lock:
+                self.loads += 1
+                entry.model, entry.nbytes, entry.copies = model, model_nbytes(model), 1
+                entry.idle.append(model)
+                self._evict()
+
+        return key, entry
+
+    def _evict(self):
+        # the most recently used model is always kept, even if it alone exceeds the memory cap. Models still loading
+        # are not evicted
+        for key in list(self.models)[:-1]:
+            if len(self.models) <= self.max_models and (self.max_bytes is None or self.nbytes <= self.max_bytes):
+                break
+            if self.models[key].model is not None:
+                del self.models[key]
+
+
+MODEL_REGISTRY = ModelRegistry()
@@ -0,0 +1,144 @@
+import numpy as np
+
+### Detection results ###
+"""
+Both GreenOnBrown and GreenOnGreen store their detections in a single NumPy structured array, one row per detection.
+Boxes are (x, y, w, h) in pixels with (cx, cy) the box centre. GreenOnBrown reports a score of 1.0 and class 0.
+"""
+##############################
+
+DETECTION_DTYPE = np.dtype([
+    ('x', np.int32),
+    ('y', np.int32),
+    ('w', np.int32),
+    ('h', np.int32),
+    ('cx', np.int32),
+    ('cy', np.int32),
+    ('area', np.float32),
+    ('score', np.float32),
+    ('class', np.int32)
+])
+
+
+def empty_detections(n=0):
+    return np.zeros(n, dtype=DETECTION_DTYPE)
+
+
+def detections_from_boxes(boxes, centres=None, areas=None, scores=None, classes=None):
+    '''
+    Packs arrays of boxes and their properties into the structured detection format.
+    :param boxes: Nx4 array of (x, y, w, h)
+    :param centres: optional Nx2 array of (cx, cy), defaults to the box centre rounded down
+    :param areas: optional N array of areas, defaults to w * h
+    :param scores: optional N array of confidence scores, defaults to 1.0
+    :param classes: optional N array of class ids, defaults to 0
+    :return: structured array with DETECTION_DTYPE
+    '''
+    boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    detections = empty_detections(len(boxes))
+
+    detections['x'], detections['y'], detections['w'], detections['h'] = boxes.T
+    if centres is None:
+        detections['cx'] = boxes[:, 0] + boxes[:, 2] // 2
+        detections['cy'] = boxes[:, 1] + boxes[:, 3] // 2
+    else:
+        centres = np.asarray(centres).reshape(-1, 2)
+        detections['cx'], detections['cy'] = centres.T
+
+    detections['area'] = boxes[:, 2] * boxes[:, 3] if areas is None else areas
+    detections['score'] = 1.0 if scores is None else scores
+    detections['class'] = 0 if classes is None else classes
+
+    return detections
+
+
+def detections_from_stats(stats, minArea=0):
+    '''
+    Converts the stats output of cv2.connectedComponentsWithStats into detections, dropping the background label
+    and any component with an area of minArea or less.
+    :param stats: stats array from cv2.connectedComponentsWithStats
+    :param minArea: minimum area (in pixels) for a detection
+    :return: structured array with DETECTION_DTYPE
+    '''
+    stats = stats[1:]
+    stats = stats[stats[:, 4] > minArea]
+
+    return detections_from_boxes(stats[:, :4], areas=stats[:, 4])
+
+
+def detections_from_normalised(xyxyn, xywhn, bounds, scores=None, classes=None):
+    '''
+    Converts model boxes normalised to a crop of the image into detections in full-image pixels. Corners and sizes
+    are rounded separately, as ultralytics reports both.
+    :param xyxyn: Nx4 array of normalised (x0, y0, x1, y1)
+    :param xywhn: Nx4 array of normalised (cx, cy, w, h)
+    :param bounds: (x0, y0, x1, y1) of the crop within the image
+    :param scores: optional N array of confidence scores
+    :param classes: optional N array of class ids
+    :return: structured array with DETECTION_DTYPE
+    '''
+    x0, y0, x1, y1 = bounds
+    scale = np.array([x1 - x0, y1 - y0, x1 - x0, y1 - y0], dtype=np.float32)
+    xyxyn = np.asarray(xyxyn, dtype=np.float32).reshape(-1, 4)
+    xywhn = np.asarray(xywhn, dtype=np.float32).reshape(-1, 4)
+
+    corners = np.round(xyxyn * scale).astype(np.int64) + np.array([x0, y0, x0, y0])
+    sizes = np.round(xywhn[:, 2:4] * scale[:2]).astype(np.int64)
+    centres = np.round(corners[:, 0:2] + (corners[:, 2:4] - corners[:, 0:2]) / 2)
+
+    return detections_from_boxes(np.column_stack([corners[:, 0:2], sizes]), centres=centres,
+                                 scores=scores, classes=classes)
+
+
+def detections_from_crop(boxes, shape, bounds, scores=None, classes=None):
+    '''
+    Converts model boxes in the pixels of a crop of the original frame into detections in the resized image. The
+    boxes are normalised to the crop like ultralytics' xyxyn/xywhn, which carries them over to the resized image.
+    :param boxes: Nx4 array of (x0, y0, x1, y1) in crop pixels
+    :param shape: shape of the crop of the original frame
+    :param bounds: (x0, y0, x1, y1) of the crop within the resized image
+    :param scores: optional N array of confidence scores
+    :param classes: optional N array of class ids
+    :return: structured array with DETECTION_DTYPE
+    '''
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scale = np.array([shape[1], shape[0], shape[1], shape[0]], dtype=np.float32)
+    xywh = np.concatenate([(boxes[:, 0:2] + boxes[:, 2:4]) / 2, boxes[:, 2:4] - boxes[:, 0:2]], axis=1)
+
+    return detections_from_normalised(boxes / scale, xywh / scale, bounds, scores=scores, classes=classes)
+
+
+def offset_detections(detections, offsetX, offsetY):
+    '''
+    Shifts detections in place, e.g. from the coordinates of a region back to the full frame.
+    :return: the shifted detections
+    '''
+    detections['x'] += offsetX
+    detections['cx'] += offsetX
+    detections['y'] += offsetY
+    detections['cy'] += offsetY
+
+    return detections
+
+
+def scale_detections(detections, scaleX, scaleY):
+    '''
+    Scales detections in place, e.g. from a reduced frame back to the full resolution.
+    :return: the scaled detections
+    '''
+    for names, scale in ((('x', 'w', 'cx'), scaleX), (('y', 'h', 'cy'), scaleY)):
+        for name in names:
+            detections[name] = np.round(detections[name] * scale)
+    detections['area'] *= scaleX * scaleY
+
+    return detections
+
+
+def boxes_and_centres(detections):
+    '''
+    Converts detections back to the [[x, y, w, h], ...] and [[cx, cy], ...] lists returned by the find methods.
+    '''
+    boxes = np.stack([detections['x'], detections['y'], detections['w'], detections['h']], axis=1)
+    centres = np.stack([detections['cx'], detections['cy']], axis=1)
+
+    return boxes.tolist(), centres.tolist()
@@ -0,0 +1,193 @@
+from owl.detection.detectors import GreenOnBrown
+from owl.detection.regions import is_unset, regions
+from owl.detection.results import empty_detections
+
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import numpy as np
+import pandas as pd
+
+HSV_PARAMS = ['hueMin', 'hueMax', 'brightnessMin', 'brightnessMax', 'saturationMin', 'saturationMax', 'invert_hue']
+SWEEP_DEFAULTS = dict(algorithm='exg', exgMin=30, exgMax=250, hueMin=30, hueMax=90, brightnessMin=5,
+                      brightnessMax=200, saturationMin=30, saturationMax=255, invert_hue=False, minArea=1,
+                      postprocess='contours', roi=None, lanes=None)
+
+# each worker process keeps one sweep, so its detector and buffers are reused across frames
+_WORKER_SWEEP = None
+
+
+def parameter_grid(grid):
+    '''
+    Expands a dictionary of parameter lists into every combination, e.g. {'exgMin': [20, 30], 'minArea': [1, 10]}
+    gives four configs.
+    :param grid: dictionary of GreenOnBrown.find parameter names to lists of values
+    :return: list of config dictionaries
+    '''
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+class ParameterSweep:
+    def __init__(self, configs=()):
+        '''
+        ParameterSweep evaluates many GreenOnBrown configs on the same frames, running each stage of the detector
+        only when its inputs change. The vegetation index depends only on the algorithm (and the HSV thresholds for
+        'exhsv' and 'hsv'), the band and adaptive threshold add exgMin and exgMax, and contours or components are
+        found once per mask and then filtered by minArea. Configs are ordered so those sharing a stage run
+        together. The roi and lanes are honoured as in find, with each region processed separately. Detections are
+        identical to GreenOnBrown.find with the same parameters.
+        :param configs: list of dictionaries of GreenOnBrown.find parameters, or a dictionary of parameter lists
+        expanded with parameter_grid. Parameters not given take the GreenOnBrown.find defaults. Not needed when only
+        detect is used
+        '''
+        if isinstance(configs, dict):
+            configs = parameter_grid(configs)
+
+        self.configs = [dict(SWEEP_DEFAULTS, **self._validate(config)) for config in configs]
+        self.order = sorted(range(len(self.configs)), key=lambda i: self._stage_keys(self.configs[i]))
+        self.detector = GreenOnBrown()
+        self.stage_runs = {'index': 0, 'mask': 0, 'detections': 0}
+        self._stages = {}
+
+    def run(self, frames, workers=1, keep_detections=False):
+        '''
+        Runs every config on every frame.
+        :param frames: iterable of BGR frames, e.g. a FrameStore
+        :param workers: number of processes, frames are split between them
+        :param keep_detections: add a column with the structured detections of each row
+        :return: pandas DataFrame with one row per frame and config
+        '''
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(self.configs,)) as pool:
+                tables = pool.map(_sweep_frame, itertools.count(), frames, itertools.repeat(keep_detections))
+                rows = [row for table in tables for row in table]
+
+        else:
+            rows = [row for frameNo, frame in enumerate(frames)
+                    for row in self.run_frame(frame, frame_no=frameNo, keep_detections=keep_detections)]
+
+        return pd.DataFrame(rows)
+
+    def run_frame(self, frame, frame_no=0, keep_detections=False):
+        '''
+        Runs every config on one frame.
+        :return: list of row dictionaries in the original config order, with a lane_hits column when lanes are set
+        '''
+        rows = [None] * len(self.configs)
+        self._stages = {}
+
+        for i in self.order:
+            config = self.configs[i]
+            regionDetections = self._region_detections(frame, config)
+            detections = np.concatenate(regionDetections) if regionDetections else empty_detections()
+            row = dict(frame=frame_no, **config, detections=len(detections),
+                       total_area=float(detections['area'].sum()))
+            if not is_unset(config['lanes']):
+                row['lane_hits'] = [len(d) > 0 for d in regionDetections]
+            if keep_detections:
+                row['boxes'] = detections
+            rows[i] = row
+
+        return rows
+
+    def detect(self, frame, config, frame_key=None):
+        '''
+        Runs one config on a frame, reusing the stages of the previous call when frame_key matches, e.g. while a
+        single parameter is adjusted interactively.
+        :param frame: BGR frame
+        :param config: dictionary of GreenOnBrown.find parameters, as for the configs
+        :param frame_key: hashable identifying the frame, None always runs every stage
+        :return: the detections, as GreenOnBrown.find stores in detector.detections
+        '''
+        config = dict(SWEEP_DEFAULTS, **self._validate(config))
+        if frame_key is None or self._stages.get('frame') != frame_key:
+            self._stages = {'frame': frame_key}
+
+        regionDetections = self._region_detections(frame, config)
+
+        return np.concatenate(regionDetections) if regionDetections else empty_detections()
+
+    def _region_detections(self, frame, config):
+        '''
+        Runs the stages whose keys differ from the last config run on this frame.
+        :return: list of the detections of each region
+        '''
+        stages = self._stages
+        indexKey, maskKey, detectionsKey = self._stage_keys(config)
+
+        if stages.get('index') != indexKey:
+            stages['index'] = indexKey
+            stages['rectangles'] = regions(frame.shape, roi=config['roi'], lanes=config['lanes'])
+            self.detector.algorithm = config['algorithm']
+            stages['indexes'] = []
+            for x0, y0, x1, y1 in stages['rectangles']:
+                output, stages['threshed'] = self.detector.index(frame[y0:y1, x0:x1],
+                                                                 **{p: config[p] for p in HSV_PARAMS})
+                # the band is applied in place, so every mask starts from a private copy of the index
+                stages['indexes'].append(output.copy())
+            self.stage_runs['index'] += 1
+            stages['mask'] = None
+
+        if stages.get('mask') != maskKey:
+            stages['mask'] = maskKey
+            stages['masks'] = []
+            for index in stages['indexes']:
+                bandOut = self.detector.workspace.buffer('sweep_band', index.shape)
+                np.copyto(bandOut, index)
+                if not stages['threshed']:
+                    self.detector.band(bandOut, exgMin=config['exgMin'], exgMax=config['exgMax'])
+                mask = self.detector.binarise(bandOut, stages['threshed'])
+                # the mask buffer is reused by the next region
+                stages['masks'].append(mask.copy() if len(stages['indexes']) > 1 else mask)
+            self.stage_runs['mask'] += 1
+            stages['detections'] = None
+
+        if stages.get('detections') != detectionsKey:
+            stages['detections'] = detectionsKey
+            # every detection is kept, so each minArea is a filter rather than another pass over the mask
+            stages['all'] = [self.detector.mask_detections(mask, minArea=-1, postprocess=config['postprocess'],
+                                                           offset=rectangle[:2])[1]
+                             for mask, rectangle in zip(stages['masks'], stages['rectangles'])]
+            self.stage_runs['detections'] += 1
+
+        # contour areas are multiples of half a pixel and component areas are integers, so the float32 areas
+        # compare exactly as in find
+        return [d[d['area'] > config['minArea']] for d in stages['all']]
+
+    @staticmethod
+    def _validate(config):
+        unknown = set(config) - set(SWEEP_DEFAULTS)
+        if unknown:
+            raise ValueError(f'[ERROR] ParameterSweep cannot sweep {sorted(unknown)}. Use {list(SWEEP_DEFAULTS)}')
+
+        return config
+
+    @staticmethod
+    def _stage_keys(config):
+        hsvKey = tuple(config[p] for p in HSV_PARAMS) if config['algorithm'] in ['exhsv', 'hsv'] else ()
+        # regions are compared by their repr, as lists are not hashable and None does not sort with lists
+        regionKey = repr((None if is_unset(config['roi']) else config['roi'],
+                          None if is_unset(config['lanes']) else config['lanes']))
+        indexKey = (regionKey, config['algorithm']) + hsvKey
+        # binary hsv output skips the band, so it doesn't depend on exgMin or exgMax
+        maskKey = indexKey if config['algorithm'] == 'hsv' else indexKey + (config['exgMin'], config['exgMax'])
+        detectionsKey = maskKey + (config['postprocess'],)
+
+        return indexKey, maskKey, detectionsKey
+
+
+def _start_worker(configs):
+    global _WORKER_SWEEP
+    _WORKER_SWEEP = ParameterSweep(configs)
+
+
+def _sweep_frame(frame_no, frame, keep_detections):
+    return _WORKER_SWEEP.run_frame(frame, frame_no=frame_no, keep_detections=keep_detections)
+
+
+def sweep(frames, configs, workers=1, keep_detections=False):
+    '''
+    Evaluates a grid of GreenOnBrown configs on a set of frames. See ParameterSweep.
+    :return: pandas DataFrame with one row per frame and config
+    '''
+    return ParameterSweep(configs).run(frames, workers=workers, keep_detections=keep_detections)
@@ -0,0 +1,74 @@
+from owl.detection.detectors import GreenOnBrown, GLOBAL_ALGORITHMS
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import cv2
+
+# rows of context needed either side of a tile: half the 31px adaptive threshold block plus the closing radius
+ADAPTIVE_HALO = 15 + 2
+# closing with 5 iterations of the 3x3 kernel on binary (hsv) output
+BINARY_HALO = 10
+
+
+class TiledGreenOnBrown(GreenOnBrown):
+    def __init__(self, labels='weed', workers=None, tiles=None):
+        '''
+        GreenOnBrown that splits each frame into overlapping horizontal strips and builds the binary mask on a
+        thread pool. OpenCV and NumPy release the GIL, so strips run in parallel. Each strip is processed with enough
+        overlap (halo) for the adaptive threshold and morphology to see the same neighbourhood as on the full frame.
+        Only the strip cores are stitched into the full-frame mask, so the mask and contours are identical to
+        GreenOnBrown's, including detections crossing the seams.
+        :param labels: label drawn on detections
+        :param workers: number of threads, defaults to the number of CPUs
+        :param tiles: number of strips, defaults to the number of workers
+        '''
+        super().__init__(labels=labels)
+        self.workers = workers if workers else os.cpu_count()
+        self.tiles = tiles if tiles else self.workers
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+
+        # each strip has its own detector, and therefore its own workspace
+        self._tileDetectors = [GreenOnBrown(labels=labels) for _ in range(self.tiles)]
+
+    def _mask(self, image, exgMin=30, exgMax=250, show_display=False, **hsv_params):
+        frameH = image.shape[0]
+        maskOut = self.workspace.buffer('tiled_mask', image.shape[:2])
+
+        halo = BINARY_HALO if self.algorithm == 'hsv' else ADAPTIVE_HALO
+        coreEdges = [round(i * frameH / self.tiles) for i in range(self.tiles + 1)]
+
+        # frame-normalised indices are computed once up front, and only the thresholding is tiled
+        output = None
+        if self.algorithm in GLOBAL_ALGORITHMS:
+            output, _ = self.index(image, **hsv_params)
+
+        def run_tile(i):
+            coreStart, coreEnd = coreEdges[i], coreEdges[i + 1]
+            if coreEnd <= coreStart:
+                return
+
+            tileStart, tileEnd = max(coreStart - halo, 0), min(coreEnd + halo, frameH)
+            detector = self._tileDetectors[i]
+            detector.algorithm = self.algorithm
+
+            if output is None:
+                tileMask = detector._mask(image[tileStart:tileEnd], exgMin=exgMin, exgMax=exgMax, **hsv_params)
+
+            else:
+                # the threshold modifies its input in place, so each tile works on its own copy of the shared rows
+                tileIndex = detector.workspace.buffer('tile_index', (tileEnd - tileStart, image.shape[1]))
+                tileIndex[:] = output[tileStart:tileEnd]
+                tileMask = detector._threshold(tileIndex, False, exgMin=exgMin, exgMax=exgMax)
+
+            maskOut[coreStart:coreEnd] = tileMask[coreStart - tileStart:coreEnd - tileStart]
+
+        # list() re-raises any exception from the workers
+        list(self.pool.map(run_tile, range(self.tiles)))
+
+        if show_display:
+            cv2.imshow("Binary Threshold", maskOut)
+
+        return maskOut
+
+    def close(self):
+        self.pool.shutdown()
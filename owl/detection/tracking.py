@@ -0,0 +1,240 @@
+from owl.detection.backends import pairwise_iou
+from owl.detection.regions import is_unset, lane_hits, regions
+from owl.detection.results import DETECTION_DTYPE, boxes_and_centres
+from owl.viz.render import draw_detections
+
+import numpy as np
+import cv2
+
+### Weed tracking ###
+"""
+Consecutive frames from a moving boom overlap heavily, so the same weed is detected many times. Tracker links
+detections across frames, giving each weed a stable id, and predicts where tracked weeds are on frames that are not
+detected. Tracks are returned as structured arrays with the detection fields (see owl.detection.results) followed by
+the track id, the number of frames it was detected in, the frames since it was last detected and a fire flag that is
+set on exactly one frame per weed.
+"""
+##############################
+
+TRACK_DTYPE = np.dtype(DETECTION_DTYPE.descr + [
+    ('id', np.int32),
+    ('hits', np.int32),
+    ('missed', np.int32),
+    ('fire', np.bool_)
+])
+
+
+def _greedy_match(cost, allowed, rows, cols):
+    # pairs the lowest-cost allowed entries first, skipping rows and columns that are already taken. Disallowed
+    # entries (e.g. another class) can have a lower cost than allowed ones, so only the allowed entries are sorted
+    candidates = np.flatnonzero(allowed)
+    matches = []
+    for flat in candidates[np.argsort(cost.ravel()[candidates], kind='stable')]:
+        row, col = np.unravel_index(flat, cost.shape)
+        if row in rows or col in cols:
+            continue
+
+        matches.append((row, col))
+        rows.add(row)
+        cols.add(col)
+
+    return matches
+
+
+class Tracker:
+    def __init__(self, iou_threshold=0.3, max_distance=40, max_missed=5, min_hits=1, smoothing=0.5):
+        '''
+        Tracks weeds between frames with a constant velocity model. Each frame, tracks are moved on by their velocity
+        and matched to detections of the same class, first by box IoU and then, for boxes too small or too fast to
+        overlap, by centroid distance. Velocities are corrected towards the measured motion, and new tracks start with
+        the mean velocity of the matched tracks, since the whole scene moves with the vehicle.
+        :param iou_threshold: minimum IoU between a predicted track and a detection to match them
+        :param max_distance: maximum centroid distance in pixels for matching tracks that do not overlap a detection
+        :param max_missed: frames a track is kept without a detection before it is dropped
+        :param min_hits: frames a weed must be detected in before its track is reported and fires
+        :param smoothing: fraction of the velocity error corrected on each detection, between 0 and 1
+        '''
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.smoothing = smoothing
+
+        self.next_id = 0
+        self.state = np.zeros(0, dtype=TRACK_DTYPE)
+        self.boxes = np.zeros((0, 4))
+        self.velocity = np.zeros((0, 2))
+        self.fired = np.zeros(0, dtype=bool)
+
+    def update(self, detections):
+        '''
+        Moves the tracks on one frame and matches them to the detections of that frame.
+        :param detections: structured detections, e.g. detector.detections
+        :return: confirmed tracks detected in this frame, as a structured array with TRACK_DTYPE
+        '''
+        self._advance()
+
+        detBoxes = np.column_stack([detections['x'], detections['y'], detections['x'] + detections['w'],
+                                    detections['y'] + detections['h']]).astype(float).reshape(-1, 4)
+        matches = self._associate(detBoxes, detections['class'])
+        trackIndex = np.array([t for t, _ in matches], dtype=np.int64)
+        detIndex = np.array([d for _, d in matches], dtype=np.int64)
+
+        # velocity corrected by the error between where the track was predicted and where it was found, spread over
+        # the frames since it was last seen
+        residual = _centres(detBoxes[detIndex]) - _centres(self.boxes[trackIndex])
+        self.velocity[trackIndex] += self.smoothing * residual / (self.state['missed'][trackIndex, np.newaxis] + 1)
+        self.boxes[trackIndex] = detBoxes[detIndex]
+        self._copy_detections(trackIndex, detections[detIndex])
+        self.state['hits'][trackIndex] += 1
+        self.state['missed'][trackIndex] = 0
+
+        unmatchedTracks = np.setdiff1d(np.arange(len(self.state)), trackIndex)
+        self.state['missed'][unmatchedTracks] += 1
+
+        newDetections = np.setdiff1d(np.arange(len(detections)), detIndex)
+        sceneVelocity = self.velocity[trackIndex].mean(axis=0) if len(trackIndex) else np.zeros(2)
+        self._start_tracks(detBoxes[newDetections], detections[newDetections], sceneVelocity)
+
+        keep = self.state['missed'] <= self.max_missed
+        self.state, self.boxes, self.velocity, self.fired = \
+            self.state[keep], self.boxes[keep], self.velocity[keep], self.fired[keep]
+
+        return self._report(self.state['missed'] == 0)
+
+    def predict(self):
+        '''
+        Moves the tracks on one frame without detections, for the frames in between detections.
+        :return: confirmed tracks at their predicted positions, as a structured array with TRACK_DTYPE
+        '''
+        self._advance()
+        self.state['missed'] += 1
+
+        # coasting tracks are reported for as long as they are kept, and are dropped on the next update if still
+        # unmatched after max_missed frames
+        return self._report(np.ones(len(self.state), dtype=bool))
+
+    def reset(self):
+        self.state = self.state[:0]
+        self.boxes, self.velocity, self.fired = self.boxes[:0], self.velocity[:0], self.fired[:0]
+
+    def _advance(self):
+        self.boxes += np.tile(self.velocity, 2)
+        self._copy_boxes()
+
+    def _associate(self, detBoxes, detClasses):
+        if not len(self.state) or not len(detBoxes):
+            return []
+
+        sameClass = self.state['class'][:, np.newaxis] == np.asarray(detClasses)[np.newaxis, :]
+        rows, cols = set(), set()
+
+        ious = pairwise_iou(self.boxes, detBoxes)
+        matches = _greedy_match(-ious, sameClass & (ious >= self.iou_threshold), rows, cols)
+
+        distances = np.linalg.norm(_centres(self.boxes)[:, np.newaxis] - _centres(detBoxes)[np.newaxis, :], axis=2)
+        matches += _greedy_match(distances, sameClass & (distances <= self.max_distance), rows, cols)
+
+        return matches
+
+    def _start_tracks(self, boxes, detections, velocity):
+        tracks = np.zeros(len(detections), dtype=TRACK_DTYPE)
+        for name in DETECTION_DTYPE.names:
+            tracks[name] = detections[name]
+
+        tracks['id'] = np.arange(self.next_id, self.next_id + len(detections))
+        tracks['hits'] = 1
+        self.next_id += len(detections)
+
+        self.state = np.concatenate([self.state, tracks])
+        self.boxes = np.concatenate([self.boxes, boxes])
+        self.velocity = np.concatenate([self.velocity, np.tile(velocity, (len(detections), 1))])
+        self.fired = np.concatenate([self.fired, np.zeros(len(detections), dtype=bool)])
+
+    def _copy_detections(self, index, detections):
+        for name in DETECTION_DTYPE.names:
+            self.state[name][index] = detections[name]
+
+    def _copy_boxes(self):
+        # the reported box and centre follow the predicted float box
+        rounded = np.round(self.boxes).astype(np.int32)
+        self.state['x'], self.state['y'] = rounded[:, 0], rounded[:, 1]
+        self.state['w'], self.state['h'] = rounded[:, 2] - rounded[:, 0], rounded[:, 3] - rounded[:, 1]
+        centres = np.round(_centres(self.boxes)).astype(np.int32)
+        self.state['cx'], self.state['cy'] = centres[:, 0], centres[:, 1]
+
+    def _report(self, visible):
+        confirmed = visible & (self.state['hits'] >= self.min_hits)
+
+        # each weed fires once, on the first frame its track is confirmed
+        self.state['fire'] = confirmed & ~self.fired
+        self.fired |= confirmed
+
+        return self.state[confirmed].copy()
+
+
+def _centres(boxes):
+    return (boxes[:, 0:2] + boxes[:, 2:4]) / 2
+
+
+class TrackedDetector:
+    def __init__(self, detector, every=1, tracker=None):
+        '''
+        Runs a GreenOnBrown or GreenOnGreen detector every few frames and tracks weeds in between, so the detector
+        cost is cut by about the factor every. find has the same parameters and return values as the detector's,
+        with the boxes and centroids taken from the tracks. self.detections holds the tracks of the last frame and
+        self.fire those that should trigger the spray on this frame.
+        :param detector: GreenOnBrown or GreenOnGreen instance
+        :param every: run the detector on one frame in every this many, 1 detects every frame
+        :param tracker: Tracker to use, a default Tracker if not given
+        '''
+        if every < 1:
+            raise ValueError(f'[ERROR] every must be at least 1, got {every}')
+
+        self.detector = detector
+        self.every = every
+        self.tracker = tracker if tracker is not None else Tracker()
+        self.frame_no = 0
+        self.detections = np.zeros(0, dtype=TRACK_DTYPE)
+        self.fire = self.detections
+        self.lane_hits = None
+
+    def find(self, image, annotate=True, **kwargs):
+        '''
+        :param image: input image to be analysed
+        :param annotate: True: draw the tracks on the image; False: tracks only
+        :param kwargs: any other parameters of the detector's find
+        :return: contours (None on tracked frames), bounding boxes, centroids and the image
+        '''
+        cnts = None
+        if self.frame_no % self.every == 0:
+            cnts, _, _, image = self.detector.find(image, annotate=annotate, **kwargs)
+            self.detections = self.tracker.update(self.detector.detections)
+            self.lane_hits = self.detector.lane_hits
+
+        else:
+            self.detections = self.tracker.predict()
+            resolution = kwargs.get('resolution')
+            shape = image.shape if resolution is None else (resolution[1], resolution[0]) + image.shape[2:]
+
+            lanes = kwargs.get('lanes')
+            self.lane_hits = None if is_unset(lanes) else lane_hits(
+                self.detections, regions(shape, roi=kwargs.get('roi'), lanes=lanes))
+
+            # as in the detectors, the frame is only resized when the tracks are drawn on it
+            if annotate:
+                if image.shape != shape:
+                    image = cv2.resize(image, (shape[1], shape[0]))
+                image = draw_detections(image, self.detections[list(DETECTION_DTYPE.names)],
+                                        label=getattr(self.detector, 'label', 'weed'),
+                                        names=getattr(self.detector, 'names', None))
+
+        self.frame_no += 1
+        self.fire = self.detections[self.detections['fire']]
+        boxes, centres = boxes_and_centres(self.detections)
+
+        return cnts, boxes, centres, image
+
+    def reset(self):
+        self.tracker.reset()
+        self.frame_no = 0
@@ -1,3 +1,13 @@
 # openweedlocator-tools/utils/__init__.py
 
-from .image import FrameReader
+from owl._lazy import lazy_exports
+
+_EXPORTS = {
+    'FrameReader': '.image',
+    'LatestFrameCapture': '.image',
+    'FrameStore': '.framestore',
+    'QualityGovernor': '.governor',
+}
+__all__ = list(_EXPORTS)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
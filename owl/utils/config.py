@@ -16,8 +16,14 @@ CONFIG_DAY_SENSITIVITY_1 = {
   "minArea": 10,
   "invert_hue": False,
 
-  "//comment_general": "parameters related to general OWL operation",
+  "//comment_regions": "optional region of interest [x, y, w, h] and nozzle lanes (number of lanes or [[x_start, x_end], ...])",
+  "roi": "null",
+  "lanes": "null",
+
+  "//comment_general": "parameters related to general OWL operation, deadline_ms (per-frame budget) enables the quality governor",
   "show_display": False,
+  "detections_only": False,
+  "deadline_ms": "null",
   "algorithm": "exhsv",
   "resolution": [416, 320]
 }
\ No newline at end of file
@@ -0,0 +1,107 @@
+import numpy as np
+import json
+import os
+import cv2
+
+FRAMES_FILE = 'frames.u8'
+INDEX_FILE = 'index.json'
+
+
+class FrameStore:
+    def __init__(self, path):
+        '''
+        FrameStore is a clip or image directory decoded once at a fixed resolution into one contiguous uint8 file,
+        opened as a read-only memory map. Frames are returned as views into the map, so repeated passes over the
+        same frames cost no decoding, resizing or copying. Build one with FrameStore.build.
+        :param path: directory containing the frames file and its index
+        '''
+        if not FrameStore.is_store(path):
+            raise FileNotFoundError(f'[ERROR] No frame store found at {path}')
+
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+
+        self.path = path
+        self.shape = tuple(self.index['shape'])
+        self.resolution = (self.shape[1], self.shape[0])
+        self.names = self.index['names']
+
+        count = self.index['count']
+        self.frames = np.memmap(os.path.join(path, FRAMES_FILE), dtype=np.uint8, mode='r',
+                                shape=(count,) + self.shape) if count else np.empty((0,) + self.shape, np.uint8)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, frame_no):
+        return self.frames[frame_no]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    @staticmethod
+    def is_store(path):
+        return os.path.isfile(os.path.join(path, INDEX_FILE)) and os.path.isfile(os.path.join(path, FRAMES_FILE))
+
+    @classmethod
+    def build(cls, source, path, resolution=(640, 480), reduced_decode=False):
+        '''
+        Decodes every frame of a video, image directory or single image at the given resolution and writes them to
+        a new frame store.
+        :param source: path to the media
+        :param path: directory to write the store to, created if needed
+        :param resolution: (width, height) the frames are stored at
+        :param reduced_decode: use reduced-scale JPEG decoding for image directories
+        :return: the opened FrameStore
+        '''
+        os.makedirs(path, exist_ok=True)
+        shape = (resolution[1], resolution[0], 3)
+
+        count = 0
+        names = []
+        with open(os.path.join(path, FRAMES_FILE), 'wb') as f:
+            for name, frame in cls._decode(source, resolution, reduced_decode):
+                if frame.shape != shape:
+                    raise ValueError(f'[ERROR] Frame {name} has shape {frame.shape}, expected {shape}')
+
+                f.write(np.ascontiguousarray(frame).tobytes())
+                names.append(name)
+                count += 1
+
+        # the index is written last, so an interrupted build is never mistaken for a complete store
+        with open(os.path.join(path, INDEX_FILE), 'w') as f:
+            json.dump({'source': os.path.abspath(source),
+                       'shape': list(shape),
+                       'dtype': 'uint8',
+                       'count': count,
+                       'names': names}, f)
+
+        return cls(path)
+
+    @staticmethod
+    def _decode(source, resolution, reduced_decode):
+        # imported here as FrameReader itself opens frame stores
+        from owl.utils.image import FrameReader, SUPPORTED_VIDEO_FORMATS
+
+        if os.path.isfile(source) and os.path.splitext(source)[1].lower() in SUPPORTED_VIDEO_FORMATS:
+            cap = cv2.VideoCapture(source)
+            frameNo = 0
+            while True:
+                grabbed, frame = cap.read()
+                if not grabbed:
+                    break
+                yield str(frameNo), cv2.resize(frame, resolution, interpolation=cv2.INTER_AREA)
+                frameNo += 1
+            cap.release()
+
+        elif os.path.isdir(source):
+            reader = FrameReader(source, resolution=resolution, loop_time=None, loop=False,
+                                 reduced_decode=reduced_decode)
+            for name in reader.files:
+                frame = reader.read()
+                if frame is not None:
+                    yield name, frame
+
+        else:
+            yield os.path.basename(source), FrameReader(source, resolution=resolution,
+                                                        reduced_decode=reduced_decode).read()
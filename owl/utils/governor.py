@@ -0,0 +1,204 @@
+from owl.detection.regions import is_unset
+from owl.detection.results import boxes_and_centres, scale_detections
+from owl.utils.io import setup_and_run_detector
+
+from collections import deque
+import numpy as np
+import time
+import cv2
+
+# cheaper algorithm each one steps down to when over budget. gndvi has none: it is used with NIR imagery, where exg
+# would measure something else, so it only steps down in resolution
+ALGORITHM_FALLBACKS = {'exhsv': 'exg', 'exgr': 'exg'}
+RESOLUTION_STEPS = [0.75, 0.5]
+
+
+def default_levels(config, steps=RESOLUTION_STEPS):
+    '''
+    Builds the quality ladder for a config, from the configured quality down. Green-on-brown first swaps the algorithm
+    for a cheaper one measuring the same thing (see ALGORITHM_FALLBACKS), then reduces the resolution. Green-on-green reduces the resolution, which sets the YOLO input
+    size, in multiples of the 32 pixel model stride.
+    :param config: config dictionary (see owl.utils.config)
+    :param steps: resolution scale factors, in decreasing order
+    :return: list of config overrides, each with 'resolution' and 'algorithm'
+    '''
+    algorithm = config.get('algorithm')
+    width, height = config.get('resolution')
+    multiple = 32 if algorithm == 'gog' else 16
+
+    levels = [{'resolution': [width, height], 'algorithm': algorithm}]
+    if algorithm in ALGORITHM_FALLBACKS:
+        algorithm = ALGORITHM_FALLBACKS[algorithm]
+        levels.append({'resolution': [width, height], 'algorithm': algorithm})
+
+    for step in steps:
+        resolution = [max(multiple, int(round(width * step / multiple)) * multiple),
+                      max(multiple, int(round(height * step / multiple)) * multiple)]
+        if resolution != levels[-1]['resolution']:
+            levels.append({'resolution': resolution, 'algorithm': algorithm})
+
+    return levels
+
+
+class QualityGovernor:
+    def __init__(self, weed_detector, config, deadline_ms=None, levels=None, window=10, headroom=0.6,
+                 detections_only=None):
+        '''
+        Runs setup_and_run_detector against a per-frame deadline. Once the mean latency of the last window frames is
+        over the deadline, it steps down one quality level (algorithm, then resolution, see default_levels). Once it is
+        under headroom * deadline, it steps back up. A step up that is over budget straight away makes the next attempt
+        at that level wait twice as long. Every switch is printed and recorded in self.history.
+        When the resolution is reduced, frames are resized to it and the ROI and lanes are scaled to match. Contours,
+        boxes, centroids and weed_detector.detections are scaled back, so they are always reported in the coordinates
+        of the top level, and the annotated image is resized back to match.
+        self.detections holds the detections of the last frame.
+        :param weed_detector: GreenOnBrown or GreenOnGreen instance
+        :param config: config dictionary (see owl.utils.config), the top quality level
+        :param deadline_ms: per-frame budget in milliseconds, defaults to config['deadline_ms']
+        :param levels: list of config overrides from highest to lowest quality, defaults to default_levels(config)
+        :param window: number of frames the latency is averaged over, and the wait after each switch
+        :param headroom: fraction of the deadline the latency must be under before stepping up
+        :param detections_only: as for setup_and_run_detector
+        '''
+        self.weed_detector = weed_detector
+        self.config = config
+        self.deadline_ms = deadline_ms if deadline_ms is not None else config.get('deadline_ms')
+        if is_unset(self.deadline_ms) or float(self.deadline_ms) <= 0:
+            raise ValueError(f'[ERROR] QualityGovernor needs a positive deadline_ms, got {self.deadline_ms}')
+        self.deadline_ms = float(self.deadline_ms)
+
+        self.levels = levels if levels is not None else default_levels(config)
+        self.window = window
+        self.headroom = headroom
+        self.detections_only = detections_only
+
+        self.level = 0
+        self.latencies = deque(maxlen=window)
+        self.failures = [0] * len(self.levels)
+        self.frame_no = 0
+        self.switch_frame = 0
+        self.history = []
+        self.detections = None
+        self._configs = [self._level_config(i) for i in range(len(self.levels))]
+
+    def run(self, frame):
+        '''
+        Runs the detector on the frame at the current quality level.
+        :return: contours, bounding boxes, centroids and the (annotated) image, as setup_and_run_detector
+        '''
+        start = time.perf_counter()
+
+        config = self._configs[self.level]
+        scale = self._scale(self.level)
+        image = frame
+        if config.get('algorithm') != 'gog' and scale != (1.0, 1.0):
+            # green-on-brown works on the frame as given, so it is reduced here
+            image = cv2.resize(frame, (int(round(frame.shape[1] * scale[0])), int(round(frame.shape[0] * scale[1]))),
+                               interpolation=cv2.INTER_AREA)
+
+        result = setup_and_run_detector(self.weed_detector, image, config, detections_only=self.detections_only)
+        if scale != (1.0, 1.0):
+            result = self._restore(result, frame, image, config)
+        self.detections = self.weed_detector.detections
+
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        self.frame_no += 1
+        self._govern()
+
+        return result
+
+    @property
+    def current(self):
+        '''
+        :return: the config overrides of the current level
+        '''
+        return self.levels[self.level]
+
+    def mean_latency(self):
+        return float(np.mean(self.latencies)) if self.latencies else 0.0
+
+    def _govern(self):
+        if len(self.latencies) < self.window:
+            return
+
+        latency = self.mean_latency()
+        if latency > self.deadline_ms and self.level < len(self.levels) - 1:
+            # over budget soon after stepping up: that level is not sustainable yet
+            if self.history and self.history[-1]['to'] == self.level and self.history[-1]['to'] < self.history[-1]['from'] \
+                    and self.frame_no - self.switch_frame <= 2 * self.window:
+                self.failures[self.level] += 1
+            self._switch(self.level + 1, latency, 'over deadline')
+
+        elif latency < self.headroom * self.deadline_ms and self.level > 0:
+            # each failed attempt at the level above doubles the time spent under budget before trying it again
+            if self.frame_no - self.switch_frame >= self.window * 2 ** self.failures[self.level - 1]:
+                self._switch(self.level - 1, latency, 'headroom')
+
+    def _switch(self, level, latency, reason):
+        previous, current = self.levels[self.level], self.levels[level]
+        changes = ', '.join(f'{key} {previous.get(key)} -> {current.get(key)}' for key in current
+                            if previous.get(key) != current.get(key))
+
+        self.history.append({'frame': self.frame_no, 'time': time.time(), 'from': self.level, 'to': level,
+                             'latency_ms': latency, 'deadline_ms': self.deadline_ms, 'reason': reason,
+                             'changes': changes})
+        print(f'[INFO] Quality level {self.level} -> {level} ({changes}): mean latency {latency:.1f} ms, '
+              f'deadline {self.deadline_ms:.1f} ms, {reason}')
+
+        self.level = level
+        self.switch_frame = self.frame_no
+        self.latencies.clear()
+
+    def _restore(self, result, frame, image, config):
+        '''
+        Scales the result of a reduced level back to the coordinates of the top level: the frame as given for
+        green-on-brown, the configured resolution for green-on-green.
+        '''
+        cnts, _, _, annotated = result
+        if config.get('algorithm') == 'gog':
+            width, height = self.levels[0]['resolution']
+            scaleX, scaleY = (width / config['resolution'][0], height / config['resolution'][1])
+        else:
+            width, height = frame.shape[1], frame.shape[0]
+            scaleX, scaleY = width / image.shape[1], height / image.shape[0]
+
+        detections = scale_detections(self.weed_detector.detections, scaleX, scaleY)
+        boxes, centres = boxes_and_centres(detections)
+        if cnts is not None:
+            cnts = [np.round(c * (scaleX, scaleY)).astype(c.dtype) for c in cnts]
+
+        detectionsOnly = self.detections_only if self.detections_only is not None else \
+            self.config.get('detections_only', False)
+        if detectionsOnly:
+            # nothing was drawn, so the input frame is returned untouched as at the top level
+            annotated = frame
+        elif annotated.shape[:2] != (height, width):
+            annotated = cv2.resize(annotated, (width, height), interpolation=cv2.INTER_NEAREST)
+
+        return cnts, boxes, centres, annotated
+
+    def _scale(self, level):
+        baseW, baseH = self.levels[0]['resolution']
+        width, height = self.levels[level]['resolution']
+
+        return width / baseW, height / baseH
+
+    def _level_config(self, level):
+        config = dict(self.config, **self.levels[level])
+        scaleX, scaleY = self._scale(level)
+        if (scaleX, scaleY) == (1.0, 1.0):
+            return config
+
+        # the ROI, lane columns and minimum area are in pixels of the detection resolution
+        if config.get('minArea') is not None:
+            config['minArea'] = config['minArea'] * scaleX * scaleY
+
+        if not is_unset(config.get('roi')):
+            x, y, w, h = config['roi']
+            config['roi'] = [int(round(x * scaleX)), int(round(y * scaleY)),
+                             int(round(w * scaleX)), int(round(h * scaleY))]
+
+        if not is_unset(config.get('lanes')) and not isinstance(config['lanes'], int):
+            config['lanes'] = [[int(round(x0 * scaleX)), int(round(x1 * scaleX))] for x0, x1 in config['lanes']]
+
+        return config
@@ -1,16 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
 import time
 
 import os
 import cv2
 from imutils.video import FileVideoStream
 
+from owl.utils.framestore import FrameStore
+from owl.utils.video import SeekableVideoReader
+
+
+SUPPORTED_IMAGE_FORMATS = ['.png', '.jpg', '.jpeg']
+SUPPORTED_VIDEO_FORMATS = ['.mp4', '.avi']
+
+# JPEG decoders can skip DCT detail and decode straight to 1/2, 1/4 or 1/8 scale
+REDUCED_DECODE_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+# start-of-frame markers carrying the image size (0xC4, 0xC8 and 0xCC share the range but are not SOF)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(path):
+    '''
+    Reads the width and height of a JPEG from its header without decoding it.
+    :param path: path to the JPEG
+    :return: (width, height), or None if no frame header was found or the file is truncated
+    '''
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+
+            # markers can be preceded by any number of 0xFF fill bytes
+            while len(marker) == 2 and marker[1] == 0xFF:
+                marker = marker[1:] + f.read(1)
+
+            if len(marker) < 2:
+                return None
+
+            if marker[1] == 0x01 or 0xD0 <= marker[1] <= 0xD8:
+                continue  # standalone markers have no length
+
+            # a truncated or corrupt file would otherwise seek backwards and read the same marker forever
+            lengthBytes = f.read(2)
+            length = int.from_bytes(lengthBytes, 'big')
+            if len(lengthBytes) < 2 or length < 2:
+                return None
+
+            if marker[1] in JPEG_SOF_MARKERS:
+                header = f.read(5)
+                if len(header) < 5:
+                    return None
+                return int.from_bytes(header[3:5], 'big'), int.from_bytes(header[1:3], 'big')
+
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def reduced_decode_factor(size, resolution):
+    '''
+    Picks the largest decoder downscale that still leaves at least the target resolution.
+    :param size: (width, height) of the full-resolution image
+    :param resolution: (width, height) the image will be resized to
+    :return: 1, 2, 4 or 8
+    '''
+    for factor in REDUCED_DECODE_FLAGS:
+        # libjpeg rounds the scaled size up
+        if -(-size[0] // factor) >= resolution[0] and -(-size[1] // factor) >= resolution[1]:
+            return factor
+
+    return 1
+
+
+def imread_resized(path, resolution, reduced_decode=False):
+    '''
+    Reads an image and resizes it to the target resolution with INTER_AREA.
+    :param path: path to the image
+    :param resolution: (width, height) of the output, None keeps the original size
+    :param reduced_decode: decode JPEGs at 1/2, 1/4 or 1/8 scale when that still covers the target resolution,
+    leaving only a small final resize
+    :return: BGR image, or None if it could not be read
+    '''
+    flag = cv2.IMREAD_COLOR
+    if reduced_decode and resolution is not None and os.path.splitext(path)[1].lower() in ['.jpg', '.jpeg']:
+        size = jpeg_size(path)
+        if size is not None:
+            flag = REDUCED_DECODE_FLAGS.get(reduced_decode_factor(size, resolution), cv2.IMREAD_COLOR)
+
+    image = cv2.imread(path, flag)
+    if image is None or resolution is None:
+        return image
+
+    return cv2.resize(image, resolution, interpolation=cv2.INTER_AREA)
+
+
 class FrameReader:
-    def __init__(self, path, resolution=(640, 480), loop_time=0.5):
+    def __init__(self, path, resolution=(640, 480), loop_time=0.5, prefetch=0, workers=1, loop=True,
+                 reduced_decode=False, seekable=False):
         '''
         FrameReader allows users to provide a directory of images, video or a single image to OWL for testing
         and visualisation purposes.
-        :param path: path to the media (single image, directory of images or video)
-        :param loop_time: the delay between image display if using a directory)
+        :param path: path to the media (single image, directory of images, video or a FrameStore directory)
+        :param resolution: (width, height) frames are resized to, None keeps the size of the source
+        :param loop_time: the delay between image display if using a directory). None returns a new image on every
+        read, for replaying directories as fast as they can be processed
+        :param prefetch: number of directory images decoded ahead of the caller. 0 decodes on the calling thread
+        :param workers: number of threads decoding ahead when prefetch is set
+        :param loop: restart from the first image once the end of a directory is reached, otherwise return None
+        :param reduced_decode: decode large JPEGs at a reduced scale chosen from the resolution before resizing
+        :param seekable: read video through a cached frame index so it can be seeked and reset without re-decoding
         '''
 
         self.loop_time = loop_time
@@ -18,32 +119,61 @@ class FrameReader:
         self.resolution = resolution
         self.curr_image = None
         self.files = None
+        self.loop = loop
+        self.reduced_decode = reduced_decode
+        self.seekable = seekable
+
+        self.prefetch = prefetch
+        self.pool = None
+        self.pending = deque()
+        self.next_index = 0
+
+        self.frames_read = 0
+        self.decode_time = 0.0
+        self.decode_count = 0
+        self.first_read_time = None
+        self._statsLock = threading.Lock()
 
-        if os.path.isdir(path):
-            self.files = iter(os.listdir(path))
+        self.store = None
+
+        if os.path.isdir(path) and FrameStore.is_store(path):
+            # frames are views into the memory-mapped store, so there is nothing to decode or prefetch
+            self.store = FrameStore(path)
+            self.files = self.store.names
+            self.path = path
+            self.cam = None
+            self.input_type = "store"
+            self.single_image = False
+
+        elif os.path.isdir(path):
+            # sorted once so playback order is stable across platforms and wrap-arounds don't re-list the directory
+            self.files = sorted(f for f in os.listdir(path)
+                                if os.path.splitext(f)[1].lower() in SUPPORTED_IMAGE_FORMATS)
             self.path = path
             self.cam = None
             self.input_type = "directory"
             self.single_image = False
 
+            if prefetch:
+                self.pool = ThreadPoolExecutor(max_workers=workers)
+
         elif os.path.isfile(path):
-            supported_image_formats = ['.png', '.jpg', '.jpeg']
-            supported_video_formats = ['.mp4', '.avi']
             _, ext = os.path.splitext(path)
 
-            if ext.lower() in supported_image_formats:
-                self.cam = cv2.resize(cv2.imread(path), self.resolution, interpolation=cv2.INTER_AREA)
+            if ext.lower() in SUPPORTED_IMAGE_FORMATS:
+                self.cam = imread_resized(path, self.resolution, reduced_decode=reduced_decode)
                 self.input_type = "image"
                 self.single_image = True
 
-            elif ext.lower() in supported_video_formats:
-                self.cam = FileVideoStream(path).start()
+            elif ext.lower() in SUPPORTED_VIDEO_FORMATS:
+                self.path = path
+                self.cam = SeekableVideoReader(path) if seekable else FileVideoStream(path).start()
                 self.input_type = "video"
                 self.single_image = False
 
             else:
                 raise ValueError(
-                    f'[ERROR] Unsupported file type: {ext}. Supported formats are {supported_image_formats + supported_video_formats}')
+                    f'[ERROR] Unsupported file type: {ext}. Supported formats are {SUPPORTED_IMAGE_FORMATS + SUPPORTED_VIDEO_FORMATS}')
 
         else:
             raise FileNotFoundError(f'[ERROR] The provided path does not exist: {path}')
@@ -53,18 +183,11 @@ class FrameReader:
             if self.single_image:
                 return self.cam
 
-            elif self.files:
-                if self.curr_image is None or (time.time() - self.loop_start_time) > self.loop_time:
-                    try:
-                        image = next(self.files)
-                        self.curr_image = cv2.imread(os.path.join(self.path, image))
-                        self.curr_image = cv2.resize(self.curr_image, self.resolution, interpolation=cv2.INTER_AREA)
-
-                        self.loop_start_time = time.time()
-
-                    except StopIteration:
-                        self.files = iter(os.listdir(self.path))  # restart from first image
-                        return self.read()
+            elif self.files is not None:
+                if self.curr_image is None or self.loop_time is None or \
+                        (time.time() - self.loop_start_time) > self.loop_time:
+                    self.curr_image = self._next_image()
+                    self.loop_start_time = time.time()
 
                 return self.curr_image
 
@@ -73,19 +196,32 @@ class FrameReader:
                 if frame is None:
                     return None
 
-                frame = cv2.resize(frame, self.resolution, interpolation=cv2.INTER_AREA)
+                if self.resolution is not None:
+                    frame = cv2.resize(frame, self.resolution, interpolation=cv2.INTER_AREA)
                 return frame
 
         except cv2.error:
             return None
 
+    def stats(self):
+        '''
+        :return: frames returned per second since the first read and the mean time to decode and resize an image
+        '''
+        elapsed = time.perf_counter() - self.first_read_time if self.first_read_time else 0.0
+        return {'frames_read': self.frames_read,
+                'fps': self.frames_read / elapsed if elapsed else 0.0,
+                'decode_ms': self.decode_time / self.decode_count * 1000 if self.decode_count else 0.0}
 
     def reset(self):
-        if self.input_type == "directory":
-            # reset the iterator to the beginning of the directory
-            self.files = iter(os.listdir(self.path))
+        if self.input_type in ["directory", "store"]:
+            # restart from the first image, discarding anything decoded ahead
+            self._cancel_pending()
+            self.next_index = 0
             self.curr_image = None
 
+        elif self.input_type == "video" and self.seekable:
+            self.cam.seek(0)
+
         elif self.input_type == "video":
             # stop the current video stream and start a new one
             self.cam.stop()
@@ -93,7 +229,181 @@ class FrameReader:
 
         self.loop_start_time = time.time()  # reset the loop timer
 
+    def seek(self, frame_no):
+        '''
+        Moves a seekable video to frame_no, so the next read returns that frame.
+        '''
+        if not (self.input_type == "video" and self.seekable):
+            raise ValueError('[ERROR] Seeking requires a video opened with seekable=True')
+
+        self.cam.seek(frame_no)
+
     def stop(self):
+        if self.pool:
+            self._cancel_pending()
+            self.pool.shutdown()
+
         if not self.single_image and self.cam:
             self.cam.stop()
 
+    def _next_image(self):
+        if not self.files:
+            return None
+
+        if self.first_read_time is None:
+            self.first_read_time = time.perf_counter()
+
+        if self.pool is None:
+            index = self._advance()
+            image = None if index is None else self._decode(index)
+
+        else:
+            # keep the ring of decodes full, then wait on the oldest one
+            while len(self.pending) < self.prefetch:
+                index = self._advance()
+                if index is None:
+                    break
+                self.pending.append(self.pool.submit(self._decode, index))
+
+            image = self.pending.popleft().result() if self.pending else None
+
+        if image is not None:
+            self.frames_read += 1
+
+        return image
+
+    def _advance(self):
+        if self.next_index >= len(self.files):
+            if not self.loop:
+                return None
+            self.next_index = 0  # restart from first image
+
+        index = self.next_index
+        self.next_index += 1
+
+        return index
+
+    def _decode(self, index):
+        if self.store is not None:
+            frame = self.store[index]
+            if self.resolution is not None and self.store.resolution != tuple(self.resolution):
+                frame = cv2.resize(frame, self.resolution, interpolation=cv2.INTER_AREA)
+
+            return frame
+
+        start = time.perf_counter()
+        image = imread_resized(os.path.join(self.path, self.files[index]), self.resolution,
+                               reduced_decode=self.reduced_decode)
+
+        with self._statsLock:
+            self.decode_time += time.perf_counter() - start
+            self.decode_count += 1
+
+        return image
+
+    def _cancel_pending(self):
+        while self.pending:
+            self.pending.popleft().cancel()
+
+
+class LatestFrameCapture:
+    def __init__(self, src=0):
+        '''
+        LatestFrameCapture reads a live camera on a background thread and keeps only the newest frame, so a slow
+        detector always works on the most recent image instead of draining a backlog from the driver buffer. Frames
+        are timestamped on capture. It has the same read/isOpened/release interface as cv2.VideoCapture.
+        :param src: camera index or stream URL passed to cv2.VideoCapture
+        '''
+        self.cam = cv2.VideoCapture(src)
+
+        self.frame = None
+        self.grabbed = False
+        self.timestamp = None
+        self.read_timestamp = None
+        self.frame_id = 0
+        self.last_read_id = 0
+
+        self.frames_captured = 0
+        self.frames_read = 0
+        self.dropped = 0
+        self.last_age = 0.0
+        self.max_age = 0.0
+
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._update, daemon=True)
+
+    def start(self):
+        if self.cam.isOpened():
+            self.thread.start()
+
+        return self
+
+    def isOpened(self):
+        return self.cam.isOpened()
+
+    def read(self, timeout=None):
+        '''
+        Returns the newest frame not yet read, waiting for one to arrive like cv2.VideoCapture.read.
+        :param timeout: optional seconds to wait before giving up, None waits until a frame arrives or the camera stops
+        :return: (grabbed, frame) as for cv2.VideoCapture.read, (False, None) if no frame arrived
+        '''
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id > self.last_read_id or self.stopped, timeout=timeout)
+            if self.frame_id == self.last_read_id:
+                return False, None
+
+            self.last_read_id = self.frame_id
+            self.frames_read += 1
+            self.read_timestamp = self.timestamp
+            self.last_age = time.perf_counter() - self.timestamp
+            self.max_age = max(self.max_age, self.last_age)
+
+            return self.grabbed, self.frame
+
+    def frame_age(self):
+        '''
+        :return: seconds since the last frame returned by read() was captured. Call after acting on a frame to get
+        the end-to-end latency from capture to action.
+        '''
+        if self.frames_read == 0:
+            return None
+
+        return time.perf_counter() - self.read_timestamp
+
+    def stats(self):
+        return {'frames_captured': self.frames_captured,
+                'frames_read': self.frames_read,
+                'dropped': self.dropped,
+                'last_age_ms': self.last_age * 1000,
+                'max_age_ms': self.max_age * 1000}
+
+    def release(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+        if self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        self.cam.release()
+
+    def _update(self):
+        while not self.stopped:
+            grabbed, frame = self.cam.read()
+            timestamp = time.perf_counter()
+
+            with self.condition:
+                if not grabbed:
+                    # camera disconnected or stream ended
+                    self.stopped = True
+                    self.condition.notify_all()
+                    break
+
+                # a frame that was never read before being replaced is dropped
+                if self.frame_id > self.last_read_id:
+                    self.dropped += 1
+
+                self.grabbed, self.frame, self.timestamp = grabbed, frame, timestamp
+                self.frame_id += 1
+                self.frames_captured += 1
+                self.condition.notify_all()
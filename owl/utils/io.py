@@ -17,12 +17,55 @@ def load_config(CONFIG_NAME):
 
     return config
 
-def setup_and_run_detector(weed_detector, frame, config):
+def setup_and_run_detector(weed_detector, frame, config, detections_only=None):
+    '''
+    Runs the weed detector on the frame with the parameters in the config.
+    :param weed_detector: GreenOnBrown or GreenOnGreen instance
+    :param frame: BGR frame
+    :param config: config dictionary (see owl.utils.config)
+    :param detections_only: True: skip all drawing and the defensive frame copy, the returned image is the input
+    frame untouched; defaults to config['detections_only'] or False
+    :return: contours, bounding boxes, centroids and the (annotated) image
+    '''
+    if detections_only is None:
+        detections_only = config.get('detections_only', False)
+    image = frame if detections_only else frame.copy()
+
+    return weed_detector.find(image, **detector_parameters(config, detections_only=detections_only))
+
+
+def setup_and_run_batch(weed_detector, frames, config, detections_only=None):
+    '''
+    Runs the weed detector on a batch of frames, e.g. one per camera, with the parameters in the config.
+    :param weed_detector: GreenOnBrown or GreenOnGreen instance
+    :param frames: list of BGR frames
+    :param config: config dictionary (see owl.utils.config)
+    :param detections_only: as for setup_and_run_detector
+    :return: list of (contours, bounding boxes, centroids, image) tuples in the same order as frames
+    '''
+    if detections_only is None:
+        detections_only = config.get('detections_only', False)
+    images = frames if detections_only else [frame.copy() for frame in frames]
+
+    return weed_detector.find_batch(images, **detector_parameters(config, detections_only=detections_only))
+
+
+def detector_parameters(config, detections_only=False):
+    '''
+    Collects the find() parameters for the configured algorithm from the config.
+    :param config: config dictionary (see owl.utils.config)
+    :param detections_only: True: the detections are not drawn on the image
+    :return: dictionary of keyword arguments for GreenOnGreen.find or GreenOnBrown.find
+    '''
     # load general parameters
     show_display = config.get('show_display')
     algorithm = config.get('algorithm')
     resolution = tuple(config.get('resolution'))
 
+    # load region parameters, "null" or empty for the full frame
+    roi = None if config.get('roi') in ["null", "", None] else config.get('roi')
+    lanes = None if config.get('lanes') in ["null", "", None] else config.get('lanes')
+
     # load GreenonBrown parameters
     exgMin = config.get('exgMin')
     exgMax = config.get('exgMax')
@@ -41,17 +84,18 @@ def setup_and_run_detector(weed_detector, frame, config):
     filter_id = None if config.get('filter_id') == "null" or config.get('filter_id') == "" else config.get('filter_id')
 
     if algorithm == 'gog':
-        return weed_detector.find(
-            frame.copy(),
+        return dict(
             conf=conf,
             iou=iou,
             resolution=resolution,
-            filter_id=filter_id
+            filter_id=filter_id,
+            annotate=not detections_only,
+            roi=roi,
+            lanes=lanes
         )
 
     else:
-        return weed_detector.find(
-            frame.copy(),
+        return dict(
             exgMin=exgMin,
             exgMax=exgMax,
             hueMin=hueMin,
@@ -63,7 +107,9 @@ def setup_and_run_detector(weed_detector, frame, config):
             show_display=show_display,
             algorithm=algorithm,
             minArea=minArea,
-            invert_hue=invert_hue
+            invert_hue=invert_hue,
+            postprocess=config.get('postprocess', 'contours'),
+            annotate=not detections_only,
+            roi=roi,
+            lanes=lanes
         )
-
-
@@ -0,0 +1,261 @@
+from owl.utils.workspace import Workspace
+
+import numpy as np
+import cv2
+
+### Fused vegetation index kernels ###
+"""
+The functions in owl.utils.algorithms are kept as the readable reference implementations. The IndexEngine below
+computes the same indices bit-for-bit, but reads the uint8 frame once, avoids re-slicing the channels and writes
+every intermediate into scratch buffers that are kept between calls. Results are written into a caller-provided
+output buffer (or an engine-owned one if none is given).
+"""
+##############################
+
+# ExGR subtracts float32(1.4 * R). As every other term is an integer, floor(x - 1.4R) == x - ceil(1.4R), so the
+# rounded-up products can be looked up as int16 and ExGR computed without leaving the integer domain.
+EXGR_RED_LUT = np.ceil(np.float32(1.4) * np.arange(256, dtype=np.float32)).astype(np.int16)
+
+
+class IndexEngine:
+    def __init__(self, workspace=None):
+        '''
+        IndexEngine computes the fused vegetation index kernels using scratch buffers from a Workspace. Buffers are
+        allocated on the first frame of a given shape and reused for every frame after that.
+        :param workspace: Workspace to draw buffers from, shared with the caller if provided
+        '''
+        self.workspace = Workspace() if workspace is None else workspace
+
+        self.algorithms = {
+            'exg': self.exg,
+            'exgr': self.exgr,
+            'exg_int': self.exg_int,
+            'exgr_int': self.exgr_int,
+            'maxg': self.maxg,
+            'nexg': self.exg_standardised,
+            'exhsv': self.exg_standardised_hue,
+            'hsv': self.hsv
+        }
+
+    def compute(self, algorithm, image, out=None, **kwargs):
+        '''
+        Computes the named algorithm on the image.
+        :param algorithm: one of the keys in IndexEngine.algorithms
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 output buffer with the same height and width as the image
+        :param kwargs: hue, saturation and brightness thresholds for the 'exhsv' and 'hsv' algorithms
+        :return: grayscale (or binary for 'hsv') image written into out
+        '''
+        return self.algorithms[algorithm](image, out=out, **kwargs)
+
+    def exg(self, image, out=None):
+        '''
+        Fused ExG. The result of 2G - R - B is always an integer, so OpenCV's saturating conversion to uint8 is
+        identical to the float32 clip-and-truncate in owl.utils.algorithms.exg.
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 output buffer
+        :return: grayscale image
+        '''
+        out = self._output(image, out)
+        acc = self._exg_float(image)
+        cv2.add(acc, 0, dst=out, dtype=cv2.CV_8U)
+
+        return out
+
+    def exgr(self, image, out=None):
+        '''
+        Fused ExGR. Reuses the ExG result and channel planes rather than recomputing them.
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 output buffer
+        :return: grayscale image
+        '''
+        out = self.exg(image, out=out)
+        acc = self._buffer('acc', image.shape[:2], np.float32)
+        tmp = self._buffer('tmp', image.shape[:2], np.float32)
+        _, green, red = self._planes(image, split=False)
+
+        np.multiply(red, np.float32(1.4), out=tmp, dtype=np.float32)
+        np.subtract(tmp, green, out=tmp, dtype=np.float32)
+        np.subtract(out, tmp, out=acc, dtype=np.float32)
+
+        return self._to_uint8(acc, out)
+
+    def exg_int(self, image, out=None):
+        '''
+        Integer-domain ExG using int16 arithmetic and OpenCV's saturating conversion. Identical output to exg,
+        with half the memory traffic of the float32 path.
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 output buffer
+        :return: grayscale image
+        '''
+        out = self._output(image, out)
+        acc = self._buffer('acc_int', image.shape[:2], np.int16)
+        blue, green, red = self._planes(image)
+
+        cv2.add(green, green, dst=acc, dtype=cv2.CV_16S)
+        cv2.subtract(acc, red, dst=acc, dtype=cv2.CV_16S)
+        cv2.subtract(acc, blue, dst=acc, dtype=cv2.CV_16S)
+        cv2.add(acc, 0, dst=out, dtype=cv2.CV_8U)
+
+        return out
+
+    def exgr_int(self, image, out=None):
+        '''
+        Integer-domain ExGR. The 1.4 * R term is read from EXGR_RED_LUT, giving identical output to exgr.
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 output buffer
+        :return: grayscale image
+        '''
+        out = self.exg_int(image, out=out)
+        acc = self._buffer('acc_int', image.shape[:2], np.int16)
+        redTerm = self._buffer('lut_int', image.shape[:2], np.int16)
+        _, green, red = self._planes(image, split=False)
+
+        cv2.LUT(red, EXGR_RED_LUT, dst=redTerm)
+        cv2.add(out, green, dst=acc, dtype=cv2.CV_16S)
+        cv2.subtract(acc, redTerm, dst=acc, dtype=cv2.CV_16S)
+        cv2.add(acc, 0, dst=out, dtype=cv2.CV_8U)
+
+        return out
+
+    def maxg(self, image, out=None):
+        '''
+        Fused MaxG (Jin et al. 2021).
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 output buffer
+        :return: grayscale image
+        '''
+        out = self._output(image, out)
+        acc = self._buffer('acc', image.shape[:2], np.float32)
+
+        tmp = self._buffer('tmp', image.shape[:2], np.float32)
+        blue, green, red = self._planes(image)
+
+        np.multiply(green, np.float32(24), out=acc, dtype=np.float32)
+        np.multiply(red, np.float32(19), out=tmp, dtype=np.float32)
+        np.subtract(acc, tmp, out=acc)
+        np.multiply(blue, np.float32(2), out=tmp, dtype=np.float32)
+        np.subtract(acc, tmp, out=acc)
+        np.divide(acc, np.amax(acc), out=acc)
+        np.multiply(acc, np.float32(255), out=acc)
+        np.copyto(out, acc, casting='unsafe')
+
+        return out
+
+    def exg_standardised(self, image, out=None):
+        '''
+        Fused standardised ExG. The chromatic coordinates are computed one at a time into a single scratch buffer
+        in the same order as owl.utils.algorithms.exg_standardised, so rounding is identical.
+        :param image: image as a BGR array (i.e. opened with opencv not PIL)
+        :param out: optional uint8 output buffer
+        :return: grayscale image
+        '''
+        out = self._output(image, out)
+        chanSum = self._buffer('sum', image.shape[:2], np.float32)
+        acc = self._buffer('acc', image.shape[:2], np.float32)
+        tmp = self._buffer('tmp', image.shape[:2], np.float32)
+
+        blue, green, red = self._planes(image)
+
+        np.add(blue, green, out=chanSum, dtype=np.float32)
+        np.add(chanSum, red, out=chanSum, dtype=np.float32)
+        np.maximum(chanSum, np.float32(1), out=chanSum)
+
+        np.divide(green, chanSum, out=tmp, dtype=np.float32)
+        np.multiply(tmp, np.float32(2), out=acc)
+        np.divide(red, chanSum, out=tmp, dtype=np.float32)
+        np.subtract(acc, tmp, out=acc)
+        np.divide(blue, chanSum, out=tmp, dtype=np.float32)
+        np.subtract(acc, tmp, out=acc)
+        np.multiply(acc, np.float32(255), out=acc)
+
+        return self._to_uint8(acc, out)
+
+    def exg_standardised_hue(self, image, out=None,
+                             hueMin=30,
+                             hueMax=90,
+                             brightnessMin=10,
+                             brightnessMax=220,
+                             saturationMin=30,
+                             saturationMax=255,
+                             invert_hue=False):
+        '''
+        Fused ExG + HSV. Parameters as for owl.utils.algorithms.exg_standardised_hue.
+        :return: grayscale image
+        '''
+        out = self.exg_standardised(image, out=out)
+        mask = self.hsv(image, out=self._buffer('hsv_mask', image.shape[:2], np.uint8),
+                        hueMin=hueMin, hueMax=hueMax,
+                        brightnessMin=brightnessMin, brightnessMax=brightnessMax,
+                        saturationMin=saturationMin, saturationMax=saturationMax,
+                        invert_hue=invert_hue)
+        cv2.bitwise_and(out, mask, dst=out)
+
+        return out
+
+    def hsv(self, image, out=None,
+            hueMin=30,
+            hueMax=90,
+            brightnessMin=10,
+            brightnessMax=220,
+            saturationMin=30,
+            saturationMax=255,
+            invert_hue=False):
+        '''
+        HSV thresholding with a single cv2.inRange call over all three channels. Parameters as for
+        owl.utils.algorithms.hsv, but only the binary image is returned.
+        :return: binary image
+        '''
+        out = self._output(image, out)
+        hsvImage = self._buffer('hsv', image.shape, np.uint8)
+        cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=hsvImage)
+
+        if not invert_hue:
+            cv2.inRange(hsvImage, (hueMin, saturationMin, brightnessMin),
+                        (hueMax, saturationMax, brightnessMax), dst=out)
+
+        else:
+            hueThresh = self._buffer('hue_thresh', image.shape[:2], np.uint8)
+            cv2.inRange(hsvImage, (hueMin, 0, 0), (hueMax, 255, 255), dst=hueThresh)
+            cv2.inRange(hsvImage, (0, saturationMin, brightnessMin), (255, saturationMax, brightnessMax), dst=out)
+            cv2.bitwise_not(hueThresh, dst=hueThresh)
+            cv2.bitwise_and(out, hueThresh, dst=out)
+
+        return out
+
+    def _planes(self, image, split=True):
+        # a single pass splitting the frame into contiguous channel planes, skipped if already split for this frame
+        planes = [self._buffer(f'plane_{i}', image.shape[:2], np.uint8) for i in range(3)]
+        if split:
+            cv2.split(image, planes)
+
+        return planes
+
+    def _exg_float(self, image):
+        acc = self._buffer('acc', image.shape[:2], np.float32)
+        blue, green, red = self._planes(image)
+
+        cv2.add(green, green, dst=acc, dtype=cv2.CV_32F)
+        cv2.subtract(acc, red, dst=acc, dtype=cv2.CV_32F)
+        cv2.subtract(acc, blue, dst=acc, dtype=cv2.CV_32F)
+
+        return acc
+
+    def _to_uint8(self, acc, out):
+        np.clip(acc, 0, 255, out=acc)
+        np.copyto(out, acc, casting='unsafe')
+
+        return out
+
+    def _output(self, image, out):
+        if out is None:
+            return self._buffer('out', image.shape[:2], np.uint8)
+
+        if out.shape != image.shape[:2] or out.dtype != np.uint8:
+            raise ValueError(f'[ERROR] Output buffer must be uint8 with shape {image.shape[:2]}, '
+                             f'got {out.dtype} {out.shape}')
+
+        return out
+
+    def _buffer(self, name, shape, dtype):
+        return self.workspace.buffer(f'index_{name}', shape, dtype)
@@ -0,0 +1,202 @@
+from bisect import bisect_right
+import warnings
+import json
+import os
+import cv2
+
+INDEX_VERSION = 1
+
+
+def index_path_for(path):
+    return f'{path}.index.json'
+
+
+def build_index(path):
+    '''
+    Builds a frame index for a video: the timestamp of every frame and the frames decoding can start from
+    (keyframes). With PyAV installed the index comes from the container's packets without decoding any frames.
+    Otherwise every frame is grabbed once with OpenCV, and keyframes are unknown.
+    :param path: path to the video
+    :return: index dictionary
+    '''
+    try:
+        import av
+    except ImportError:
+        av = None
+
+    if av is not None:
+        with av.open(path) as container:
+            stream = container.streams.video[0]
+            packets = [(packet.pts, packet.is_keyframe) for packet in container.demux(stream)
+                       if packet.pts is not None]
+            fps = float(stream.average_rate) if stream.average_rate else 0.0
+            timeBase = float(stream.time_base)
+
+        # packets are in decode order, frame numbers are in presentation order
+        packets.sort()
+        timestamps = [pts * timeBase * 1000 for pts, _ in packets]
+        keyframes = [i for i, (_, isKeyframe) in enumerate(packets) if isKeyframe]
+
+    else:
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        timestamps = []
+        while cap.grab():
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+        cap.release()
+        keyframes = None
+
+    return {'version': INDEX_VERSION,
+            'size': os.path.getsize(path),
+            'mtime': os.path.getmtime(path),
+            'fps': fps,
+            'frame_count': len(timestamps),
+            'timestamps': timestamps,
+            'keyframes': keyframes}
+
+
+def load_index(path, index_path=None):
+    '''
+    Loads the cached index for a video, building and caching it if it is missing or the video has changed.
+    :param path: path to the video
+    :param index_path: where the index is cached, defaults to <video>.index.json alongside the video
+    :return: index dictionary
+    '''
+    index_path = index_path_for(path) if index_path is None else index_path
+
+    if os.path.isfile(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+
+        if index.get('version') == INDEX_VERSION and index.get('size') == os.path.getsize(path) \
+                and index.get('mtime') == os.path.getmtime(path):
+            return index
+
+    index = build_index(path)
+    try:
+        with open(index_path, 'w') as f:
+            json.dump(index, f)
+
+    except OSError:
+        warnings.warn(f'Could not cache the video index at {index_path}')
+
+    return index
+
+
+class SeekableVideoReader:
+    def __init__(self, path, resolution=None, index_path=None, max_grab=30):
+        '''
+        SeekableVideoReader gives random access to the frames of a video using a frame index that is built once and
+        cached on disk. Frames that are skipped over are grabbed (demuxed and decoded, but not converted or
+        returned). Backward jumps, and forward jumps into a later keyframe's group of pictures (or further than
+        max_grab frames when keyframes are unknown), seek instead.
+        Frames are predicted from earlier ones, so the frames between the keyframe before the target and the target
+        are always decoded. With a keyframe index (PyAV installed when the index was built) a seek starts decoding
+        at that keyframe, and frames in earlier groups of pictures are skipped without decoding. Without one, the
+        OpenCV fallback is linear within max_grab frames: every frame between the current position and the target
+        is decoded, whichever group of pictures it is in.
+        :param path: path to the video
+        :param resolution: (width, height) to resize frames to, or None to keep the original size
+        :param index_path: where the index is cached, defaults to <video>.index.json alongside the video
+        :param max_grab: the furthest jump made by grabbing forward when the index has no keyframes
+        '''
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'[ERROR] The provided path does not exist: {path}')
+
+        self.path = path
+        self.resolution = resolution
+        self.max_grab = max_grab
+        self.index = load_index(path, index_path=index_path)
+
+        self.cap = cv2.VideoCapture(path)
+        self.position = 0
+
+    @property
+    def frame_count(self):
+        return self.index['frame_count']
+
+    @property
+    def fps(self):
+        return self.index['fps']
+
+    def timestamp(self, frame_no):
+        '''
+        :return: presentation time of the frame in milliseconds
+        '''
+        return self.index['timestamps'][frame_no]
+
+    def frame_at(self, milliseconds):
+        '''
+        :return: number of the last frame shown at or before the given time in milliseconds
+        '''
+        return max(bisect_right(self.index['timestamps'], milliseconds) - 1, 0)
+
+    def seek(self, frame_no):
+        '''
+        Positions the reader so the next read() returns frame_no, decoding forward from the nearest keyframe before
+        it, or from the current position when that is in the same group of pictures. Without keyframes in the
+        index, jumps of up to max_grab frames decode every frame in between.
+        '''
+        if not 0 <= frame_no < self.frame_count:
+            raise ValueError(f'[ERROR] Frame {frame_no} is outside the video (0 to {self.frame_count - 1})')
+
+        keyframe = self._keyframe_before(frame_no)
+        if keyframe is None:
+            jump = frame_no < self.position or frame_no - self.position > self.max_grab
+        else:
+            # grabbing forward is only worthwhile within the current group of pictures
+            jump = frame_no < self.position or keyframe > self.position
+
+        if jump:
+            start = frame_no if keyframe is None else keyframe
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            self.position = start
+
+        while self.position < frame_no:
+            if not self.cap.grab():
+                break
+            self.position += 1
+
+    def read(self):
+        '''
+        :return: the next frame, or None at the end of the video
+        '''
+        grabbed, frame = self.cap.read()
+        if not grabbed:
+            return None
+
+        self.position += 1
+        if self.resolution is not None:
+            frame = cv2.resize(frame, self.resolution, interpolation=cv2.INTER_AREA)
+
+        return frame
+
+    def read_range(self, start, stop=None, step=1):
+        '''
+        Yields (frame_no, frame) for frames start, start + step, ... up to but not including stop.
+        '''
+        stop = self.frame_count if stop is None else min(stop, self.frame_count)
+
+        for frame_no in range(start, stop, step):
+            self.seek(frame_no)
+            frame = self.read()
+            if frame is None:
+                break
+
+            yield frame_no, frame
+
+    def sample(self, stride):
+        '''
+        Yields (frame_no, frame) for every stride-th frame of the video.
+        '''
+        return self.read_range(0, step=stride)
+
+    def stop(self):
+        self.cap.release()
+
+    def _keyframe_before(self, frame_no):
+        keyframes = self.index['keyframes']
+        if not keyframes:
+            return None
+
+        return keyframes[max(bisect_right(keyframes, frame_no) - 1, 0)]
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class Workspace:
+    def __init__(self):
+        '''
+        Workspace is a pool of reusable arrays. Buffers are keyed by name, shape and dtype, so each frame resolution
+        gets its own set that is allocated on the first frame and reused on every frame after that. The allocation
+        counters make it possible to check that steady-state detection is allocation free.
+        '''
+        self.buffers = {}
+        self.allocations = 0
+        self.allocated_bytes = 0
+
+    def buffer(self, name, shape, dtype=np.uint8):
+        '''
+        Returns the buffer for name at the given shape and dtype, allocating it only if it does not yet exist.
+        The contents are not cleared between calls.
+        :param name: name of the buffer, unique to its use within a frame
+        :param shape: shape of the buffer
+        :param dtype: numpy dtype of the buffer
+        :return: numpy array
+        '''
+        key = (name, tuple(shape), np.dtype(dtype))
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[key] = buffer
+            self.allocations += 1
+            self.allocated_bytes += buffer.nbytes
+
+        return buffer
+
+    def clear(self):
+        '''
+        Releases all buffers, e.g. after a change in camera resolution. The counters are kept.
+        '''
+        self.buffers.clear()
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
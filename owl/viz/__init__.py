@@ -1,3 +1,12 @@
 # openweedlocator-tools/viz/__init__.py
 
-from .media import webcam, images_and_video
\ No newline at end of file
+from owl._lazy import lazy_exports
+
+_EXPORTS = {
+    'webcam': '.media',
+    'images_and_video': '.media',
+    'draw_detections': '.render',
+}
+__all__ = list(_EXPORTS)
+
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
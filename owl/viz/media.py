@@ -1,32 +1,75 @@
-from owl.utils.image import FrameReader
+from owl.detection.regions import is_unset
+from owl.utils.governor import QualityGovernor
+from owl.utils.image import FrameReader, LatestFrameCapture
 from owl.utils.io import get_weed_detector, load_config, setup_and_run_detector
+from owl.viz.pipeline import Pipeline
 
 import cv2
 
+
+def _show_pipeline(read_frame, detector_factory, config, window, workers, policy):
+    # detection runs on the worker pool while this thread only displays results
+    pipeline = Pipeline(read_frame=read_frame, detector_factory=detector_factory, config=config,
+                        workers=workers, policy=policy)
+
+    def show(frame, result):
+        cv2.imshow(window, result[3])
+
+        # exit with 'ESC'
+        return cv2.waitKey(1) != 27
+
+    pipeline.run(show)
+
+    return pipeline
+
+
+def _detector_runner(weed_detector, config):
+    # with a deadline configured, the governor trades quality for latency frame by frame
+    if is_unset(config.get('deadline_ms')):
+        return lambda frame: setup_and_run_detector(weed_detector=weed_detector, frame=frame, config=config)
+
+    return QualityGovernor(weed_detector, config).run
+
+
 def webcam(
         src=0,
         algorithm="exhsv",
         model_path="owl/models/yolov8n.pt",
         CONFIG_NAME="CONFIG_DAY_SENSITIVITY_1",
-        platform="desktop", **kwargs):
-    weed_detector = get_weed_detector(algorithm=algorithm, model_path=model_path, platform=platform)
-
+        platform="desktop",
+        workers=0,
+        policy="drop_oldest",
+        latest_frame=False, **kwargs):
     config = load_config(CONFIG_NAME)
     config.update(kwargs)
     config.update({"algorithm": f"{algorithm}"})
 
-    reader = cv2.VideoCapture(src)
+    # the latest-frame reader skips stale frames when detection is slower than the camera
+    reader = LatestFrameCapture(src).start() if latest_frame else cv2.VideoCapture(src)
 
     if not reader.isOpened():
         print("[ERROR] Could not open camera.")
         exit()
 
+    if workers:
+        _show_pipeline(read_frame=lambda: reader.read()[1],
+                       detector_factory=lambda: get_weed_detector(algorithm=algorithm, model_path=model_path,
+                                                                  platform=platform),
+                       config=config, window='Video Feed', workers=workers, policy=policy)
+        reader.release()
+        cv2.destroyAllWindows()
+        return
+
+    weed_detector = get_weed_detector(algorithm=algorithm, model_path=model_path, platform=platform)
+    run_detector = _detector_runner(weed_detector, config)
+
     while True:
         ret, frame = reader.read()
+        if not ret:
+            print("[INFO] No frame received from the camera, stopping.")
+            break
 
-        _, _, _, image = setup_and_run_detector(weed_detector=weed_detector,
-                                                frame=frame.copy(),
-                                                config=config)
+        _, _, _, image = run_detector(frame)
         cv2.imshow('Video Feed', image)
 
         # exit with 'ESC'
@@ -40,9 +83,9 @@ def webcam(
 def images_and_video(media_path='',
                      algorithm='exhsv',
                      model_path='models/yolov8n.pt',
-                     CONFIG_NAME="CONFIG_DAY_SENSITIVITY_1", **kwargs):
-    weed_detector = get_weed_detector(algorithm=algorithm, model_path=model_path)
-
+                     CONFIG_NAME="CONFIG_DAY_SENSITIVITY_1",
+                     workers=0,
+                     policy='block', **kwargs):
     config = load_config(CONFIG_NAME)
     config.update(kwargs)
     config.update({"algorithm": f"{algorithm}"})
@@ -51,12 +94,20 @@ def images_and_video(media_path='',
     reader = FrameReader(path=media_path,
                          resolution=resolution)
 
+    if workers:
+        _show_pipeline(read_frame=reader.read,
+                       detector_factory=lambda: get_weed_detector(algorithm=algorithm, model_path=model_path),
+                       config=config, window='Detection', workers=workers, policy=policy)
+        cv2.destroyAllWindows()
+        return
+
+    weed_detector = get_weed_detector(algorithm=algorithm, model_path=model_path)
+    run_detector = _detector_runner(weed_detector, config)
+
     while True:
         frame = reader.read()
 
-        _, _, _, image = setup_and_run_detector(weed_detector=weed_detector,
-                                    frame=frame.copy(),
-                                    config=config)
+        _, _, _, image = run_detector(frame)
         cv2.imshow('Detection', image)
 
         # exit with 'ESC'
@@ -0,0 +1,263 @@
+from owl.utils.io import setup_and_run_detector
+
+import threading
+import queue
+import time
+
+_STOP = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        # carries an exception raised in a worker to the thread iterating the pipeline
+        self.error = error
+
+
+class StageStats:
+    def __init__(self):
+        '''
+        Latency statistics for one pipeline stage, in milliseconds.
+        '''
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, elapsed):
+        elapsed *= 1000
+        with self._lock:
+            self.count += 1
+            self.total += elapsed
+            self.last = elapsed
+            self.max = max(self.max, elapsed)
+
+    def as_dict(self):
+        return {'count': self.count,
+                'mean_ms': self.total / self.count if self.count else 0.0,
+                'last_ms': self.last,
+                'max_ms': self.max}
+
+
+class BoundedQueue:
+    def __init__(self, maxsize, policy='drop_oldest', on_drop=None):
+        '''
+        Queue between two pipeline stages.
+        :param maxsize: maximum number of items held
+        :param policy: 'drop_oldest' discards the oldest item when full; 'block' makes the producer wait (backpressure)
+        :param on_drop: optional callable given each discarded item
+        '''
+        if policy not in ['drop_oldest', 'block']:
+            raise ValueError(f"[ERROR] Unknown queue policy {policy}. Use 'drop_oldest' or 'block'")
+
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.policy = policy
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def put(self, item, force_block=False):
+        if self.policy == 'block' or force_block:
+            self.queue.put(item)
+
+        else:
+            # the lock stops two producers each dropping an item for the same free slot
+            with self._lock:
+                while True:
+                    try:
+                        self.queue.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            oldest = self.queue.get_nowait()
+                        except queue.Empty:
+                            continue
+                        self.dropped += 1
+                        if self.on_drop is not None:
+                            self.on_drop(oldest)
+
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+    def depth(self):
+        return self.queue.qsize()
+
+
+class Pipeline:
+    def __init__(self, read_frame, detector_factory, config, workers=2, queue_size=4, policy='drop_oldest'):
+        '''
+        Runs capture, detection and output as concurrent stages joined by bounded queues, so the sustained frame
+        rate is set by the slowest stage rather than the sum of all stages. Capture runs on one thread, detection on
+        a pool of worker threads (each with its own detector) and output on the thread that iterates the pipeline,
+        so cv2.imshow can be used there. Results are yielded in capture order; frames dropped by the queues are
+        skipped. An exception raised by a detector stops the pipeline and is re-raised where it is iterated.
+        :param read_frame: callable returning the next BGR frame, or None when the source is exhausted
+        :param detector_factory: callable returning a new weed detector, called once per worker
+        :param config: config dictionary passed to setup_and_run_detector
+        :param workers: number of detection workers
+        :param queue_size: maximum number of items in each queue
+        :param policy: 'drop_oldest' (keep latency bounded) or 'block' (process every frame)
+        '''
+        self.read_frame = read_frame
+        self.config = config
+        self.detectors = [detector_factory() for _ in range(workers)]
+
+        self.capture_queue = BoundedQueue(queue_size, policy=policy, on_drop=self._dropped)
+        self.output_queue = BoundedQueue(queue_size, policy=policy, on_drop=self._dropped)
+
+        self.stage_stats = {'capture': StageStats(), 'detect': StageStats(), 'output': StageStats()}
+        self.frames_in = 0
+        self.frames_out = 0
+        self.start_time = None
+
+        self._skipped = set()
+        self._skippedLock = threading.Lock()
+        self._workersRunning = workers
+        self._error = None
+        self._workersLock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._threads = [threading.Thread(target=self._capture, daemon=True)]
+        self._threads += [threading.Thread(target=self._detect, args=(detector,), daemon=True)
+                          for detector in self.detectors]
+        for thread in self._threads:
+            thread.start()
+
+        return self
+
+    def stop(self):
+        self._stopEvent.set()
+
+        # unblock any stage waiting on a full queue
+        for q in [self.capture_queue, self.output_queue]:
+            try:
+                while True:
+                    q.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def run(self, consumer):
+        '''
+        Starts the pipeline and calls consumer(frame, result) for every processed frame on this thread. Stops when
+        the source is exhausted or the consumer returns False.
+        '''
+        self.start()
+        try:
+            for frame, result in self:
+                start = time.perf_counter()
+                keepRunning = consumer(frame, result)
+                self.stage_stats['output'].add(time.perf_counter() - start)
+                if keepRunning is False:
+                    break
+        finally:
+            self.stop()
+
+    def __iter__(self):
+        nextSeq = 0
+        pending = {}
+
+        while True:
+            item = self.output_queue.get()
+            if isinstance(item, _Failure) or (item is _STOP and self._error is not None):
+                self.stop()
+                raise self._error
+
+            if item is _STOP:
+                break
+
+            seq, frame, result = item
+            pending[seq] = (frame, result)
+
+            # release results in capture order, skipping frames that were dropped along the way
+            while True:
+                with self._skippedLock:
+                    if nextSeq in self._skipped:
+                        self._skipped.discard(nextSeq)
+                        nextSeq += 1
+                        continue
+                if nextSeq not in pending:
+                    break
+                self.frames_out += 1
+                yield pending.pop(nextSeq)
+                nextSeq += 1
+
+        # every worker has finished, so anything still pending follows a dropped frame
+        for seq in sorted(pending):
+            self.frames_out += 1
+            yield pending[seq]
+
+    def stats(self):
+        '''
+        :return: per-stage latency, queue depths, dropped frames and the sustained output frame rate
+        '''
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0.0
+        return {
+            'stages': {name: stats.as_dict() for name, stats in self.stage_stats.items()},
+            'queues': {name: {'depth': q.depth(), 'max_depth': q.max_depth, 'dropped': q.dropped}
+                       for name, q in [('capture', self.capture_queue), ('output', self.output_queue)]},
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'fps': self.frames_out / elapsed if elapsed else 0.0
+        }
+
+    def _dropped(self, item):
+        if item is not _STOP and not isinstance(item, _Failure):
+            with self._skippedLock:
+                self._skipped.add(item[0])
+
+    def _capture(self):
+        seq = 0
+        while not self._stopEvent.is_set():
+            start = time.perf_counter()
+            frame = self.read_frame()
+            if frame is None:
+                break
+            self.stage_stats['capture'].add(time.perf_counter() - start)
+
+            self.capture_queue.put((seq, frame))
+            self.frames_in += 1
+            seq += 1
+
+        if not self._stopEvent.is_set():
+            for _ in self.detectors:
+                self.capture_queue.put(_STOP, force_block=True)
+
+    def _detect(self, detector):
+        try:
+            while not self._stopEvent.is_set():
+                try:
+                    item = self.capture_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _STOP:
+                    break
+
+                seq, frame = item
+                start = time.perf_counter()
+                result = setup_and_run_detector(weed_detector=detector, frame=frame, config=self.config)
+                self.stage_stats['detect'].add(time.perf_counter() - start)
+                self.output_queue.put((seq, frame, result))
+
+        except Exception as error:
+            # the error is also kept in case a drop_oldest queue discards the failure before it is read
+            with self._workersLock:
+                if self._error is None:
+                    self._error = error
+            self.output_queue.put(_Failure(error), force_block=True)
+
+        finally:
+            with self._workersLock:
+                self._workersRunning -= 1
+                lastWorker = self._workersRunning == 0
+
+            if lastWorker and not self._stopEvent.is_set():
+                self.output_queue.put(_STOP, force_block=True)
@@ -0,0 +1,33 @@
+import cv2
+
+
+def draw_detections(image, detections, label='weed', names=None):
+    '''
+    Annotates an image in place from a detection result (see owl.detection.results). Use this with the
+    annotate=False/detections_only mode of the detectors to draw only when a display is attached. Read-only images,
+    e.g. FrameStore frames, are copied before drawing, so use the returned image.
+    :param image: BGR image to draw on, in the same coordinates as the detections
+    :param detections: structured array of detections
+    :param label: text drawn above each box when no class names are given (green-on-brown style)
+    :param names: optional dict of class id to name. If given, each box is labelled with its score and class name
+    and its centre is marked (green-on-green style)
+    :return: the annotated image
+    '''
+    if not image.flags.writeable:
+        image = image.copy()
+
+    for startX, startY, boxW, boxH, centerX, centerY, _, score, classId in detections.tolist():
+        endX = startX + boxW
+        endY = startY + boxH
+
+        if names is None:
+            cv2.putText(image, label, (startX, startY + 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 0), 2)
+            cv2.rectangle(image, (startX, startY), (endX, endY), (0, 0, 255), 2)
+
+        else:
+            cv2.rectangle(image, (startX, startY), (endX, endY), (0, 0, 255), 2)
+            cv2.circle(image, center=(centerX, centerY), radius=5, thickness=-1, color=(255, 0, 0))
+            cv2.putText(image, f'{int(100 * score)}% {names[classId]}', (startX, startY + 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, .75, (255, 0, 0), 2)
+
+    return image
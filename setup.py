@@ -22,6 +22,9 @@ CLASSIFIERS = [
 
 desktop_requires = ['ultralytics', 'opencv-contrib-python>=4.0,<5.0', 'opencv-python>=4.0,<5.0']
 rpi_requires = ['opencv-contrib-python>=4.0,<5.0', 'opencv-python>=4.0,<5.0']
+video_requires = ['av']
+onnx_requires = ['onnxruntime', 'onnx', 'opencv-python>=4.0,<5.0']
+openvino_requires = ['openvino', 'opencv-python>=4.0,<5.0']
 
 with open(os.path.join(os.path.dirname(__file__), 'README.md'), encoding='utf-8') as f:
     long_description = f.read()
@@ -33,7 +36,10 @@ setup(
     install_requires=read_requirements('requirements.txt'),
     extras_require={
         'desktop': desktop_requires,
-        'rpi': rpi_requires
+        'rpi': rpi_requires,
+        'video': video_requires,
+        'onnx': onnx_requires,
+        'openvino': openvino_requires
     },
     author='Guy Coleman',
     author_email='hoot@openweedlocator.com',
@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+import cv2
+
+from owl.utils.algorithms import exg, exgr, maxg, exg_standardised, exg_standardised_hue, hsv
+from owl.utils.kernels import IndexEngine
+
+
+def _test_images():
+    rng = np.random.default_rng(42)
+    images = {
+        'random': rng.integers(0, 256, size=(320, 416, 3), dtype=np.uint8),
+        'black': np.zeros((101, 789, 3), dtype=np.uint8),
+        'white': np.full((134, 112, 3), 255, dtype=np.uint8),
+        'frame': cv2.imread('media/OWL - frame1.jpg'),
+    }
+    # every combination of a coarse grid of channel values, including the 0 and 255 edges
+    levels = np.array([0, 1, 2, 63, 64, 127, 128, 129, 200, 254, 255], dtype=np.uint8)
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(len(levels), -1, 3)
+    images['grid'] = np.ascontiguousarray(grid)
+
+    return images
+
+
+class TestIndexEngine:
+    images = _test_images()
+    hsv_params = dict(hueMin=39, hueMax=83, brightnessMin=60, brightnessMax=190, saturationMin=50, saturationMax=220)
+
+    references = {
+        'exg': exg,
+        'exgr': exgr,
+        'exg_int': exg,
+        'exgr_int': exgr,
+        'maxg': maxg,
+        'nexg': exg_standardised,
+    }
+
+    @pytest.mark.filterwarnings('ignore::RuntimeWarning')
+    @pytest.mark.parametrize("image_name", list(images))
+    @pytest.mark.parametrize("algorithm", list(references))
+    def test_bit_exact(self, algorithm, image_name):
+        image = self.images[image_name]
+        expected = self.references[algorithm](image)
+
+        engine = IndexEngine()
+        out = np.empty(image.shape[:2], dtype=np.uint8)
+        result = engine.compute(algorithm, image, out=out)
+
+        assert result is out
+        np.testing.assert_array_equal(result, expected)
+
+    @pytest.mark.parametrize("image_name", list(images))
+    @pytest.mark.parametrize("invert_hue", [False, True])
+    def test_bit_exact_hsv(self, image_name, invert_hue):
+        image = self.images[image_name]
+        engine = IndexEngine()
+
+        expected, _ = hsv(image, invert_hue=invert_hue, **self.hsv_params)
+        np.testing.assert_array_equal(engine.hsv(image, invert_hue=invert_hue, **self.hsv_params), expected)
+
+        expected = exg_standardised_hue(image, invert_hue=invert_hue, **self.hsv_params)
+        result = engine.exg_standardised_hue(image, invert_hue=invert_hue, **self.hsv_params)
+        np.testing.assert_array_equal(result, expected)
+
+    def test_buffers_reused(self):
+        engine = IndexEngine()
+        image = self.images['random']
+
+        first = engine.compute('nexg', image)
+        allocations = engine.workspace.allocations
+        second = engine.compute('nexg', image)
+
+        assert first is second
+        assert engine.workspace.allocations == allocations
+
+    def test_invalid_output_buffer(self):
+        engine = IndexEngine()
+
+        with pytest.raises(ValueError):
+            engine.exg(self.images['random'], out=np.empty((10, 10), dtype=np.uint8))
@@ -0,0 +1,233 @@
+from types import SimpleNamespace
+import numpy as np
+import threading
+import weakref
+import pytest
+import gc
+
+from owl.detection.backends import BACKENDS, ExportedModel, Letterbox, letterbox, nms, postprocess, scale_boxes, \
+    to_blob
+from owl.detection.results import detections_from_normalised
+from owl.detection import GreenOnGreen
+from owl.detection.registry import ModelRegistry
+
+
+class FixedOutputModel(ExportedModel):
+    '''
+    Exported model returning one detection of class 1, centred on the letterboxed input.
+    '''
+    def __init__(self, model_path, names=None):
+        super().__init__(model_path, names={0: 'weed', 1: 'crop'})
+
+    def _infer(self, blob):
+        height, width = blob.shape[2:]
+        output = np.zeros((1, 6, 2), dtype=np.float32)
+        output[0, :4, 0] = [width / 2, height / 2, width / 4, height / 4]
+        output[0, 5, 0] = 0.9
+
+        return output
+
+
+class StubBoxes:
+    def __init__(self, xyxy):
+        self.xyxy = xyxy
+        self.conf = np.full(len(xyxy), 0.9, dtype=np.float32)
+        self.cls = np.zeros(len(xyxy), dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+
+class BrightBoxModel:
+    '''
+    Stands in for an ultralytics YOLO model. Reports one box around the bright pixels of each letterboxed input, in
+    input pixels, as ultralytics does when it is given a tensor.
+    '''
+    names = {0: 'weed'}
+
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, tensor, **kwargs):
+        blob = np.asarray(tensor)
+        self.inputs.append(blob.shape)
+
+        results = []
+        for image in blob:
+            ys, xs = np.nonzero(image[0] > 0.5)
+            xyxy = np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]], dtype=np.float32)
+            results.append(SimpleNamespace(boxes=StubBoxes(xyxy), names=self.names))
+
+        return iter(results)
+
+
+class TestBackends:
+    def test_letterbox(self):
+        image = np.full((100, 200, 3), 255, dtype=np.uint8)
+        padded, ratio, (left, top) = letterbox(image, new_shape=(320, 320))
+
+        assert padded.shape == (320, 320, 3)
+        assert ratio == 1.6
+        assert (left, top) == (0, 80)
+        assert (padded[:top] == 114).all() and (padded[top:top + 160] == 255).all()
+
+    def test_scale_boxes_inverts_letterbox(self):
+        boxes = np.array([[10, 20, 110, 70]], dtype=np.float32)
+        scaled = boxes * 1.6 + [0, 80, 0, 80]
+
+        assert np.allclose(scale_boxes(scaled, 1.6, (0, 80), (100, 200)), boxes)
+
+    def test_cached_letterbox(self):
+        rng = np.random.default_rng(0)
+        letterboxer = Letterbox()
+
+        # the second, smaller image must not leave the first one's pixels in the reused buffer
+        for shape in [(420, 640), (100, 200), (100, 200)]:
+            image = rng.integers(0, 255, shape + (3,), dtype=np.uint8)
+            blob = letterboxer(image, (448, 640))
+            assert blob.dtype == np.float32
+            assert np.array_equal(blob, to_blob(letterbox(image, new_shape=(448, 640))[0]))
+
+        assert len(letterboxer.transforms) == 2
+
+        boxes = np.array([[100, 114, 200, 214]], dtype=np.float32)
+        assert np.allclose(letterboxer.scale_boxes(boxes, (840, 1280), (448, 640)), [[200, 200, 400, 400]])
+
+    def test_nms(self):
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32)
+        scores = np.array([0.8, 0.9, 0.7], dtype=np.float32)
+
+        assert nms(boxes, scores, iou_threshold=0.5).tolist() == [1, 2]
+        assert nms(boxes, scores, iou_threshold=0.9).tolist() == [1, 0, 2]
+
+    def test_postprocess(self):
+        # (cx, cy, w, h, class 0, class 1) for three anchors, the first two overlapping with different classes
+        output = np.array([[5, 6, 50],
+                           [5, 6, 50],
+                           [10, 10, 10],
+                           [10, 10, 10],
+                           [0.9, 0.1, 0.2],
+                           [0.1, 0.8, 0.1]], dtype=np.float32)
+
+        boxes, scores, classes = postprocess(output, conf=0.25, iou=0.5)
+        assert classes.tolist() == [0, 1]
+        assert np.allclose(boxes, [[0, 0, 10, 10], [1, 1, 11, 11]])
+
+        boxes, scores, classes = postprocess(output, conf=0.25, iou=0.5, classes=[1])
+        assert classes.tolist() == [1]
+
+    def test_detections_from_normalised(self):
+        # corners and sizes are rounded separately, so w need not equal x1 - x0
+        xyxyn = np.array([[0.1, 0.2, 0.3, 0.45]], dtype=np.float32)
+        xywhn = np.array([[0.2, 0.325, 0.2, 0.25]], dtype=np.float32)
+        detections = detections_from_normalised(xyxyn, xywhn, (10, 20, 110, 70), scores=[0.5], classes=[1])
+
+        assert detections[['x', 'y', 'w', 'h', 'cx', 'cy']].tolist() == [(20, 30, 20, 12, 30, 36)]
+        assert detections['class'].tolist() == [1]
+        assert len(detections_from_normalised(np.empty((0, 4)), np.empty((0, 4)), (0, 0, 10, 10))) == 0
+
+    def test_green_on_green_exported(self, tmp_path, monkeypatch):
+        modelPath = tmp_path / 'model.onnx'
+        modelPath.write_bytes(b'')
+        monkeypatch.setitem(BACKENDS, '.onnx', FixedOutputModel)
+
+        detector = GreenOnGreen(model_path=modelPath, platform='onnx')
+        image = np.zeros((420, 640, 3), dtype=np.uint8)
+        _, boxes, centres, _ = detector.find(image, resolution=(640, 420), annotate=False)
+
+        assert detector.device == 'cpu'
+        assert detector.names[1] == 'crop'
+        # the 420 pixel high crop is padded by 14 pixels to a 448 pixel model input
+        assert boxes == [[240, 154, 160, 112]]
+        assert centres == [[320, 210]]
+
+        # a frame at twice the resolution is letterboxed straight to the model input, giving the same detections
+        largeImage = np.zeros((840, 1280, 3), dtype=np.uint8)
+        _, largeBoxes, _, returned = detector.find(largeImage, resolution=(640, 420), annotate=False)
+        assert largeBoxes == boxes
+        # nothing is drawn, so the frame is not resized
+        assert returned is largeImage
+
+        _, annotatedBoxes, _, annotated = detector.find(largeImage, resolution=(640, 420), annotate=True)
+        assert annotatedBoxes == boxes
+        assert annotated.shape == image.shape
+        assert annotated.any() and not largeImage.any()
+
+        results = detector.find_batch([image, image], resolution=(640, 420), annotate=False)
+        assert [result[1] for result in results] == [boxes, boxes]
+        assert len(detector.batch_detections) == 2
+
+        # without a resolution each frame is detected at its own size
+        frames = [image, np.zeros((240, 320, 3), dtype=np.uint8), image]
+        expected = [detector.find(frame, resolution=None, annotate=False)[1] for frame in frames]
+        results = detector.find_batch(frames, resolution=None, annotate=False)
+        assert [result[1] for result in results] == expected
+        assert expected[1] != expected[0]
+
+    def test_shared_exported_model(self, tmp_path, monkeypatch):
+        paths = [tmp_path / 'a.onnx', tmp_path / 'b.onnx']
+        for path in paths:
+            path.write_bytes(b'')
+        monkeypatch.setitem(BACKENDS, '.onnx', FixedOutputModel)
+        registry = ModelRegistry(max_models=1)
+
+        detectors = [GreenOnGreen(model_path=paths[0], platform='onnx', registry=registry) for _ in range(2)]
+        assert detectors[0].model is detectors[1].model
+        assert detectors[0].letterbox is not detectors[1].letterbox
+
+        # each detector letterboxes into its own buffer, so concurrent detectors don't overwrite each other's input
+        sizes = [(420, 640), (240, 320)]
+        expected = [detector.find(np.zeros(size + (3,), dtype=np.uint8), resolution=None, annotate=False)[1]
+                    for detector, size in zip(detectors, sizes)]
+        results = [[], []]
+
+        def run(n):
+            for _ in range(50):
+                image = np.zeros(sizes[n] + (3,), dtype=np.uint8)
+                results[n].append(detectors[n].find(image, resolution=None, annotate=False)[1])
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert all(boxes == expected[n] for n in range(2) for boxes in results[n])
+
+        # detectors don't hold the model, so an evicted model is freed
+        evicted = weakref.ref(detectors[0].model)
+        GreenOnGreen(model_path=paths[1], platform='onnx', registry=registry).model
+        gc.collect()
+        assert evicted() is None
+
+    def test_green_on_green_torch(self, tmp_path, monkeypatch):
+        pytest.importorskip('torch')
+        modelPath = tmp_path / 'model.pt'
+        modelPath.write_bytes(b'')
+        model = BrightBoxModel()
+        monkeypatch.setattr(GreenOnGreen, '_load_model', lambda self, path: model)
+
+        # a frame that is neither square nor a multiple of the model stride, with a bright square weed
+        image = np.zeros((300, 500, 3), dtype=np.uint8)
+        image[50:130, 120:220] = 255
+
+        detector = GreenOnGreen(model_path=modelPath, registry=ModelRegistry())
+        _, boxes, centres, _ = detector.find(image, resolution=None, annotate=False)
+        assert model.inputs[-1] == (1, 3, 320, 512)
+        assert np.abs(np.array(boxes) - [[120, 50, 100, 80]]).max() <= 1
+        assert np.abs(np.array(centres) - [[170, 90]]).max() <= 1
+        assert detector.names == {0: 'weed'}
+
+        # at half the resolution the boxes are reported in the resized image
+        _, boxes, _, _ = detector.find(image, resolution=(250, 150), annotate=False)
+        assert model.inputs[-1] == (1, 3, 160, 256)
+        assert np.abs(np.array(boxes) - [[60, 25, 50, 40]]).max() <= 1
+
+    def test_platform_suffix_mismatch(self, tmp_path):
+        modelPath = tmp_path / 'model.onnx'
+        modelPath.write_bytes(b'')
+
+        with pytest.raises(ValueError):
+            GreenOnGreen(model_path=modelPath, platform='openvino')
@@ -1,6 +1,10 @@
 import pytest
 import numpy as np
-from owl.detection import GreenOnBrown, GreenOnGreen
+import cv2
+from owl.detection import GreenOnBrown, GreenOnGreen, TiledGreenOnBrown
+from owl.detection.results import DETECTION_DTYPE
+from owl.detection.sweep import ParameterSweep, parameter_grid
+from owl.viz import draw_detections
 
 class TestGreenOnBrown:
     resolutions = [(123, 456), (789, 101), (112, 134), (563, 289)]
@@ -31,6 +35,116 @@ class TestGreenOnBrown:
         except Exception as e:
             pytest.fail(f"Processing failed for algorithm {algorithm} with error {str(e)}")
 
+    @pytest.mark.parametrize("algorithm", ['exg', 'exgr'])
+    def test_integer_algorithms(self, algorithm):
+        test_image = cv2.imread('media/OWL - frame1.jpg')
+        weed_detector = GreenOnBrown()
+
+        _, boxes, centres, _ = weed_detector.find(test_image.copy(), algorithm=algorithm)
+        _, boxes_int, centres_int, _ = weed_detector.find(test_image.copy(), algorithm=f'{algorithm}_int')
+
+        assert boxes_int == boxes
+        assert centres_int == centres
+
+    @pytest.mark.parametrize("algorithm", ['exg', 'exhsv', 'hsv'])
+    def test_steady_state_allocations(self, algorithm):
+        test_image = cv2.imread('media/OWL - frame1.jpg')
+        weed_detector = GreenOnBrown()
+
+        weed_detector.find(test_image.copy(), algorithm=algorithm)
+        allocations = weed_detector.workspace.allocations
+        for _ in range(3):
+            weed_detector.find(test_image.copy(), algorithm=algorithm)
+        assert weed_detector.workspace.allocations == allocations
+
+        # a new resolution gets its own buffers
+        weed_detector.find(cv2.resize(test_image, (320, 240)), algorithm=algorithm)
+        assert weed_detector.workspace.allocations > allocations
+
+    def test_components_postprocess(self):
+        test_image = np.zeros((320, 416, 3), dtype=np.uint8)
+        test_image[:] = (40, 60, 80)
+        test_image[50:90, 100:160] = (30, 150, 40)
+        test_image[200:260, 300:320] = (30, 150, 40)
+        weed_detector = GreenOnBrown()
+
+        _, boxes, centres, _ = weed_detector.find(test_image.copy(), algorithm='exg')
+        contour_detections = weed_detector.detections
+        cnts, boxes_cc, centres_cc, _ = weed_detector.find(test_image.copy(), algorithm='exg',
+                                                           postprocess='components')
+
+        assert cnts is None
+        assert len(boxes) == 2
+        assert sorted(boxes_cc) == sorted(boxes)
+        assert sorted(centres_cc) == sorted(centres)
+        assert weed_detector.detections.dtype == contour_detections.dtype == DETECTION_DTYPE
+        assert np.all(weed_detector.detections['score'] == 1.0)
+
+    def test_detections_only(self):
+        test_image = cv2.imread('media/OWL - frame1.jpg')
+        weed_detector = GreenOnBrown()
+
+        _, boxes, _, annotated = weed_detector.find(test_image.copy(), algorithm='exhsv')
+        _, boxes_headless, _, image = weed_detector.find(test_image.copy(), algorithm='exhsv', annotate=False)
+
+        assert boxes_headless == boxes
+        np.testing.assert_array_equal(image, test_image)
+
+        # rendering afterwards gives the same image as drawing inline
+        draw_detections(image, weed_detector.detections, label=weed_detector.label)
+        np.testing.assert_array_equal(image, annotated)
+
+    def test_roi(self):
+        test_image = cv2.imread('media/OWL - frame1.jpg')
+        roi = [50, 40, 300, 200]
+        weed_detector = GreenOnBrown()
+
+        _, boxes, _, _ = weed_detector.find(test_image.copy(), algorithm='exhsv', roi=roi)
+        _, crop_boxes, _, _ = weed_detector.find(test_image[40:240, 50:350].copy(), algorithm='exhsv')
+
+        assert len(boxes) > 0
+        assert boxes == [[x + 50, y + 40, w, h] for x, y, w, h in crop_boxes]
+        assert weed_detector.lane_hits is None
+
+    @pytest.mark.parametrize("postprocess", ['contours', 'components'])
+    def test_lanes(self, postprocess):
+        test_image = np.zeros((320, 416, 3), dtype=np.uint8)
+        test_image[:] = (40, 60, 80)
+        test_image[50:90, 20:60] = (30, 150, 40)
+        test_image[200:260, 240:280] = (30, 150, 40)
+        weed_detector = GreenOnBrown()
+
+        _, boxes, _, _ = weed_detector.find(test_image, algorithm='exg', lanes=4, postprocess=postprocess)
+        assert weed_detector.lane_hits.tolist() == [True, False, True, False]
+        assert len(boxes) == 2
+
+        weed_detector.find(test_image, algorithm='exg', lanes=[[0, 100], [200, 416]], postprocess=postprocess)
+        assert weed_detector.lane_hits.tolist() == [True, True]
+
+    def test_no_lanes(self):
+        test_image = cv2.imread('media/OWL - frame1.jpg')
+        weed_detector = GreenOnBrown()
+
+        _, boxes, centres, _ = weed_detector.find(test_image, algorithm='exhsv', lanes=[])
+        assert boxes == [] and centres == []
+        assert weed_detector.detections.dtype == DETECTION_DTYPE
+        assert weed_detector.lane_hits.tolist() == []
+
+    @pytest.mark.parametrize("algorithm", ['exg', 'maxg', 'exhsv', 'hsv'])
+    def test_find_batch(self, algorithm):
+        frames = [cv2.imread(f'media/{name}') for name in ['OWL - frame1.jpg', 'OWL - frame 2.jpg', 'OWL - frame 3.jpg']]
+        frames.insert(1, cv2.resize(frames[0], (320, 240)))
+        weed_detector = GreenOnBrown()
+
+        expected = [weed_detector.find(frame.copy(), algorithm=algorithm) for frame in frames]
+        results = weed_detector.find_batch([frame.copy() for frame in frames], algorithm=algorithm)
+
+        assert len(results) == len(frames) == len(weed_detector.batch_detections)
+        for (_, boxes, centres, image), (_, expected_boxes, expected_centres, expected_image) in zip(results, expected):
+            assert boxes == expected_boxes
+            assert centres == expected_centres
+            np.testing.assert_array_equal(image, expected_image)
+
     def test_invalid_algorithm(self):
         test_image = np.zeros((320, 416, 3), dtype=np.uint8)
         weed_detector = GreenOnBrown()
@@ -39,6 +153,86 @@ class TestGreenOnBrown:
             weed_detector.find(image=test_image, algorithm='invalid', show_display=False)
 
 
+class TestTiledGreenOnBrown:
+    @pytest.mark.parametrize("algorithm", ['exg', 'maxg', 'exhsv', 'hsv'])
+    @pytest.mark.parametrize("tiles", [1, 3, 8])
+    def test_matches_untiled(self, algorithm, tiles):
+        test_image = cv2.resize(cv2.imread('media/OWL - frame1.jpg'), (832, 640))
+        weed_detector = GreenOnBrown()
+        tiled_detector = TiledGreenOnBrown(workers=2, tiles=tiles)
+
+        _, boxes, centres, image = weed_detector.find(test_image.copy(), algorithm=algorithm)
+        _, tiled_boxes, tiled_centres, tiled_image = tiled_detector.find(test_image.copy(), algorithm=algorithm)
+        tiled_detector.close()
+
+        assert tiled_boxes == boxes
+        assert tiled_centres == centres
+        np.testing.assert_array_equal(tiled_image, image)
+
+
+class TestParameterSweep:
+    grid = {'algorithm': ['exg', 'exhsv', 'hsv'], 'exgMin': [10, 30], 'exgMax': [200, 250], 'minArea': [1, 50],
+            'postprocess': ['contours', 'components']}
+
+    def test_matches_find(self):
+        frames = [cv2.imread('media/OWL - frame1.jpg'), cv2.imread('media/OWL - frame 2.jpg')]
+        sweep = ParameterSweep(self.grid)
+        table = sweep.run(frames, keep_detections=True)
+
+        assert len(table) == 2 * len(parameter_grid(self.grid))
+        for _, row in table.iterrows():
+            weed_detector = GreenOnBrown()
+            weed_detector.find(frames[row['frame']].copy(), annotate=False,
+                               **{name: row[name] for name in self.grid})
+            np.testing.assert_array_equal(row['boxes'], weed_detector.detections)
+            assert row['detections'] == len(weed_detector.detections)
+
+        # one index per algorithm, and hsv masks don't depend on exgMin/exgMax
+        assert sweep.stage_runs['index'] == 2 * 3
+        assert sweep.stage_runs['mask'] == 2 * (4 + 4 + 1)
+
+    def test_regions(self):
+        frames = [cv2.imread('media/OWL - frame1.jpg')]
+        grid = {'algorithm': ['exg', 'hsv'], 'exgMin': [10, 30], 'roi': [None, [50, 40, 300, 200]],
+                'lanes': [None, 3, [[0, 100], [200, 416]]]}
+        table = ParameterSweep(grid).run(frames, keep_detections=True)
+
+        for _, row in table.iterrows():
+            weed_detector = GreenOnBrown()
+            weed_detector.find(frames[0].copy(), annotate=False, **{name: row[name] for name in grid})
+            np.testing.assert_array_equal(row['boxes'], weed_detector.detections)
+            if weed_detector.lane_hits is not None:
+                assert row['lane_hits'] == weed_detector.lane_hits.tolist()
+
+    def test_detect_reuses_stages(self):
+        frame = cv2.imread('media/OWL - frame1.jpg')
+        sweep = ParameterSweep()
+
+        for config in [{'algorithm': 'exhsv', 'minArea': 1}, {'algorithm': 'exhsv', 'minArea': 50},
+                       {'algorithm': 'exhsv', 'exgMin': 10, 'minArea': 50}]:
+            detections = sweep.detect(frame, config, frame_key=0)
+            weed_detector = GreenOnBrown()
+            weed_detector.find(frame.copy(), annotate=False, **config)
+            np.testing.assert_array_equal(detections, weed_detector.detections)
+
+        # minArea is only a filter, and exgMin only changes the mask
+        assert sweep.stage_runs == {'index': 1, 'mask': 2, 'detections': 2}
+
+        sweep.detect(frame, {'algorithm': 'exhsv', 'exgMin': 10, 'minArea': 50}, frame_key=1)
+        assert sweep.stage_runs['index'] == 2
+
+    def test_unknown_parameter(self):
+        with pytest.raises(ValueError):
+            ParameterSweep({'exgMin': [10, 30], 'conf': [0.5]})
+
+    def test_process_pool(self):
+        frames = [cv2.imread('media/OWL - frame1.jpg'), cv2.imread('media/OWL - frame 3.jpg')]
+        serial = ParameterSweep(self.grid).run(frames)
+        parallel = ParameterSweep(self.grid).run(frames, workers=2)
+
+        assert serial.equals(parallel)
+
+
 class TestGreenonGreen:
     resolutions = [(123, 456), (789, 101), (112, 134), (563, 289)]
 
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+import cv2
+
+from owl.utils import FrameReader
+from owl.utils.framestore import FrameStore
+from owl.utils.io import get_weed_detector, load_config, setup_and_run_detector
+
+
+class TestFrameStore:
+    def test_build_from_directory(self, tmp_path):
+        store = FrameStore.build('media', str(tmp_path / 'store'), resolution=(208, 160))
+
+        assert len(store) == 3
+        assert store.names == sorted(store.names)
+        assert store[0].shape == (160, 208, 3)
+        assert not store[0].flags.writeable
+
+        expected = cv2.resize(cv2.imread('media/' + store.names[1]), (208, 160), interpolation=cv2.INTER_AREA)
+        np.testing.assert_array_equal(store[1], expected)
+
+        # reopening maps the same file without decoding anything
+        np.testing.assert_array_equal(FrameStore(str(tmp_path / 'store')).frames, store.frames)
+
+    def test_build_from_video(self, tmp_path):
+        video = str(tmp_path / 'clip.mp4')
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48))
+        for i in range(12):
+            writer.write(np.full((48, 64, 3), i * 16, dtype=np.uint8))
+        writer.release()
+
+        store = FrameStore.build(video, str(tmp_path / 'store'), resolution=(32, 24))
+        assert len(store) == 12
+        assert store.names[5] == '5'
+
+    def test_missing_store(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            FrameStore(str(tmp_path))
+
+    def test_frame_reader_zero_copy(self, tmp_path):
+        FrameStore.build('media', str(tmp_path / 'store'), resolution=(416, 320))
+        reader = FrameReader(str(tmp_path / 'store'), resolution=(416, 320), loop_time=None, loop=False)
+
+        frames = []
+        while (frame := reader.read()) is not None:
+            assert np.shares_memory(frame, reader.store.frames)
+            frames.append(frame)
+        assert len(frames) == 3
+
+        # read-only frames go straight through the detectors when nothing is drawn on them
+        config = load_config('CONFIG_DAY_SENSITIVITY_1')
+        _, boxes, _, image = setup_and_run_detector(get_weed_detector('exhsv'), frames[0], config,
+                                                    detections_only=True)
+        _, expected, _, _ = setup_and_run_detector(get_weed_detector('exhsv'), frames[0].copy(), config)
+        assert image is frames[0]
+        assert boxes == expected
+
+    def test_annotate_store_frame(self, tmp_path):
+        store = FrameStore.build('media', str(tmp_path / 'store'), resolution=(416, 320))
+        frame = store[0]
+        detector = get_weed_detector('exhsv')
+
+        # drawing on a read-only frame works on a copy and leaves the store untouched
+        _, boxes, _, image = detector.find(frame)
+        assert len(boxes) and image is not frame
+        assert image.flags.writeable and not np.array_equal(image, frame)
+        np.testing.assert_array_equal(frame, FrameStore(str(tmp_path / 'store'))[0])
+
+        _, expected, _, _ = detector.find(frame.copy())
+        assert boxes == expected
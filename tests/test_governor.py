@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+import cv2
+
+from owl.detection import GreenOnBrown
+from owl.detection.results import empty_detections
+from owl.utils.governor import QualityGovernor, default_levels
+from owl.utils.io import load_config
+
+
+class TimedDetector:
+    '''
+    Stands in for a detector. Each call advances a fake clock by a latency that depends on the algorithm and the
+    frame width, and records the parameters it was called with.
+    '''
+    def __init__(self, latency):
+        self.latency = latency
+        self.now = 0.0
+        self.calls = []
+        self.detections = empty_detections()
+
+    def clock(self):
+        return self.now
+
+    def find(self, image, **kwargs):
+        self.calls.append(dict(kwargs, shape=image.shape))
+        self.now += self.latency(kwargs.get('algorithm'), image.shape[1]) / 1000
+        return None, [], [], image
+
+
+@pytest.fixture
+def config():
+    config = dict(load_config('CONFIG_DAY_SENSITIVITY_1'))
+    config.update({'roi': [40, 32, 320, 256], 'lanes': [[0, 160], [160, 320]]})
+
+    return config
+
+
+def run(governor, frames, monkeypatch):
+    monkeypatch.setattr('owl.utils.governor.time.perf_counter', governor.weed_detector.clock)
+    frame = np.zeros((320, 416, 3), dtype=np.uint8)
+    for _ in range(frames):
+        governor.run(frame)
+
+
+class TestGovernor:
+    def test_default_levels(self, config):
+        levels = default_levels(config)
+        assert levels == [{'resolution': [416, 320], 'algorithm': 'exhsv'},
+                          {'resolution': [416, 320], 'algorithm': 'exg'},
+                          {'resolution': [320, 240], 'algorithm': 'exg'},
+                          {'resolution': [208, 160], 'algorithm': 'exg'}]
+
+        # gndvi works on NIR imagery, so it keeps its algorithm and only steps down in resolution
+        config['algorithm'] = 'gndvi'
+        assert {level['algorithm'] for level in default_levels(config)} == {'gndvi'}
+
+        # green-on-green steps the YOLO input size in multiples of the model stride
+        config['algorithm'] = 'gog'
+        assert [level['resolution'] for level in default_levels(config)] == [[416, 320], [320, 256], [192, 160]]
+
+    def test_requires_deadline(self, config):
+        with pytest.raises(ValueError):
+            QualityGovernor(TimedDetector(None), config)
+
+    def test_steps_down_and_up(self, config, monkeypatch):
+        # exhsv is over a 20 ms deadline, exg at full resolution is over too, exg at 320 px fits
+        costs = {'exhsv': 30, 'exg': 25}
+        detector = TimedDetector(lambda algorithm, width: costs[algorithm] * width / 416)
+        governor = QualityGovernor(detector, config, deadline_ms=20, window=5)
+
+        run(governor, 11, monkeypatch)
+        assert [(h['from'], h['to']) for h in governor.history] == [(0, 1), (1, 2)]
+        assert governor.current == {'resolution': [320, 240], 'algorithm': 'exg'}
+
+        # the reduced frame is detected with the ROI, lanes and minimum area scaled to match
+        call = detector.calls[-1]
+        assert call['shape'] == (240, 320, 3)
+        assert call['roi'] == [31, 24, 246, 192]
+        assert call['lanes'] == [[0, 123], [123, 246]]
+        assert call['minArea'] == pytest.approx(10 * 320 / 416 * 240 / 320)
+
+        # once the load drops the governor climbs back to full quality
+        costs.update({'exhsv': 5, 'exg': 5})
+        run(governor, 10, monkeypatch)
+        assert governor.level == 0
+        assert detector.calls[-1]['shape'] == (320, 416, 3)
+        assert [h['reason'] for h in governor.history] == ['over deadline'] * 2 + ['headroom'] * 2
+
+    def test_backs_off_failed_step_up(self, config, monkeypatch):
+        # exg fits comfortably, exhsv does not, so each attempt at exhsv fails and the next waits twice as long
+        detector = TimedDetector(lambda algorithm, width: {'exhsv': 30, 'exg': 5}[algorithm])
+        governor = QualityGovernor(detector, config, deadline_ms=20, window=4)
+
+        run(governor, 40, monkeypatch)
+        switches = [(h['frame'], h['from'], h['to']) for h in governor.history]
+        assert switches[:4] == [(4, 0, 1), (8, 1, 0), (12, 0, 1), (20, 1, 0)]
+        assert governor.failures[0] == 2
+
+    @pytest.mark.parametrize('detections_only', [True, False])
+    def test_coordinates_kept_across_levels(self, config, detections_only):
+        # green squares on a brown field, detected at full and at half resolution
+        frame = np.full((320, 416, 3), (40, 70, 110), dtype=np.uint8)
+        for x, y in [(60, 60), (200, 100), (300, 220)]:
+            cv2.rectangle(frame, (x, y), (x + 31, y + 23), (60, 150, 60), -1)
+
+        config.update({'roi': None, 'lanes': None})
+        governor = QualityGovernor(GreenOnBrown(), config, deadline_ms=20, detections_only=detections_only)
+        full = governor.run(frame)
+
+        governor.level = len(governor.levels) - 1
+        assert governor.current['resolution'] == [208, 160]
+        cnts, boxes, centres, image = governor.run(frame)
+
+        assert np.abs(np.array(centres) - np.array(full[2])).max() <= 1
+        # boxes are padded by a fixed number of pixels at each resolution, but stay centred on the weed
+        boxes = np.array(boxes)
+        assert np.abs(boxes[:, :2] + boxes[:, 2:] / 2 - np.array(full[2])).max() <= 1
+        assert governor.detections[['cx', 'cy']].tolist() == [tuple(c) for c in centres]
+        contourCentres = sorted((x + w / 2, y + h / 2) for x, y, w, h in map(cv2.boundingRect, cnts))
+        assert np.abs(np.array(contourCentres) - np.array(sorted(map(tuple, full[2])))).max() <= 1
+        assert image.shape == frame.shape
+        assert (image is frame) == detections_only
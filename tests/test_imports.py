@@ -0,0 +1,24 @@
+import pytest
+import subprocess
+import sys
+
+
+class TestLazyImports:
+    @pytest.mark.parametrize("module", ['owl', 'owl.detection', 'owl.utils', 'owl.viz', 'owl.utils.io'])
+    def test_packages_import_without_heavy_dependencies(self, module):
+        code = f'import sys, {module}; print(any(m in sys.modules for m in ["cv2", "torch", "ultralytics"]))'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+
+        assert result.stdout.strip().splitlines()[-1] == 'False'
+
+    def test_exports_resolve(self):
+        import owl
+        from owl.detection import GreenOnBrown, TiledGreenOnBrown
+        from owl.utils import FrameReader
+        from owl.viz import draw_detections
+
+        assert owl.detection.GreenOnBrown is GreenOnBrown
+        assert 'TiledGreenOnBrown' in dir(owl.detection)
+
+        with pytest.raises(AttributeError):
+            owl.detection.NotADetector
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+import cv2
+
+from owl.detection import GreenOnBrown
+from owl.detection.motion import MotionGreenOnBrown, pixels_per_frame
+
+
+def moving_frames(speed, count):
+    # a camera moving forward over a strip of ground, so the ground moves speed pixels down each frame
+    frame = cv2.resize(cv2.imread('media/OWL - frame1.jpg'), (416, 320))
+    strip = np.concatenate([frame, cv2.flip(frame, 0), frame])
+    offsets = [int(round(speed * i)) for i in range(count)]
+
+    return [strip[len(strip) - 320 - offset:len(strip) - offset].copy() for offset in offsets]
+
+
+@pytest.fixture(scope='module')
+def ground_frames():
+    return moving_frames(12, 15)
+
+
+class TestMotionGreenOnBrown:
+    @pytest.mark.parametrize('algorithm', ['exhsv', 'exg', 'hsv'])
+    @pytest.mark.parametrize('shift', [None, (0, 12)])
+    def test_matches_green_on_brown(self, ground_frames, algorithm, shift):
+        reference = GreenOnBrown()
+        detector = MotionGreenOnBrown(shift=shift)
+
+        for frame in ground_frames:
+            reference.find(frame, algorithm=algorithm, annotate=False)
+            detector.find(frame, algorithm=algorithm, annotate=False)
+            assert np.array_equal(reference.detections, detector.detections)
+
+        assert detector.last_shift == (0, 12)
+        assert detector.stats['full_frames'] == 1
+        assert detector.pixel_fraction() < 0.4
+
+    def test_fractional_shift(self):
+        # the ground moves 12 or 13 pixels a frame, so rounding the known shift each frame would drift off it
+        reference = GreenOnBrown()
+        detector = MotionGreenOnBrown(shift=(0, 12.4))
+
+        for frame in moving_frames(12.4, 25):
+            reference.find(frame, algorithm='exhsv', annotate=False)
+            detector.find(frame, algorithm='exhsv', annotate=False)
+            assert np.array_equal(reference.detections, detector.detections)
+
+        assert detector.stats['full_frames'] == 1
+
+    def test_changing_speed_reuses_buffers(self):
+        # the shift changes every frame, but the bands are rounded to a few sizes, each with one set of buffers
+        speeds = [5, 9, 14, 6, 11, 13, 7, 10, 12, 8, 15, 5, 9, 14, 6, 11]
+        frame = cv2.resize(cv2.imread('media/OWL - frame1.jpg'), (416, 320))
+        strip = np.concatenate([frame, cv2.flip(frame, 0), frame])
+        offsets = np.cumsum([0] + speeds)
+
+        reference = GreenOnBrown()
+        detector = MotionGreenOnBrown()
+        for offset in offsets:
+            image = strip[len(strip) - 320 - offset:len(strip) - offset]
+            reference.find(image, annotate=False)
+            detector.find(image, annotate=False)
+            assert np.array_equal(reference.detections, detector.detections)
+
+        assert detector.stats['full_frames'] == 1
+        shapes = {key[1] for key in detector._bandDetector.workspace.buffers}
+        assert len(shapes) <= 4
+
+    def test_refresh(self, ground_frames):
+        detector = MotionGreenOnBrown(shift=(0, 12), refresh=4)
+        for frame in ground_frames[:10]:
+            detector.find(frame, annotate=False)
+
+        # frames 0, 5 and 10 are processed in full, each followed by four shifted frames
+        assert detector.stats['full_frames'] == 2
+        detector.find(ground_frames[10], annotate=False)
+        assert detector.stats['full_frames'] == 3
+
+    def test_lanes(self, ground_frames):
+        reference = GreenOnBrown()
+        detector = MotionGreenOnBrown()
+
+        for frame in ground_frames:
+            reference.find(frame, annotate=False, roi=[20, 10, 380, 300], lanes=3)
+            detector.find(frame, annotate=False, roi=[20, 10, 380, 300], lanes=3)
+            assert np.array_equal(reference.detections, detector.detections)
+
+        assert len(detector._states) == 3
+
+    def test_full_frame_on_change(self, ground_frames):
+        detector = MotionGreenOnBrown(shift=(0, 12))
+        detector.find(ground_frames[0], annotate=False)
+        detector.find(ground_frames[1], exgMin=40, annotate=False)
+        detector.find(ground_frames[2], exgMin=40, annotate=False)
+
+        assert detector.stats['full_frames'] == 2
+
+        # a shift larger than the frame cannot reuse anything
+        detector.shift = (0, 400)
+        detector.find(ground_frames[3], exgMin=40, annotate=False)
+        assert detector.stats['full_frames'] == 3
+
+    def test_pixels_per_frame(self):
+        assert pixels_per_frame(7.2, 20, 100) == pytest.approx(10)
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+import cv2
+
+from owl.detection import GreenOnGreen
+from owl.detection.backends import Letterbox
+from owl.detection.quantize import FrameCalibrationReader, compare_models, match_detections, quantize_model, \
+    summarise
+from owl.detection.results import detections_from_boxes
+
+
+class FixedDetector:
+    '''
+    Stands in for GreenOnGreen, returning the same detections for every frame.
+    '''
+    def __init__(self, boxes, classes=None):
+        self.fixed = detections_from_boxes(boxes, classes=classes)
+        self.detections = None
+
+    def warmup(self, **kwargs):
+        pass
+
+    def find(self, image, **kwargs):
+        self.detections = self.fixed
+
+
+def yolo_like_model(path):
+    '''
+    Writes a small ONNX model with the input and output layout of a YOLOv8 export: a 1x3xHxW image in, and
+    1x(4 + classes)xN anchors out, with the box decoding in the last /model.N/ module.
+    '''
+    onnx = pytest.importorskip('onnx')
+    from onnx import helper, numpy_helper, TensorProto
+
+    rng = np.random.default_rng(0)
+    initializers = [numpy_helper.from_array(rng.normal(0, 0.05, (6, 3, 8, 8)).astype(np.float32), 'w'),
+                    numpy_helper.from_array(rng.normal(0, 0.3, (6, 6, 3, 3)).astype(np.float32), 'w2'),
+                    numpy_helper.from_array(np.zeros(6, np.float32), 'b'),
+                    numpy_helper.from_array(np.array([1, 6, -1], np.int64), 'shape'),
+                    numpy_helper.from_array(np.array([640, 640, 60, 60, 1, 1], np.float32).reshape(1, 6, 1), 'scale')]
+    nodes = [helper.make_node('Conv', ['images', 'w', 'b'], ['c'], name='/model.0/conv/Conv', strides=[8, 8]),
+             helper.make_node('Conv', ['c', 'w2', 'b'], ['c2'], name='/model.1/cv2.0/Conv', pads=[1, 1, 1, 1]),
+             helper.make_node('Reshape', ['c2', 'shape'], ['r'], name='/model.1/Reshape'),
+             helper.make_node('Sigmoid', ['r'], ['s'], name='/model.1/Sigmoid'),
+             helper.make_node('Mul', ['s', 'scale'], ['output0'], name='/model.1/Mul')]
+    graph = helper.make_graph(nodes, 'yolo', [helper.make_tensor_value_info('images', TensorProto.FLOAT,
+                                                                            [1, 3, 'height', 'width'])],
+                              [helper.make_tensor_value_info('output0', TensorProto.FLOAT, [1, 6, 'anchors'])],
+                              initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 8
+    helper.set_model_props(model, {'names': "{0: 'weed', 1: 'crop'}"})
+    onnx.save(model, str(path))
+
+    return path
+
+
+class TestQuantize:
+    def test_calibration_reader(self):
+        reader = FrameCalibrationReader('media', 'images', imgsz=(256, 320))
+
+        batches = list(iter(reader.get_next, None))
+        assert len(batches) == 3
+        assert batches[0]['images'].shape == (1, 3, 256, 320)
+        assert batches[0]['images'].dtype == np.float32
+
+        # frames are letterboxed from the size they are read at, as GreenOnGreen does
+        frame = cv2.imread(reader.reader.path + '/' + reader.reader.files[0])
+        assert np.array_equal(batches[0]['images'], Letterbox()(frame, (256, 320)))
+
+        reader.rewind()
+        assert reader.get_next() is not None
+        reader.stop()
+
+    def test_match_detections(self):
+        reference = detections_from_boxes([[0, 0, 10, 10], [50, 50, 10, 10], [100, 100, 10, 10]], classes=[0, 0, 1])
+        candidate = detections_from_boxes([[1, 0, 10, 10], [100, 100, 10, 10], [200, 200, 5, 5]], classes=[0, 0, 1])
+
+        # the box at (100, 100) overlaps exactly but its class differs
+        matched = match_detections(reference, candidate, iou_threshold=0.5)
+        assert np.allclose(matched, [90 / 110])
+
+    def test_compare_models(self):
+        reference = FixedDetector([[0, 0, 10, 10], [50, 50, 10, 10]])
+        candidate = FixedDetector([[0, 0, 10, 10]])
+        frames = [np.zeros((10, 10, 3), dtype=np.uint8)] * 2
+
+        report = compare_models(reference, candidate, frames)
+        assert report['matched'].tolist() == [1, 1]
+        assert report['precision'].tolist() == [1.0, 1.0]
+        assert report['recall'].tolist() == [0.5, 0.5]
+
+        summary = summarise(report)
+        assert summary['frames'] == 2
+        assert np.isclose(summary['f1'], 2 / 3)
+
+    def test_quantize_model(self, tmp_path):
+        pytest.importorskip('onnxruntime')
+        modelPath = yolo_like_model(tmp_path / 'model.onnx')
+
+        int8Path = quantize_model(modelPath, 'media', resolution=(320, 256), max_frames=2)
+        assert int8Path == tmp_path / 'model_int8.onnx'
+
+        import onnx
+        opTypes = {node.op_type for node in onnx.load(str(int8Path)).graph.node}
+        assert 'QuantizeLinear' in opTypes
+
+        # the box decoding is left in FP32, and the quantised model runs in GreenOnGreen like any other export
+        reference = GreenOnGreen(model_path=modelPath, platform='onnx')
+        candidate = GreenOnGreen(model_path=int8Path, platform='onnx')
+        frames = [cv2.imread('media/OWL - frame1.jpg')]
+        report = compare_models(reference, candidate, frames, conf=0.25, resolution=(320, 256))
+        assert report['reference_boxes'].tolist()[0] > 0
+        assert candidate.names == {0: 'weed', 1: 'crop'}
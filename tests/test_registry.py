@@ -0,0 +1,137 @@
+import threading
+import pytest
+import os
+
+from owl.detection.registry import ModelRegistry
+
+
+class DummyModel:
+    def __init__(self, path, nbytes=100):
+        self.path = path
+        self.nbytes = nbytes
+
+
+@pytest.fixture
+def model_files(tmp_path):
+    paths = []
+    for name in ['a.pt', 'b.pt', 'c.pt']:
+        path = tmp_path / name
+        path.write_bytes(b'weights')
+        paths.append(path)
+
+    return paths
+
+
+class TestModelRegistry:
+    def test_cached_and_lazy(self, model_files):
+        registry = ModelRegistry()
+        loaded = []
+
+        def loader(path):
+            loaded.append(path)
+            return DummyModel(path)
+
+        first = registry.get(model_files[0], loader)
+        assert registry.get(model_files[0], loader) is first
+        assert registry.get(model_files[0], loader, device='cuda') is not first
+        assert len(loaded) == 2
+        assert registry.hits == 1
+
+    def test_lru_eviction(self, model_files):
+        registry = ModelRegistry(max_models=2)
+        a = registry.get(model_files[0], DummyModel)
+        registry.get(model_files[1], DummyModel)
+        registry.get(model_files[0], DummyModel)  # a is now the most recently used
+        registry.get(model_files[2], DummyModel)
+
+        assert len(registry.models) == 2
+        assert registry.get(model_files[0], DummyModel) is a
+        assert registry.loads == 3
+
+    def test_memory_cap(self, model_files, monkeypatch):
+        monkeypatch.setattr('owl.detection.registry.model_nbytes', lambda model: model.nbytes)
+        registry = ModelRegistry(max_bytes=250)
+
+        for path in model_files:
+            registry.get(path, DummyModel)
+
+        assert len(registry.models) == 2
+        assert registry.nbytes == 200
+
+    def test_reload_on_change(self, model_files):
+        registry = ModelRegistry()
+        first = registry.get(model_files[0], DummyModel)
+
+        stat = os.stat(model_files[0])
+        os.utime(model_files[0], (stat.st_atime, stat.st_mtime + 10))
+
+        assert registry.get(model_files[0], DummyModel) is not first
+        assert len(registry.models) == 1
+
+    def test_lease(self, model_files):
+        registry = ModelRegistry(max_models=1)
+        shared = registry.get(model_files[0], DummyModel)
+
+        with registry.lease(model_files[0], DummyModel) as first:
+            assert first is shared
+            # a copy is only loaded while the first is in use
+            with registry.lease(model_files[0], DummyModel) as second:
+                assert second is not first
+
+        # all copies count as one model, and returned copies are reused
+        assert len(registry.models) == 1
+        assert registry.loads == 2
+        for _ in range(5):
+            with registry.lease(model_files[0], DummyModel) as model:
+                assert model in (first, second)
+        assert registry.loads == 2
+
+    def test_lease_threads(self, model_files):
+        registry = ModelRegistry(max_models=4)
+        ready = threading.Barrier(6)
+
+        def run():
+            # more threads than max_models, each holding a copy at the same time
+            with registry.lease(model_files[0], DummyModel):
+                ready.wait(5)
+            use()
+
+        def use():
+            for _ in range(20):
+                with registry.lease(model_files[0], DummyModel):
+                    pass
+
+        threads = [threading.Thread(target=run) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # threads that have exited leave their copies behind for new threads
+        thread = threading.Thread(target=use)
+        thread.start()
+        thread.join()
+
+        assert len(registry.models) == 1
+        assert registry.loads == 6
+
+    def test_slow_load_does_not_block(self, model_files):
+        registry = ModelRegistry()
+        loading, release = threading.Event(), threading.Event()
+
+        def slow_loader(path):
+            loading.set()
+            release.wait(5)
+            return DummyModel(path)
+
+        thread = threading.Thread(target=registry.get, args=(model_files[0], slow_loader))
+        thread.start()
+        loading.wait(5)
+
+        # another model loads while the first is still loading
+        registry.get(model_files[1], DummyModel)
+        assert thread.is_alive()
+
+        release.set()
+        thread.join()
+        assert len(registry.models) == 2
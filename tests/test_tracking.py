@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from owl.detection.results import detections_from_boxes
+from owl.detection.tracking import Tracker, TrackedDetector
+
+
+def moving_boxes(frameNo, speed=15):
+    # a large weed and a small one, both moving up the frame at the same speed
+    return detections_from_boxes([[10, 200 - speed * frameNo, 30, 30], [200, 300 - speed * frameNo, 8, 8]])
+
+
+class CountingDetector:
+    def __init__(self):
+        self.calls = 0
+        self.detections = None
+        self.lane_hits = None
+
+    def find(self, image, annotate=True, **kwargs):
+        self.detections = moving_boxes(self.calls * 2)
+        self.calls += 1
+        return None, [], [], image
+
+
+class TestTracker:
+    def test_stable_ids(self):
+        tracker = Tracker()
+        for frameNo in range(8):
+            tracks = tracker.update(moving_boxes(frameNo))
+            assert tracks['id'].tolist() == [0, 1]
+
+        assert tracker.next_id == 2
+
+    def test_fires_once(self):
+        tracker = Tracker(min_hits=2)
+        fired = [tracker.update(moving_boxes(frameNo))['fire'].sum() for frameNo in range(5)]
+
+        assert fired == [0, 2, 0, 0, 0]
+
+    def test_missed_detection(self):
+        tracker = Tracker(max_missed=1)
+        for frameNo in range(4):
+            tracker.update(moving_boxes(frameNo))
+
+        # the small weed is missed for one frame, then found where its velocity predicts
+        tracker.update(moving_boxes(4)[:1])
+        assert tracker.update(moving_boxes(5))['id'].tolist() == [0, 1]
+
+        tracker.update(detections_from_boxes([]))
+        tracker.update(detections_from_boxes([]))
+        assert len(tracker.state) == 0
+
+    def test_classes_not_matched(self):
+        tracker = Tracker()
+        tracker.update(detections_from_boxes([[10, 10, 30, 30]], classes=[0]))
+        tracks = tracker.update(detections_from_boxes([[10, 10, 30, 30]], classes=[1]))
+
+        assert tracks['id'].tolist() == [1]
+
+    def test_overlapping_classes(self):
+        # the class 0 detection overlaps the class 1 track more than its own, which must not stop it matching
+        tracker = Tracker()
+        tracker.update(detections_from_boxes([[100, 100, 40, 40], [110, 100, 40, 40]], classes=[0, 1]))
+        tracks = tracker.update(detections_from_boxes([[110, 100, 40, 40], [120, 100, 40, 40]], classes=[0, 1]))
+
+        assert sorted(tracks['id'].tolist()) == [0, 1]
+        assert tracker.next_id == 2
+        assert not tracks['fire'].any()
+
+
+class TestTrackedDetector:
+    def test_detect_every(self):
+        detector = CountingDetector()
+        tracked = TrackedDetector(detector, every=2)
+        image = np.zeros((320, 416, 3), dtype=np.uint8)
+
+        centres = [tracked.find(image, annotate=False)[2] for _ in range(6)]
+        assert detector.calls == 3
+        assert tracked.tracker.next_id == 2
+
+        # tracked frames are predicted half way between the detected ones once the velocity has settled
+        assert abs(centres[5][0][1] - (centres[4][0][1] - 15)) <= 4
+
+    def test_invalid_every(self):
+        with pytest.raises(ValueError):
+            TrackedDetector(CountingDetector(), every=0)
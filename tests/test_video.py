@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import json
+import os
+import cv2
+
+from owl.utils import FrameReader
+from owl.utils.video import SeekableVideoReader, index_path_for
+
+
+@pytest.fixture
+def video(tmp_path):
+    # each frame is a flat grey level identifying its frame number, give or take compression error
+    path = str(tmp_path / 'survey.mp4')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48))
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), i * 8, dtype=np.uint8))
+    writer.release()
+
+    return path
+
+
+def frame_number(frame):
+    return int(round(np.mean(frame) / 8))
+
+
+class TestSeekableVideoReader:
+    def test_index_cached(self, video):
+        reader = SeekableVideoReader(video)
+        assert reader.frame_count == 30
+        assert os.path.isfile(index_path_for(video))
+
+        with open(index_path_for(video)) as f:
+            assert json.load(f)['frame_count'] == 30
+
+        # a rebuilt index would overwrite this marker
+        reader.index['marker'] = True
+        with open(index_path_for(video), 'w') as f:
+            json.dump(reader.index, f)
+        assert SeekableVideoReader(video).index.get('marker')
+
+    def test_seek_forwards_and_backwards(self, video):
+        reader = SeekableVideoReader(video)
+
+        for frame_no in [17, 3, 4, 29, 0]:
+            reader.seek(frame_no)
+            assert frame_number(reader.read()) == frame_no
+
+        with pytest.raises(ValueError):
+            reader.seek(30)
+
+    def test_read_range_and_sample(self, video):
+        reader = SeekableVideoReader(video, resolution=(32, 24))
+
+        frames = list(reader.read_range(5, 20, 4))
+        assert [frame_no for frame_no, _ in frames] == [5, 9, 13, 17]
+        assert [frame_number(frame) for _, frame in frames] == [5, 9, 13, 17]
+        assert frames[0][1].shape == (24, 32, 3)
+
+        assert [frame_no for frame_no, _ in reader.sample(10)] == [0, 10, 20]
+
+    def test_frame_at(self, video):
+        reader = SeekableVideoReader(video)
+        assert reader.frame_at(reader.timestamp(12)) == 12
+        assert reader.frame_at(reader.timestamp(12) + 1) == 12
+
+    def test_frame_reader_seekable(self, video):
+        reader = FrameReader(path=video, resolution=(32, 24), seekable=True)
+        reader.seek(20)
+        assert frame_number(reader.read()) == 20
+
+        reader.reset()
+        assert frame_number(reader.read()) == 0
+        reader.stop()
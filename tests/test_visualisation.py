@@ -2,9 +2,14 @@ import pytest
 from unittest import mock
 
 from owl.viz import webcam, images_and_video
-from owl.utils import FrameReader
+from owl.utils import FrameReader, LatestFrameCapture
+from owl.utils.image import imread_resized, jpeg_size, reduced_decode_factor
+from owl.utils.io import get_weed_detector, load_config, setup_and_run_detector
+from owl.viz.pipeline import Pipeline
 
 import numpy as np
+import time
+import cv2
 import os
 
 class TestViz:
@@ -62,4 +67,207 @@ class TestViz:
             FrameReader(path=unsupported_file_path)
         assert '[ERROR] Unsupported file type:' in str(excinfo.value)
 
-        os.remove(unsupported_file_path)
\ No newline at end of file
+        os.remove(unsupported_file_path)
+
+    def test_detections_only(self):
+        frame = np.zeros((320, 416, 3), dtype=np.uint8)
+        weed_detector = get_weed_detector(algorithm='exhsv')
+        config = load_config('CONFIG_DAY_SENSITIVITY_1')
+
+        _, _, _, image = setup_and_run_detector(weed_detector, frame, config, detections_only=True)
+        assert image is frame
+
+        _, _, _, image = setup_and_run_detector(weed_detector, frame, config)
+        assert image is not frame
+
+
+class TestPipeline:
+    @staticmethod
+    def _source(count):
+        frames = iter([np.full((320, 416, 3), i, dtype=np.uint8) for i in range(count)])
+        return lambda: next(frames, None)
+
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_block_keeps_every_frame_in_order(self, workers):
+        pipeline = Pipeline(read_frame=self._source(20),
+                            detector_factory=lambda: get_weed_detector(algorithm='exg'),
+                            config=load_config('CONFIG_DAY_SENSITIVITY_1'),
+                            workers=workers, queue_size=2, policy='block')
+
+        seen = []
+        pipeline.run(lambda frame, result: seen.append(int(frame[0, 0, 0])))
+
+        assert seen == list(range(20))
+        stats = pipeline.stats()
+        assert stats['frames_out'] == 20
+        assert stats['stages']['detect']['count'] == 20
+        assert stats['queues']['capture']['max_depth'] <= 2
+
+    def test_drop_oldest_with_slow_consumer(self):
+        pipeline = Pipeline(read_frame=self._source(30),
+                            detector_factory=lambda: get_weed_detector(algorithm='exg'),
+                            config=load_config('CONFIG_DAY_SENSITIVITY_1'),
+                            workers=2, queue_size=1, policy='drop_oldest')
+
+        seen = []
+
+        def consume(frame, result):
+            seen.append(int(frame[0, 0, 0]))
+            time.sleep(0.01)
+
+        pipeline.run(consume)
+
+        dropped = sum(q['dropped'] for q in pipeline.stats()['queues'].values())
+        assert seen == sorted(seen)
+        assert len(seen) + dropped == 30
+
+    def test_consumer_stops_pipeline(self):
+        pipeline = Pipeline(read_frame=lambda: np.zeros((320, 416, 3), dtype=np.uint8),
+                            detector_factory=lambda: get_weed_detector(algorithm='exg'),
+                            config=load_config('CONFIG_DAY_SENSITIVITY_1'),
+                            workers=2)
+
+        pipeline.run(lambda frame, result: False)
+        assert pipeline.stats()['frames_out'] == 1
+
+    @pytest.mark.parametrize("policy", ['block', 'drop_oldest'])
+    def test_detector_error_is_raised(self, policy):
+        class FailingDetector:
+            def find(self, image, **kwargs):
+                raise RuntimeError('detector failed')
+
+        pipeline = Pipeline(read_frame=self._source(20), detector_factory=FailingDetector,
+                            config=load_config('CONFIG_DAY_SENSITIVITY_1'), workers=2, queue_size=2, policy=policy)
+
+        with pytest.raises(RuntimeError, match='detector failed'):
+            pipeline.run(lambda frame, result: None)
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            Pipeline(read_frame=lambda: None, detector_factory=lambda: None, config={}, policy='newest')
+
+
+class TestLatestFrameCapture:
+    @staticmethod
+    def _camera(count, delay=0.001):
+        frames = iter(range(count))
+
+        def read():
+            time.sleep(delay)
+            i = next(frames, None)
+            if i is None:
+                return False, None
+            return True, np.full((32, 32, 3), i, dtype=np.uint8)
+
+        camera = mock.Mock()
+        camera.isOpened.return_value = True
+        camera.read.side_effect = read
+        return camera
+
+    @mock.patch('cv2.VideoCapture')
+    def test_slow_reader_gets_newest_frame(self, mock_capture):
+        mock_capture.return_value = self._camera(50)
+        capture = LatestFrameCapture(0).start()
+
+        ids = []
+        while True:
+            grabbed, frame = capture.read()
+            if not grabbed:
+                break
+            ids.append(int(frame[0, 0, 0]))
+            assert capture.frame_age() >= 0
+            time.sleep(0.01)
+        capture.release()
+
+        stats = capture.stats()
+        assert ids == sorted(set(ids))
+        assert stats['frames_captured'] == 50
+        assert stats['dropped'] > 0
+        assert stats['frames_read'] + stats['dropped'] == 50
+        mock_capture.return_value.release.assert_called_once()
+
+    @mock.patch('cv2.VideoCapture')
+    @mock.patch('cv2.imshow')
+    @mock.patch('cv2.waitKey', return_value=27)
+    def test_webcam_latest_frame(self, mock_key_press, mock_show, mock_capture):
+        mock_capture.return_value = self._camera(10)
+        webcam(latest_frame=True)
+        mock_show.assert_called()
+
+    @pytest.mark.parametrize("latest_frame", [False, True])
+    @mock.patch('cv2.VideoCapture')
+    @mock.patch('cv2.imshow')
+    @mock.patch('cv2.waitKey', return_value=-1)
+    def test_webcam_stops_when_camera_ends(self, mock_key_press, mock_show, mock_capture, latest_frame):
+        mock_capture.return_value = self._camera(5)
+        webcam(latest_frame=latest_frame)
+        assert 1 <= mock_show.call_count <= 5
+
+
+class TestFrameReader:
+    @staticmethod
+    def _directory(tmp_path, count=5):
+        # written out of order, with a non-image file that must be skipped
+        for i in reversed(range(count)):
+            cv2.imwrite(str(tmp_path / f'frame_{i:02d}.png'), np.full((48, 64, 3), i * 10, dtype=np.uint8))
+        (tmp_path / 'notes.txt').write_text('not an image')
+
+        return str(tmp_path)
+
+    @pytest.mark.parametrize("prefetch", [0, 3])
+    def test_throughput_mode_order(self, tmp_path, prefetch):
+        reader = FrameReader(path=self._directory(tmp_path), resolution=(32, 24), loop_time=None,
+                             prefetch=prefetch, workers=2, loop=False)
+
+        values = []
+        while (frame := reader.read()) is not None:
+            assert frame.shape == (24, 32, 3)
+            values.append(int(frame[0, 0, 0]))
+        reader.stop()
+
+        assert values == [0, 10, 20, 30, 40]
+        stats = reader.stats()
+        assert stats['frames_read'] == 5
+        assert stats['decode_ms'] > 0
+
+    def test_loop_and_reset(self, tmp_path):
+        reader = FrameReader(path=self._directory(tmp_path, count=2), resolution=(32, 24), loop_time=None,
+                             prefetch=2)
+
+        values = [int(reader.read()[0, 0, 0]) for _ in range(5)]
+        assert values == [0, 10, 0, 10, 0]
+
+        reader.reset()
+        assert int(reader.read()[0, 0, 0]) == 0
+        reader.stop()
+
+    def test_loop_time_holds_frame(self, tmp_path):
+        reader = FrameReader(path=self._directory(tmp_path), resolution=(32, 24), loop_time=60)
+
+        assert reader.read() is reader.read()
+
+    @pytest.mark.parametrize("size, factor", [((4000, 3000), 8), ((1920, 1080), 2), ((832, 640), 2), ((416, 320), 1)])
+    def test_reduced_decode_factor(self, size, factor):
+        assert reduced_decode_factor(size, (416, 320)) == factor
+
+    def test_reduced_decode(self, tmp_path):
+        image = cv2.resize(cv2.imread('media/OWL - frame1.jpg'), (1700, 1300), interpolation=cv2.INTER_CUBIC)
+        path = str(tmp_path / 'large.jpg')
+        cv2.imwrite(path, image)
+        assert jpeg_size(path) == (1700, 1300)
+
+        full = FrameReader(path=path, resolution=(416, 320)).read()
+        reduced = FrameReader(path=path, resolution=(416, 320), reduced_decode=True).read()
+
+        assert reduced.shape == full.shape
+        assert np.mean(cv2.absdiff(full, reduced)) < 5
+
+    @pytest.mark.parametrize("data", [b'\xff\xd8\xff\xe0', b'\xff\xd8\xff\xe0\x00\x01', b'\xff\xd8\xff\xc0\x00\x11\x08',
+                                      b'\xff\xd8\xff\xff'])
+    def test_truncated_jpeg(self, tmp_path, data):
+        path = str(tmp_path / 'truncated.jpg')
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        assert jpeg_size(path) is None
+        assert imread_resized(path, (416, 320), reduced_decode=True) is None